@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+cleaner.py 流式清洗的基准测试。
+
+以 s/original/freenodes-clashfree-original.yml 为输入 (可用 --scale 把 proxies 段放大 N 倍)，
+逐行读取文件、清洗并写入临时文件，输出耗时、吞吐量与 tracemalloc 峰值内存 (JSON)。
+--expected 指定参考输出时校验清洗结果与之逐字节一致，不一致时以非零状态退出。
+"""
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import config
+import cleaner
+
+DEFAULT_INPUT = config.ORIGINAL_DATA_DIR / 'freenodes-clashfree-original.yml'
+
+
+def scaled_lines(path: Path, scale: int):
+    """逐行读取输入；scale > 1 时把 proxies 段的每一行重复 scale 次 (名称加后缀以保持唯一)"""
+    in_proxies = False
+    with path.open('r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line and not line[0].isspace():
+                in_proxies = line.startswith('proxies:')
+            if in_proxies and scale > 1 and line.lstrip().startswith('- {name: '):
+                for i in range(scale):
+                    yield line.replace('- {name: ', f"- {{name: x{i}-", 1) if i else line
+            else:
+                yield line
+
+
+def run_once(path: Path, scale: int, output: Path) -> dict:
+    started = time.perf_counter()
+    count = cleaner.clean_to_file(scaled_lines(path, scale), output)
+    elapsed = time.perf_counter() - started
+    return {'elapsed_ms': elapsed * 1000, 'lines_out': count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='cleaner.py 流式清洗基准测试')
+    parser.add_argument('--input', type=Path, default=DEFAULT_INPUT, help='输入的 Clash 配置文件')
+    parser.add_argument('--scale', type=int, default=1, help='把 proxies 段放大的倍数')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数，取最快一次')
+    parser.add_argument('--expected', type=Path, help='参考输出文件，校验清洗结果一致')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    lines_in = sum(1 for _ in scaled_lines(args.input, args.scale))
+    size = sum(len(line.encode('utf-8')) + 1 for line in scaled_lines(args.input, args.scale))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / 'cleaned.yml'
+        runs = [run_once(args.input, args.scale, output) for _ in range(args.repeat)]
+
+        tracemalloc.start()
+        run_once(args.input, args.scale, output)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        matches = None
+        if args.expected:
+            matches = output.read_bytes() == args.expected.read_bytes()
+
+    best = min(run['elapsed_ms'] for run in runs)
+    report = {
+        'input': str(args.input),
+        'scale': args.scale,
+        'lines_in': lines_in,
+        'lines_out': runs[-1]['lines_out'],
+        'bytes_in': size,
+        'best_ms': round(best, 2),
+        'lines_per_s': round(lines_in / best * 1000),
+        'mb_per_s': round(size / best / 1000, 1),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'matches_expected': matches,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if matches is False:
+        print("[FAIL] 清洗结果与参考输出不一致", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
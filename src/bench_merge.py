@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+merge.py 各处理阶段的合成数据基准测试。
+
+用固定种子生成接近真实分布的 Clash 节点 (多种协议、少量域名节点、重复端点、HTTP 节点) 与对应的分享链接，
+按规模 (默认 1k / 10k / 100k，可到 1M) 依次计时:
+  parse     link_parser.parse_content (分享链接文本)
+  filter    merge.filter_proxies (合成的 IP 黑名单)
+  dedup     proxy_tools.deduplicate_proxies
+  geoip     merge.rename_proxies_by_country (GeoIP 查询替换为按 IP 段确定国家的桩，不需要 mmdb 与 geoip2)
+  render    merge.save_configs (与 merge.py 相同的输出目标，经 Renderer 与预编译模板渲染)
+每个阶段重复 --repeat 次取最快一次，--memory 时再单独运行一次记录 tracemalloc 峰值内存。
+
+结果以 JSON 输出，并与基准文件 (默认 config/bench/merge-baseline.json，--baseline 可指定其他文件) 逐项对比，
+最快耗时超过基准 (1 + --threshold) 倍且差值不小于 --min-delta-ms 时视为性能回退并以非零状态退出。
+基准与机器相关，应在同一台机器 (或同一 CI 规格) 上生成与对比；换机器或有意改变性能后重新生成:
+
+    python src/bench_merge.py --update-baseline
+"""
+import argparse
+import contextlib
+import ipaddress
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+import config
+import merge
+from core import geoip
+from core import parser as link_parser
+from core import proxy_tools
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_BASELINE = config.CONFIG_ROOT / 'bench' / 'merge-baseline.json'
+
+CIPHERS = ['aes-128-gcm', 'aes-256-gcm', 'chacha20-ietf-poly1305', '2022-blake3-aes-128-gcm']
+NETWORKS = ['tcp', 'ws', 'grpc']
+# 协议分布 (权重)，http 节点会被 filter 阶段剔除
+PROTOCOL_WEIGHTS = {'ss': 35, 'vmess': 25, 'vless': 20, 'trojan': 15, 'hysteria2': 3, 'http': 2}
+
+
+def generate_proxies(count: int, seed: int, duplicate_ratio: float = 0.1, domain_ratio: float = 0.05) -> list:
+    """生成 count 个合成节点；约 duplicate_ratio 比例的节点与前面的节点共享 (server, port)"""
+    rng = random.Random(seed)
+    types = list(PROTOCOL_WEIGHTS)
+    weights = list(PROTOCOL_WEIGHTS.values())
+    proxies = []
+    for i in range(count):
+        if proxies and rng.random() < duplicate_ratio:
+            source = proxies[rng.randrange(len(proxies))]
+            proxies.append({**source, 'name': f"dup-{i}"})
+            continue
+
+        ptype = rng.choices(types, weights)[0]
+        if rng.random() < domain_ratio:
+            server = f"n{rng.randrange(1 << 20):x}.example-{rng.randrange(50)}.com"
+        else:
+            server = f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+        port = rng.choice([443, 8443, 80]) if rng.random() < 0.3 else rng.randrange(1024, 65536)
+        proxy = {'name': f"node-{i}", 'type': ptype, 'server': server, 'port': port}
+
+        secret = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        if ptype == 'ss':
+            proxy.update({'cipher': rng.choice(CIPHERS), 'password': secret})
+        elif ptype in ('vmess', 'vless'):
+            proxy.update({'uuid': secret, 'network': rng.choice(NETWORKS), 'tls': rng.random() < 0.6})
+            if ptype == 'vmess':
+                proxy['alterId'] = 0
+            if proxy['network'] == 'ws':
+                proxy['ws-opts'] = {'path': f"/{secret[:8]}", 'headers': {'Host': f"cdn{i % 97}.example.net"}}
+            elif proxy['network'] == 'grpc':
+                proxy['grpc-opts'] = {'grpc-service-name': secret[:12]}
+            if proxy['tls']:
+                proxy['servername'] = f"sni{i % 89}.example.org"
+        elif ptype == 'trojan':
+            proxy.update({'password': secret, 'sni': f"sni{i % 89}.example.org"})
+        elif ptype == 'hysteria2':
+            proxy.update({'password': secret, 'sni': f"sni{i % 89}.example.org", 'skip-cert-verify': True})
+        elif ptype == 'http':
+            proxy.update({'username': secret[:8], 'password': secret[9:17]})
+        proxies.append(proxy)
+    return proxies
+
+
+def generate_blocklist(path: Path, seed: int, networks: int = 200, addresses: int = 500):
+    """生成合成 IP 黑名单 (CIDR 与单个 IP 混合)"""
+    rng = random.Random(seed + 1)
+    lines = ['# synthetic blocklist']
+    for _ in range(networks):
+        prefix = rng.choice([16, 20, 24])
+        lines.append(f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.0/{prefix}")
+    for _ in range(addresses):
+        lines.append(f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}")
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+
+
+class StubGeoIP:
+    """
+    代替 core.geoip 的桩：按 IP 第一段确定国家、第二段确定城市，结果只取决于地址；
+    域名与真实实现一样返回 XX。
+    """
+    def __init__(self):
+        self.codes = sorted(geoip.COUNTRY_SHORT_NAMES)
+
+    @staticmethod
+    def is_available() -> bool:
+        return True
+
+    def get_ip_country(self, address: str, db_path: Path) -> tuple:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return "XX", "", ""
+        packed = ip.packed
+        code = self.codes[packed[0] % len(self.codes)]
+        city = f"City{packed[1] % 8}" if packed[1] % 3 else ""
+        return code, geoip.COUNTRY_SHORT_NAMES[code], city
+
+
+@contextlib.contextmanager
+def stub_geoip():
+    original = merge.geoip
+    merge.geoip = StubGeoIP()
+    try:
+        yield
+    finally:
+        merge.geoip = original
+
+
+@contextlib.contextmanager
+def template_cache_dir(path: Path):
+    """模板编译缓存写入临时目录，不改动仓库中的 s/original/template-cache"""
+    original = config.TEMPLATE_CACHE_DIR
+    config.TEMPLATE_CACHE_DIR = path
+    try:
+        yield
+    finally:
+        config.TEMPLATE_CACHE_DIR = original
+
+
+def copy_items(items):
+    """浅拷贝每个节点 (保留 FlowStyleDict 等类型)；deduplicate_proxies 会修改传入的节点，重复运行前需要拷贝"""
+    if not isinstance(items, list):
+        return items
+    return [type(item)(item) for item in items]
+
+
+def time_stage(func, items, repeat: int, memory: bool) -> tuple:
+    """
+    以 items 的拷贝为参数运行 func repeat 次 (拷贝不计入耗时)，
+    返回 (最后一次的结果, 最快耗时 ms, 峰值内存 KB 或 None)
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        args = copy_items(items)
+        started = time.perf_counter()
+        result = func(args)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if memory:
+        args = copy_items(items)
+        tracemalloc.start()
+        func(args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak = round(peak / 1024, 1)
+    return result, best, peak
+
+
+def run_size(size: int, seed: int, repeat: int, memory: bool, work_dir: Path) -> dict:
+    """生成一种规模的数据并依次计时各阶段，上一阶段的输出作为下一阶段的输入"""
+    proxies = generate_proxies(size, seed)
+    links = [link for link in map(link_parser.to_link, proxies) if link]
+    blocklist_path = work_dir / 'ip-block-list.txt'
+    generate_blocklist(blocklist_path, seed)
+    # 桩不读取数据库，但 rename_proxies_by_country 会检查文件存在
+    db_path = work_dir / 'stub.mmdb'
+    db_path.touch()
+    # 使用仓库模板的副本；每次渲染输出到新的空目录，否则重复运行时内容未变化，
+    # 跳过替换文件与生成压缩副本，计时会漏掉写出成本
+    template_path = work_dir / 'merge-template.yml'
+    template_path.write_bytes(config.MERGE_TEMPLATE_FILE.read_bytes())
+    targets = set(merge.DEFAULT_TARGETS)
+    runs = itertools.count()
+    outputs = []
+
+    def render(items):
+        output_path = work_dir / f"out-{size}-{next(runs)}" / 'merge.yml'
+        output_path.parent.mkdir(parents=True)
+        outputs.append(output_path)
+        return merge.save_configs(items, template_path, output_path, targets)
+
+    stages = {}
+
+    def record(name, func, items, items_in=None):
+        items_in = len(items) if items_in is None else items_in
+        result, best, peak = time_stage(func, items, repeat, memory)
+        items_out = len(result) if result is not None else items_in
+        stages[name] = {
+            'items_in': items_in,
+            'items_out': items_out,
+            'best_ms': round(best, 2),
+            'us_per_item': round(best * 1000 / items_in, 3) if items_in else None,
+            'peak_memory_kb': peak,
+        }
+        return result
+
+    record('parse', link_parser.parse_content, '\n'.join(links), items_in=len(links))
+    filtered = record('filter', lambda items: merge.filter_proxies(items, blocklist_path), proxies)
+    unique = record('dedup', proxy_tools.deduplicate_proxies, filtered)
+    with stub_geoip():
+        renamed = record('geoip', lambda items: merge.rename_proxies_by_country(items, db_path), unique)
+    with template_cache_dir(work_dir / 'template-cache'):
+        results = record('render', render, renamed)
+    stages['render']['items_out'] = (results.get('clash') or {}).get('count')
+    stages['render']['sinks'] = {name: result and result['count'] for name, result in results.items()}
+    stages['render']['bytes_out'] = outputs[-1].stat().st_size
+    return {'size': size, 'stages': stages}
+
+
+def compare(results: list, baseline: dict, threshold: float, min_delta_ms: float) -> tuple:
+    """逐项对比本次结果与基准，返回 (对比明细, 回退项描述)"""
+    base = {(item['size'], name): stage['best_ms']
+            for item in baseline.get('results', []) for name, stage in item['stages'].items()}
+    rows = []
+    regressions = []
+    for item in results:
+        for name, stage in item['stages'].items():
+            previous = base.get((item['size'], name))
+            if previous is None:
+                continue
+            ratio = stage['best_ms'] / previous if previous else None
+            rows.append({'size': item['size'], 'stage': name, 'baseline_ms': previous,
+                         'best_ms': stage['best_ms'], 'ratio': round(ratio, 3) if ratio else None})
+            if stage['best_ms'] > previous * (1 + threshold) and stage['best_ms'] - previous >= min_delta_ms:
+                regressions.append(f"{name}@{item['size']}: {previous:.2f}ms -> {stage['best_ms']:.2f}ms "
+                                   f"(+{(ratio - 1) * 100:.0f}%)")
+    return rows, regressions
+
+
+def parse_sizes(value: str) -> list:
+    sizes = []
+    for item in value.split(','):
+        item = item.strip().lower()
+        if item:
+            scale = {'k': 1000, 'm': 1000000}.get(item[-1], 1)
+            sizes.append(int(float(item.rstrip('km')) * scale))
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='merge.py 各阶段的合成数据基准测试')
+    parser.add_argument('--sizes', type=parse_sizes, default=list(DEFAULT_SIZES),
+                        help='节点规模，逗号分隔，支持 k/m 后缀 (默认: 1k,10k,100k)')
+    parser.add_argument('--seed', type=int, default=20240101, help='随机种子')
+    parser.add_argument('--repeat', type=int, default=3, help='每个阶段的重复次数，取最快一次')
+    parser.add_argument('--memory', action='store_true', help='额外运行一次记录 tracemalloc 峰值内存')
+    parser.add_argument('--output', type=str, help='结果 JSON 输出路径 (默认输出到标准输出)')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE,
+                        help=f'基准结果 JSON，与之对比检测性能回退 (默认: {DEFAULT_BASELINE.relative_to(config.PROJECT_ROOT)})')
+    parser.add_argument('--threshold', type=float, default=0.25, help='允许的耗时增长比例 (默认: 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                        help='耗时增长小于该值时不视为回退，避免小规模下的计时噪声 (默认: 5)')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写入 --baseline 指定的文件')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull:
+        for size in args.sizes:
+            # 部分函数会向标准输出打印进度，避免混入 JSON 结果
+            with contextlib.redirect_stdout(devnull):
+                results.append(run_size(size, args.seed, args.repeat, args.memory, Path(tmp)))
+
+    report = {'seed': args.seed, 'repeat': args.repeat, 'python': sys.version.split()[0], 'results': results}
+    regressions = []
+    if not args.update_baseline and not args.baseline.is_file():
+        print(f"基准文件不存在: {args.baseline}，跳过对比 (可用 --update-baseline 生成)", file=sys.stderr)
+    elif not args.update_baseline:
+        with args.baseline.open('r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['comparison'], regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        report['regressions'] = regressions
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(text + '\n', encoding='utf-8')
+        print(f"已更新基准: {args.baseline}", file=sys.stderr)
+
+    if regressions:
+        for regression in regressions:
+            print(f"[FAIL] 性能回退 {regression}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
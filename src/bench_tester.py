@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+测试器 (test.py) 的端到端压测与自检。
+
+在进程内启动 fake_mihomo.FakeController，生成大量合成节点，走一遍
+build_probe_set → PUT /configs → run_tests → save_history 的完整流程，
+检查结果计数与历史记录，并以 JSON 输出吞吐量。任一检查失败时以非零状态退出，
+可在没有内核二进制的 Linux CI 上运行。
+
+场景:
+  baseline  普通延迟分布，检查每个端点恰好记录一次结果、失效节点从不通过
+  overload  控制器容量远低于并发上限，检查 AIMD 控制器出现乘性减
+"""
+import argparse
+import contextlib
+import importlib.util
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from core.history import load_history, save_history
+from core.journal import ResultJournal, read_journal
+from core.kernel import KernelManager
+from core.yaml_handler import dump_yaml_fast
+from fake_mihomo import FakeController
+
+PROTOCOLS = ['ss', 'vmess', 'trojan', 'vless', 'hysteria2']
+
+
+def load_tester():
+    """test.py 与标准库的 test 包同名，按文件路径加载，避免 import test 取到标准库"""
+    module = sys.modules.get('tester')
+    if module is None:
+        spec = importlib.util.spec_from_file_location('tester', Path(__file__).resolve().parent / 'test.py')
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['tester'] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+tester = load_tester()
+
+
+def generate_proxies(count: int, alias_ratio: float = 0.05) -> list[dict]:
+    """生成合成节点；约 alias_ratio 比例的节点与前面的节点共享端点 (别名)"""
+    proxies = []
+    alias_every = int(1 / alias_ratio) if alias_ratio else 0
+    for i in range(count):
+        if alias_every and i and i % alias_every == 0:
+            source = proxies[i // 2]
+            proxies.append({**source, 'name': f"alias-{i}"})
+            continue
+        proxies.append({
+            'name': f"node-{i}",
+            'type': PROTOCOLS[i % len(PROTOCOLS)],
+            'server': f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            'port': 10000 + i % 50000,
+        })
+    return proxies
+
+
+def run_scenario(name: str, proxies: list[dict], fake: FakeController, work_dir: str) -> tuple[dict, list[str]]:
+    """跑一遍完整测试流程，返回 (结果, 失败的检查项)"""
+    port = fake.start()
+    failures = []
+    try:
+        kernel = KernelManager(kernel_path='', work_dir=work_dir, controller_port=port, secret=fake.secret,
+                               state_file=os.path.join(work_dir, 'state.json'),
+                               log_file=os.path.join(work_dir, 'kernel.log'))
+        probes, representatives, groups = tester.build_probe_set(proxies)
+        if not kernel.reload(dump_yaml_fast(tester.build_minimal_config(representatives))):
+            return {'scenario': name}, [f"{name}: 热重载配置失败"]
+
+        db = {}
+        journal_path = os.path.join(work_dir, f"{name}.journal")
+        csv_path = os.path.join(work_dir, f"{name}.csv")
+        journal = ResultJournal(journal_path)
+        journal.start()
+
+        started = time.perf_counter()
+        summary = tester.run_tests(probes, groups, db, journal, controller_url=kernel.base_url, verbose=False)
+        elapsed = time.perf_counter() - started
+        journal.close()
+
+        _, entries = read_journal(journal_path)
+        save_history(csv_path, db)
+        saved = load_history(csv_path)
+
+        dead = {key for probe, key in probes.items() if fake.profile(probe)[0]}
+        passed = {key for key, record in saved.items() if record['pass']}
+
+        if summary['completed'] != len(probes):
+            failures.append(f"{name}: 完成 {summary['completed']} 条结果，应为 {len(probes)}")
+        if len(entries) != len(probes):
+            failures.append(f"{name}: 预写日志 {len(entries)} 条，应为 {len(probes)}")
+        if set(saved) != set(probes.values()):
+            failures.append(f"{name}: 历史记录端点与测试端点不一致")
+        if any(r['pass'] + r['notpass'] != 1 for r in saved.values()):
+            failures.append(f"{name}: 存在被记录多次或未记录的端点")
+        if passed & dead:
+            failures.append(f"{name}: {len(passed & dead)} 个失效端点被记为通过")
+        if fake.stats['not_found']:
+            failures.append(f"{name}: {fake.stats['not_found']} 次请求了未加载的代理")
+
+        result = {
+            'scenario': name,
+            'nodes': len(proxies),
+            'endpoints': len(probes),
+            'passed': len(passed),
+            'elapsed_s': round(elapsed, 3),
+            'probes_per_s': round(len(probes) / elapsed, 1) if elapsed else None,
+            'controller': summary,
+            'server': dict(fake.stats),
+        }
+        return result, failures
+    finally:
+        fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测试器端到端压测')
+    parser.add_argument('--nodes', type=int, default=10000, help='合成节点数量')
+    parser.add_argument('--time-scale', type=float, default=0.01, help='控制器实际等待时间的缩放系数')
+    parser.add_argument('--output', type=str, help='结果 JSON 输出路径 (默认输出到标准输出)')
+    args = parser.parse_args()
+
+    # test.py 的日志处理器写标准输出，与进度输出一起转到标准错误
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+            handler.setStream(sys.stderr)
+
+    proxies = generate_proxies(args.nodes)
+    results = []
+    failures = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        scenarios = [
+            ('baseline', FakeController(secret=tester.TEST_SECRET, time_scale=args.time_scale)),
+            ('overload', FakeController(secret=tester.TEST_SECRET, time_scale=args.time_scale,
+                                        capacity=tester.MIN_CONCURRENCY * 2)),
+        ]
+        for name, fake in scenarios:
+            # 测试流程会向标准输出打印进度与统计，转到标准错误，避免混入 JSON 结果
+            with contextlib.redirect_stdout(sys.stderr):
+                result, errors = run_scenario(name, proxies, fake, work_dir)
+            results.append(result)
+            failures.extend(errors)
+
+    overload = next(r for r in results if r['scenario'] == 'overload')
+    if overload.get('controller', {}).get('decreases', 0) == 0:
+        failures.append("overload: 过载时 AIMD 控制器没有降低并发")
+
+    report = json.dumps({'results': results, 'failures': failures}, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+    if failures:
+        for failure in failures:
+            print(f"[FAIL] {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -17,14 +17,22 @@ IP_BLOCKLIST_FILE = CONFIG_ROOT / 'ip-block-list.txt'
 MANUAL_NODES_FILE = CONFIG_ROOT / 'manual_nodes.yml'
 MERGE_TEMPLATE_FILE = CONFIG_ROOT / 'templates' / 'clash' / 'merge-template.yml'
 MERGE_OUTPUT_FILE = OUTPUT_DIR / 'merge.yml'
+# 精简的移动端配置 (每个国家只保留最好的若干节点)
+MOBILE_OUTPUT_FILE = OUTPUT_DIR / 'mobile.yml'
 
 ORIGINAL_DATA_DIR = OUTPUT_DIR / 'original'
+# 模板预编译结果的缓存 (模板变化时自动重建)
+TEMPLATE_CACHE_DIR = ORIGINAL_DATA_DIR / 'template-cache'
 GEOIP_DB_FILE = CONFIG_ROOT / 'Country.mmdb'
 GEOIP_CITY_DB_FILE = CONFIG_ROOT / 'City.mmdb'
 
 # Freenodes 清洗脚本配置
 FREENODES_CLEANER_FILE = ORIGINAL_DATA_DIR / 'freenodes-clashfree-cleaner.yml'
 FREENODES_SHA_FILE = ORIGINAL_DATA_DIR / 'freenodes-clashfree.yml.sha'
+# GitHub API 的 ETag 缓存 (随仓库提交，供下次运行发起条件请求)
+GITHUB_API_CACHE_FILE = ORIGINAL_DATA_DIR / 'github-api-cache.json'
 
 # 统计文件
-NODE_STATS_FILE = OUTPUT_DIR / 'node-server-statistics.csv'
\ No newline at end of file
+NODE_STATS_FILE = OUTPUT_DIR / 'node-server-statistics.csv'
+# 连通性测试历史记录
+NODE_CONNECTIVE_FILE = OUTPUT_DIR / 'node-connective.csv'
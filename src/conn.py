@@ -1,10 +1,18 @@
 import yaml
-import csv
 import os
 import sys
 import argparse
+
 import requests
 
+import config as paths
+import merge
+from core import renderer
+from core.conn_view import DEFAULT_MIN_SAMPLES, filter_by_history, prune_groups
+from core.history import load_history
+from core.merge_reader import iter_proxies, load_config_from_text
+from core.scoring import HAS_NUMPY, SCORING_METHODS
+
 # ================= 配置区域 =================
 # 获取当前脚本所在目录
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -15,31 +23,60 @@ MERGE_YAML_PATH = os.path.join(PROJECT_ROOT, "s", "merge.yml")
 CSV_PATH = os.path.join(PROJECT_ROOT, "s", "node-connective.csv")
 # ===========================================
 
-def load_csv_db(path):
-    """读取 CSV 数据库到内存字典"""
-    db = {}
-    if not os.path.exists(path):
-        return db
-    
-    with open(path, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            # 使用 (ip, port, protocol) 作为唯一键
-            # 注意：CSV 中的 port 是字符串，需要保持一致
-            key = (row['ip'], str(row['port']), row['protocol'])
-            try:
-                db[key] = {
-                    'pass': int(row['pass']),
-                    'notpass': int(row['notpass'])
-                }
-            except ValueError:
-                continue
-    return db
+def print_summary(original_count, result):
+    removed = result['removed']
+    print("-" * 30)
+    print(f"原始节点数: {original_count}")
+    print(f"剔除节点数: {sum(removed.values())}")
+    for reason, count in removed.most_common():
+        print(f"  {reason}: {count}")
+    print(f"剩余节点数: {len(result['proxies'])}")
+    kept_scores = sorted(score for score in result['scores'] if score is not None)
+    if kept_scores:
+        print(f"保留节点评分: 最低 {kept_scores[0]:.3f}，中位 {kept_scores[len(kept_scores) // 2]:.3f}")
+    print(f"评分计算: {result['history']} 条历史记录，耗时 {result['score_ms']:.1f}ms ({'NumPy' if HAS_NUMPY else '纯 Python'})")
+
+def render_from_merge(db, output_path, filter_options):
+    """
+    以 merge.py 相同的 ConnViewSink 渲染 conn.yml：节点由生成布局的逐行读取器读出，
+    不解析 merge.yml 的其余部分，模板与国家优选组和合并时的 conn 目标一致。
+    """
+    if not os.path.exists(MERGE_YAML_PATH):
+        print(f"错误: 找不到 YAML 文件 {MERGE_YAML_PATH}")
+        return
+    try:
+        proxies = list(iter_proxies(MERGE_YAML_PATH))
+    except Exception as e:
+        print(f"解析 YAML 失败: {e}")
+        return
+    if not proxies:
+        print("警告: 配置文件中没有找到 proxies 节点")
+        return
+
+    print(f"开始过滤 {len(proxies)} 个节点 (评分: {filter_options['method']}，阈值: {filter_options['min_score']})...")
+    sink = renderer.ConnViewSink(output_path, paths.MERGE_TEMPLATE_FILE, db, cache_dir=paths.TEMPLATE_CACHE_DIR,
+                                 **merge.group_sink_options(db), **filter_options)
+    results = renderer.Renderer([sink]).render(proxies)
+    if results.get(sink.name) is None:
+        print(f"生成 {output_path} 失败")
+        return
+    print_summary(len(proxies), sink.result)
+    print(f"已生成新配置文件: {output_path}")
 
 def main():
     parser = argparse.ArgumentParser(description="根据连通性历史记录过滤节点")
     parser.add_argument('--url', type=str, help='从指定 URL 下载配置文件')
     parser.add_argument('--outfile', type=str, default='conn.yml', help='输出文件名 (默认: conn.yml)')
+    parser.add_argument('--max-p95', type=float, help='剔除延迟 p95 超过该值 (ms) 的节点')
+    parser.add_argument('--max-jitter', type=float, help='剔除延迟抖动超过该值 (ms) 的节点')
+    parser.add_argument('--method', choices=SCORING_METHODS, default='wilson',
+                        help='评分方法: wilson (Wilson 区间下界) 或 bayes (Beta 后验下界)，默认 wilson')
+    parser.add_argument('--min-score', type=float, default=0.3,
+                        help='剔除评分 (通过率置信下界) 低于该值的节点 (默认: 0.3)，测试次数不足 --min-samples 的节点不受影响')
+    parser.add_argument('--min-samples', type=int, default=DEFAULT_MIN_SAMPLES,
+                        help=f'测试次数达到该值后才按评分剔除 (默认: {DEFAULT_MIN_SAMPLES})')
+    parser.add_argument('--top-k', type=int, help='只保留评分最高的 K 个节点')
+    parser.add_argument('--verbose', action='store_true', help='逐个输出被剔除的节点')
     args = parser.parse_args()
 
     # 1. 加载历史数据
@@ -47,84 +84,56 @@ def main():
         print(f"错误: 找不到 CSV 文件 {CSV_PATH}")
         return
     
-    db = load_csv_db(CSV_PATH)
+    db = load_history(CSV_PATH)
     print(f"已加载历史记录: {len(db)} 条")
 
-    # 2. 读取原始 YAML
-    config = None
-    if args.url:
-        print(f"正在从 URL 下载配置: {args.url}")
-        try:
-            resp = requests.get(args.url, timeout=30)
-            resp.raise_for_status()
-            config = yaml.safe_load(resp.text)
-        except Exception as e:
-            print(f"下载或解析 URL 失败: {e}")
-            return
-    else:
-        if not os.path.exists(MERGE_YAML_PATH):
-            print(f"错误: 找不到 YAML 文件 {MERGE_YAML_PATH}")
-            return
-
-        with open(MERGE_YAML_PATH, 'r', encoding='utf-8') as f:
-            try:
-                config = yaml.safe_load(f)
-            except Exception as e:
-                print(f"解析 YAML 失败: {e}")
-                return
+    def report_removed(proxy, reason, detail):
+        if args.verbose:
+            print(f"[剔除] {proxy.get('name', 'Unknown')} | {detail}")
+
+    filter_options = dict(method=args.method, min_score=args.min_score, max_p95=args.max_p95,
+                          max_jitter=args.max_jitter, top_k=args.top_k, on_removed=report_removed,
+                          min_samples=args.min_samples)
+    # 构造输出路径，默认保存在 s 目录下
+    output_path = os.path.join(PROJECT_ROOT, "s", args.outfile)
+
+    # 2. 默认从 merge.yml 读取节点，按合并时相同的方式渲染
+    if not args.url:
+        render_from_merge(db, output_path, filter_options)
+        return
+
+    # 3. 指定 URL 时过滤任意配置，保留其自身的代理组与规则
+    print(f"正在从 URL 下载配置: {args.url}")
+    try:
+        resp = requests.get(args.url, timeout=30)
+        resp.raise_for_status()
+        config = load_config_from_text(resp.text)
+    except Exception as e:
+        print(f"下载或解析 URL 失败: {e}")
+        return
 
     if 'proxies' not in config or not config['proxies']:
         print("警告: 配置文件中没有找到 proxies 节点")
         return
 
-    # 3. 执行过滤逻辑
     original_proxies = config['proxies']
-    filtered_proxies = []
-    removed_count = 0
-
-    print(f"开始过滤 {len(original_proxies)} 个节点...")
-
-    for proxy in original_proxies:
-        # 提取节点特征
-        server = proxy.get('server')
-        port = str(proxy.get('port'))
-        protocol = proxy.get('type', 'unknown')
-        name = proxy.get('name', 'Unknown')
-
-        key = (server, port, protocol)
-        
-        keep = True
-        if key in db:
-            stats = db[key]
-            pass_num = stats['pass']
-            notpass_num = stats['notpass']
-
-            total = pass_num + notpass_num
-            if total > 0:
-                rate = pass_num / total
-                if rate <= 0.5:
-                    keep = False
-                    print(f"[剔除] {name} | Pass: {pass_num}, Fail: {notpass_num}, Rate: {rate:.1%}")
-        
-        if keep:
-            filtered_proxies.append(proxy)
-        else:
-            removed_count += 1
+    print(f"开始过滤 {len(original_proxies)} 个节点 (评分: {args.method}，阈值: {args.min_score})...")
+    result = filter_by_history(original_proxies, db, **filter_options)
+    filtered_proxies = result['proxies']
 
     # 4. 保存结果
     config['proxies'] = filtered_proxies
-    
-    print("-" * 30)
-    print(f"原始节点数: {len(original_proxies)}")
-    print(f"剔除节点数: {removed_count}")
-    print(f"剩余节点数: {len(filtered_proxies)}")
-    
-    # 构造输出路径，默认保存在 s 目录下
-    output_path = os.path.join(PROJECT_ROOT, "s", args.outfile)
+    # 代理组中直接列出的节点名称，删除其中被剔除的节点
+    if config.get('proxy-groups'):
+        kept_names = {str(p.get('name')) for p in filtered_proxies}
+        removed_names = {str(p.get('name')) for p in original_proxies} - kept_names
+        config['proxy-groups'] = prune_groups(config['proxy-groups'], removed_names)
+
+    print_summary(len(original_proxies), result)
     with open(output_path, 'w', encoding='utf-8') as f:
         # allow_unicode=True 确保中文不乱码，sort_keys=False 保持字段顺序
         yaml.dump(config, f, allow_unicode=True, sort_keys=False)
-    
+
     print(f"已生成新配置文件: {output_path}")
 
 if __name__ == "__main__":
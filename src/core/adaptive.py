@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger('Core.Adaptive')
+
+
+def percentile(sorted_values: list, q: float) -> Optional[float]:
+    """对已排序的列表取分位数 (最近秩法)，列表为空时返回 None"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class AIMDController:
+    """
+    延迟测试的自适应并发与超时控制器 (AIMD)。
+
+    每完成 window 个探测评估一次窗口：
+      - 出现拥塞信号时并发上限乘以 decrease_factor (乘性减)；
+      - 否则并发上限增加 increase_step (加性增)。
+    拥塞信号包括：控制器本身响应超时；窗口内成功延迟中位数超过延迟基线的
+    latency_tolerance 倍；窗口失败率比长期失败率高出 error_margin 以上。
+    免费节点本身失败率就很高，因此失败率以长期均值为基线而非绝对阈值。
+    延迟基线是各窗口中位数的指数移动平均 (权重 baseline_smoothing)：若取历史最小值，
+    一个偶然偏快的窗口会让之后所有窗口都被判为拥塞，并发被永久压低。
+
+    单次探测的超时时间取最近成功延迟的 timeout_percentile 分位数乘以 timeout_factor，
+    并限制在 [min_timeout_ms, max_timeout_ms] 区间内。
+    超时的探测不会进入成功延迟的样本，超时越短样本越偏向快节点，超时会自我强化地不断缩短，
+    慢但可用的节点随之被记为失败；因此 min_timeout_ms 默认与初始超时相同，超时只在成功延迟偏高时延长。
+    """
+    def __init__(self, initial_limit: int = 32, min_limit: int = 4, max_limit: int = 256,
+                 initial_timeout_ms: int = 2000, min_timeout_ms: Optional[int] = None, max_timeout_ms: int = 5000,
+                 window: int = 32, increase_step: float = 2.0, decrease_factor: float = 0.5,
+                 latency_tolerance: float = 2.0, error_margin: float = 0.2,
+                 timeout_percentile: float = 0.95, timeout_factor: float = 1.5, sample_size: int = 512,
+                 baseline_smoothing: float = 0.2):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.min_timeout_ms = initial_timeout_ms if min_timeout_ms is None else min_timeout_ms
+        self.max_timeout_ms = max_timeout_ms
+        self.timeout_ms = int(max(self.min_timeout_ms, min(initial_timeout_ms, max_timeout_ms)))
+        self.window = window
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.error_margin = error_margin
+        self.timeout_percentile = timeout_percentile
+        self.timeout_factor = timeout_factor
+        self.baseline_smoothing = baseline_smoothing
+
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._latencies = deque(maxlen=sample_size)
+        self._window_latencies = []
+        self._window_total = 0
+        self._window_failures = 0
+        self._window_stalls = 0
+        self._baseline_latency: Optional[float] = None
+        self._error_rate: Optional[float] = None
+
+        self.peak_limit = int(self.limit)
+        self.increases = 0
+        self.decreases = 0
+        self.completed = 0
+
+    @property
+    def concurrency(self) -> int:
+        return int(self.limit)
+
+    def acquire(self):
+        """等待直到在途探测数低于当前并发上限"""
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, is_success: bool, delay_ms: Optional[float] = None, stalled: bool = False):
+        """
+        报告一次探测结果并释放并发名额。
+
+        Args:
+            is_success: 探测是否成功。
+            delay_ms: 成功时内核报告的延迟。
+            stalled: 控制器本身未在客户端超时内响应 (测试机过载的直接信号)。
+        """
+        with self._cond:
+            self._in_flight -= 1
+            self.completed += 1
+            self._window_total += 1
+            if is_success and delay_ms is not None and delay_ms > 0:
+                self._window_latencies.append(delay_ms)
+                self._latencies.append(delay_ms)
+            else:
+                self._window_failures += 1
+            if stalled:
+                self._window_stalls += 1
+
+            if self._window_total >= self.window:
+                self._evaluate_window()
+            self._cond.notify_all()
+
+    def _evaluate_window(self):
+        failure_rate = self._window_failures / self._window_total
+        median = percentile(sorted(self._window_latencies), 0.5)
+
+        congested = self._window_stalls > 0
+        if median is not None:
+            if self._baseline_latency is not None and median > self._baseline_latency * self.latency_tolerance:
+                congested = True
+            if self._baseline_latency is None:
+                self._baseline_latency = median
+            else:
+                self._baseline_latency += self.baseline_smoothing * (median - self._baseline_latency)
+        if self._error_rate is not None and failure_rate > self._error_rate + self.error_margin:
+            congested = True
+
+        if congested:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self.decreases += 1
+        else:
+            self.limit = min(self.max_limit, self.limit + self.increase_step)
+            self.increases += 1
+            # 只用非拥塞窗口更新失败率基线，避免拥塞期间基线被抬高
+            self._error_rate = failure_rate if self._error_rate is None else 0.8 * self._error_rate + 0.2 * failure_rate
+        self.peak_limit = max(self.peak_limit, int(self.limit))
+
+        latency_p = percentile(sorted(self._latencies), self.timeout_percentile)
+        if latency_p is not None:
+            self.timeout_ms = int(max(self.min_timeout_ms, min(latency_p * self.timeout_factor, self.max_timeout_ms)))
+
+        logger.debug(f"窗口评估: 失败率 {failure_rate:.1%}, 中位延迟 {median}, 拥塞 {congested}, "
+                     f"并发 {int(self.limit)}, 超时 {self.timeout_ms}ms")
+        self._window_latencies = []
+        self._window_total = 0
+        self._window_failures = 0
+        self._window_stalls = 0
+
+    def summary(self) -> dict:
+        """返回本次运行选用的参数，用于输出运行摘要"""
+        with self._cond:
+            ordered = sorted(self._latencies)
+            return {
+                'completed': self.completed,
+                'concurrency': int(self.limit),
+                'peak_concurrency': self.peak_limit,
+                'timeout_ms': self.timeout_ms,
+                'latency_p50': percentile(ordered, 0.5),
+                'latency_p95': percentile(ordered, 0.95),
+                'increases': self.increases,
+                'decreases': self.decreases,
+            }
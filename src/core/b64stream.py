@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+增量 Base64 编码写出 (URL Safe，无填充)。
+
+订阅文件是所有链接以换行连接后整体 Base64 编码的结果。Base64 每 3 个字节独立编码为 4 个字符，
+所以只要每次编码的字节数是 3 的倍数，分块编码再拼接的结果与整体编码完全相同；
+不足 3 字节的尾部留到下一块，关闭时再编码并去掉填充。
+"""
+import base64
+import os
+from pathlib import Path
+from typing import Iterable
+
+# 每次编码的块大小，必须是 3 的倍数
+CHUNK_SIZE = 3 * 16 * 1024
+
+
+class Base64Writer:
+    """把写入的字节增量编码后写入二进制文件对象，输出与 urlsafe_b64encode(全部字节).rstrip('=') 一致"""
+    def __init__(self, fp, chunk_size: int = CHUNK_SIZE):
+        if chunk_size % 3:
+            raise ValueError("chunk_size 必须是 3 的倍数")
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.bytes_in = 0
+        self._buffer = bytearray()
+
+    def write(self, data: bytes):
+        self.bytes_in += len(data)
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_size:
+            aligned = len(self._buffer) - len(self._buffer) % 3
+            self.fp.write(base64.urlsafe_b64encode(self._buffer[:aligned]))
+            del self._buffer[:aligned]
+
+    def close(self):
+        """编码剩余不足一块的字节并去掉末尾填充"""
+        if self._buffer:
+            self.fp.write(base64.urlsafe_b64encode(self._buffer).rstrip(b'='))
+            self._buffer.clear()
+
+
+def write_base64_lines(lines: Iterable[str], output_path: Path) -> int:
+    """
+    把各行以换行连接 (末尾无换行) 后 Base64 编码写入文件，不在内存中拼接完整内容。
+    先写入临时文件，成功后再替换目标文件。返回写出的行数。
+    """
+    tmp_path = output_path.with_name(output_path.name + '.tmp')
+    count = 0
+    try:
+        with tmp_path.open('wb') as f:
+            writer = Base64Writer(f)
+            for line in lines:
+                if count:
+                    writer.write(b'\n')
+                writer.write(line.encode('utf-8'))
+                count += 1
+            writer.close()
+        os.replace(tmp_path, output_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return count
+
+
+def iter_base64_decode(fp, chunk_size: int = 4 * 16 * 1024):
+    """
+    增量解码 Base64Writer 写出的内容 (URL Safe，无填充)，逐块产出原始字节。
+    每次解码 4 的倍数个字符，最后一块补齐填充。
+    """
+    pending = b''
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk.strip()
+        aligned = len(pending) - len(pending) % 4
+        if aligned:
+            yield base64.urlsafe_b64decode(pending[:aligned])
+            pending = pending[aligned:]
+    if pending:
+        yield base64.urlsafe_b64decode(pending + b'=' * (-len(pending) % 4))
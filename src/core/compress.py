@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+为输出文件生成预压缩的副本 (merge.yml.gz、merge.yml.br 等)，供静态服务直接返回压缩内容。
+gzip 头中的时间戳固定为 0，相同内容总是得到相同的字节，不会引起无意义的 git 变更。
+"""
+import gzip
+import logging
+import os
+from pathlib import Path
+from typing import Iterable
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    brotli = None
+    HAS_BROTLI = False
+
+logger = logging.getLogger('Core.Compress')
+
+COMPRESS_FORMATS = ('gz', 'br')
+CHUNK_SIZE = 64 * 1024
+
+
+def _gzip_file(src, dst):
+    # filename='' 与 mtime=0 使头部不包含文件名与时间
+    with gzip.GzipFile(filename='', mode='wb', fileobj=dst, compresslevel=9, mtime=0) as gz:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            gz.write(chunk)
+
+
+def _brotli_file(src, dst):
+    compressor = brotli.Compressor(quality=11)
+    for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+        dst.write(compressor.process(chunk))
+    dst.write(compressor.finish())
+
+
+_COMPRESSORS = {'gz': _gzip_file, 'br': _brotli_file}
+
+
+def available_formats(formats: Iterable[str]) -> tuple:
+    """过滤掉当前环境不支持的格式 (未安装 brotli 时跳过 br)"""
+    return tuple(fmt for fmt in formats if fmt != 'br' or HAS_BROTLI)
+
+
+def write_compressed(path: Path, formats: Iterable[str], force: bool = False) -> list:
+    """
+    为 path 生成压缩副本 (path + '.gz' 等)，先写临时文件再替换。
+    force 为 False 时只生成缺失或比源文件旧的副本。返回写出的副本路径。
+    """
+    written = []
+    for fmt in available_formats(formats):
+        target = path.with_name(f"{path.name}.{fmt}")
+        if not force and target.is_file() and target.stat().st_mtime >= path.stat().st_mtime:
+            continue
+        tmp_path = target.with_name(target.name + '.tmp')
+        try:
+            with path.open('rb') as src, tmp_path.open('wb') as dst:
+                _COMPRESSORS[fmt](src, dst)
+            os.replace(tmp_path, target)
+            written.append(target)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+    return written
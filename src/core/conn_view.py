@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+根据连通性历史记录过滤节点，生成 conn.yml 视图 (conn.py 与合并时的渲染共用)。
+"""
+import time
+from collections import Counter
+from typing import Optional
+
+from .history import endpoint_key
+from .latency import summarize
+from .scoring import score_rows, top_k_indices
+
+# 测试次数达到该值后才按评分阈值剔除。通过率下界在样本很少时很低 (1/1 通过的 Wilson 下界约 0.21，
+# 2/2 约 0.34)，直接比较会让刚验证通过的节点比从未测试的节点更容易被剔除
+DEFAULT_MIN_SAMPLES = 5
+
+
+def filter_by_history(proxies: list, db: dict, method: str = 'wilson', min_score: float = 0.3,
+                      max_p95: Optional[float] = None, max_jitter: Optional[float] = None,
+                      top_k: Optional[int] = None, on_removed=None,
+                      min_samples: int = DEFAULT_MIN_SAMPLES) -> dict:
+    """
+    按可靠性评分 (通过率置信下界)、延迟 p95 与抖动过滤节点，可选只保留评分最高的 K 个。
+    测试次数少于 min_samples 的节点 (包括没有测试记录的节点) 不参与评分阈值过滤，Top-K 排序时仍使用其评分。
+
+    Args:
+        on_removed: 每剔除一个节点时调用 on_removed(proxy, reason, detail)
+
+    Returns:
+        {'proxies': 保留的节点 (保持原有顺序), 'scores': 对应评分 (无记录为 None),
+         'removed': 按原因统计的剔除数量, 'history': 参与评分的记录数, 'score_ms': 评分耗时}
+    """
+    # 一次性计算全部历史记录的可靠性评分
+    started = time.perf_counter()
+    keys = [key for key, stats in db.items() if stats['pass'] + stats['notpass'] > 0]
+    values = score_rows([db[key]['pass'] for key in keys],
+                        [db[key]['pass'] + db[key]['notpass'] for key in keys], method=method)
+    scores = dict(zip(keys, values))
+    unknown_score = score_rows([0], [0], method=method)[0]
+    score_ms = (time.perf_counter() - started) * 1000
+
+    candidates = []
+    removed = Counter()
+    latency_cache = {}
+    check_latency = max_p95 is not None or max_jitter is not None
+    for proxy in proxies:
+        key = endpoint_key(proxy)
+        score = scores.get(key)
+
+        reason = None
+        if score is not None and score < min_score and db[key]['pass'] + db[key]['notpass'] >= min_samples:
+            reason = '评分过低'
+            detail = f"Pass: {db[key]['pass']}, Fail: {db[key]['notpass']}, Score: {score:.3f}"
+        elif check_latency and key in db:
+            summary = latency_cache.get(key)
+            if summary is None:
+                summary = latency_cache[key] = summarize(db[key])
+            if max_p95 is not None and summary['p95'] is not None and summary['p95'] > max_p95:
+                reason, detail = '延迟 p95 过高', f"延迟 p95: {summary['p95']:.0f}ms"
+            elif max_jitter is not None and summary['samples'] > 1 and summary['jitter'] > max_jitter:
+                reason, detail = '延迟抖动过大', f"延迟抖动: {summary['jitter']:.0f}ms"
+
+        if reason:
+            removed[reason] += 1
+            if on_removed:
+                on_removed(proxy, reason, detail)
+        else:
+            candidates.append((proxy, score))
+
+    # Top-K 模式：只保留评分最高的 K 个节点，保持原有顺序
+    if top_k is not None and len(candidates) > top_k:
+        kept = set(top_k_indices([unknown_score if score is None else score for _, score in candidates], top_k))
+        removed['超出 Top-K'] += len(candidates) - len(kept)
+        candidates = [item for index, item in enumerate(candidates) if index in kept]
+
+    return {
+        'proxies': [proxy for proxy, _ in candidates],
+        'scores': [score for _, score in candidates],
+        'removed': removed,
+        'history': len(keys),
+        'score_ms': score_ms,
+    }
+
+
+def prune_groups(groups: list, removed_names) -> list:
+    """
+    从代理组中删除被剔除的节点。删除后没有任何成员 (且不是 include-all / use 组) 的组也一并删除，
+    并继续从其他组中删除对它的引用，避免输出引用不存在的节点或组的配置。
+    """
+    removed = set(removed_names)
+    if not removed or not groups:
+        return groups
+    dropped = set()
+    result = []
+    for group in groups:
+        members = group.get('proxies') if isinstance(group, dict) else None
+        if members and removed.intersection(str(m) for m in members):
+            members = [m for m in members if str(m) not in removed]
+            if not members and not group.get('include-all') and not group.get('use'):
+                dropped.add(group.get('name'))
+                continue
+            group = {**group, 'proxies': members}
+        result.append(group)
+    return prune_groups(result, dropped) if dropped else result
@@ -1,18 +1,67 @@
 # -*- coding: utf-8 -*-
+import json
+import os
 import re
+import threading
+import time
 import logging
-from typing import Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterator, Callable
+
+import requests
+
 from .network import NetworkClient
 
 logger = logging.getLogger('GitHubAPI')
 
+API_ROOT = "https://api.github.com"
+# contents API 最多返回 1000 个条目，达到该数量时改用 git trees API
+CONTENTS_API_LIMIT = 1000
+# 文件列表只缓存查找文件时用到的字段
+FILE_FIELDS = ('name', 'path', 'type', 'sha', 'size', 'download_url')
+# 缓存文件中保存速率限制状态的键 (其余键均为请求 URL)
+RATE_LIMIT_KEY = '_rate_limit'
+
+
+def _slim_files(data: Any) -> Any:
+    if not isinstance(data, list):
+        return data
+    return [{k: item.get(k) for k in FILE_FIELDS} for item in data if isinstance(item, dict)]
+
+
+def _slim_tree(data: Any) -> Any:
+    if not isinstance(data, dict) or not isinstance(data.get('tree'), list):
+        return data
+    tree = [{k: entry.get(k) for k in ('path', 'type', 'sha', 'size')} for entry in data['tree'] if isinstance(entry, dict)]
+    return {'tree': tree, 'truncated': data.get('truncated', False)}
+
+
 class GitHubClient:
     """
     GitHub API 交互客户端。
+
+    - 条件请求：响应的 ETag 与内容缓存在磁盘上，下次请求携带 If-None-Match，
+      内容未变化时 GitHub 返回 304，不计入速率限制。
+    - 速率限制：记录响应头中的 X-RateLimit-Remaining / X-RateLimit-Reset，
+      剩余次数耗尽时，在 max_wait 秒内会重置则等待，否则推迟请求并退回缓存内容。
+      耗尽状态与 ETag 一起写入缓存文件，下次运行在重置前直接使用缓存，不再发出注定失败的请求；
+      未耗尽时不写入，避免缓存文件每次运行都变化。
     """
-    def __init__(self, token: Optional[str] = None, network_client: Optional[NetworkClient] = None):
+    def __init__(self, token: Optional[str] = None, network_client: Optional[NetworkClient] = None,
+                 cache_path: Optional[Path] = None, min_remaining: int = 1, max_wait: int = 60):
         self.token = token
         self.client = network_client or NetworkClient()
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.min_remaining = min_remaining
+        self.max_wait = max_wait
+        self.rate_remaining: Optional[int] = None
+        self.rate_reset: Optional[int] = None
+        self.stats = {'requests': 0, 'not_modified': 0, 'deferred': 0}
+        self._lock = threading.Lock()
+        self._cache = self._load_cache()
+        self._cache_dirty = False
+        self._saved_rate_limit = self._restore_rate_limit()
 
     def _get_headers(self) -> Dict[str, str]:
         headers = {'Accept': 'application/vnd.github.v3+json'}
@@ -20,17 +69,156 @@ class GitHubClient:
             headers['Authorization'] = f"token {self.token}"
         return headers
 
+    # --- ETag 缓存 ---
+
+    def _load_cache(self) -> Dict[str, Dict[str, Any]]:
+        if not self.cache_path or not self.cache_path.is_file():
+            return {}
+        try:
+            with self.cache_path.open('r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取 GitHub API 缓存失败: {e}，将忽略缓存。")
+            return {}
+
+    def _restore_rate_limit(self) -> Optional[Dict[str, int]]:
+        """取出上次运行保存的速率限制状态，已过重置时间的忽略"""
+        state = self._cache.pop(RATE_LIMIT_KEY, None)
+        if not isinstance(state, dict):
+            return None
+        remaining, reset = state.get('remaining'), state.get('reset')
+        if not isinstance(remaining, int) or not isinstance(reset, int):
+            return None
+        if reset > time.time():
+            self.rate_remaining, self.rate_reset = remaining, reset
+            logger.info(f"上次运行时 GitHub API 剩余次数 {remaining}，限额将在 {reset - time.time():.0f}s 后重置。")
+        return state
+
+    def _rate_limit_state(self) -> Optional[Dict[str, int]]:
+        """需要持久化的速率限制状态：仅在剩余次数不足且尚未重置时保存"""
+        with self._lock:
+            remaining, reset = self.rate_remaining, self.rate_reset
+        if remaining is None or reset is None or remaining >= self.min_remaining or reset <= time.time():
+            return None
+        return {'remaining': remaining, 'reset': reset}
+
+    def save_cache(self):
+        """缓存有变化时写回磁盘 (保存 ETag、内容与耗尽的速率限制，均不变时文件保持不变)"""
+        if not self.cache_path:
+            return
+        rate_limit = self._rate_limit_state()
+        if not self._cache_dirty and rate_limit == self._saved_rate_limit:
+            return
+        data = dict(self._cache)
+        if rate_limit:
+            data[RATE_LIMIT_KEY] = rate_limit
+        # 先写临时文件再替换，运行中断时不会留下无法解析的半截缓存
+        tmp_path = self.cache_path.with_name(self.cache_path.name + '.tmp')
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open('w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+            self._cache_dirty = False
+            self._saved_rate_limit = rate_limit
+        except OSError as e:
+            logger.warning(f"写入 GitHub API 缓存失败: {e}")
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    # --- 速率限制 ---
+
+    def _update_rate_limit(self, response: requests.Response):
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        reset = response.headers.get('X-RateLimit-Reset')
+        with self._lock:
+            if remaining is not None and remaining.isdigit():
+                self.rate_remaining = int(remaining)
+            if reset is not None and reset.isdigit():
+                self.rate_reset = int(reset)
+
+    def _wait_for_rate_limit(self) -> bool:
+        """剩余次数不足时决定等待还是推迟，返回 True 表示可以发出请求"""
+        with self._lock:
+            remaining, reset = self.rate_remaining, self.rate_reset
+        if remaining is None or remaining >= self.min_remaining:
+            return True
+        wait = (reset or 0) - time.time()
+        if wait <= 0:
+            return True
+        if wait <= self.max_wait:
+            logger.info(f"GitHub API 剩余次数 {remaining}，等待 {wait:.0f}s 至限额重置。")
+            time.sleep(wait + 1)
+            return True
+        logger.warning(f"GitHub API 剩余次数 {remaining}，限额将在 {wait / 60:.0f} 分钟后重置，推迟本次请求。")
+        return False
+
+    def _get_json(self, url: str, params: Optional[Dict] = None,
+                  transform: Optional[Callable[[Any], Any]] = None) -> Any:
+        """
+        发起带 ETag 缓存的 GET 请求并返回 JSON。
+        304 或请求被推迟/失败时返回缓存内容；没有缓存时返回 None。
+        transform 在写入缓存前精简响应 (只保留用得到的字段)，避免缓存文件过大。
+        """
+        cache_key = url if not params else f"{url}?{'&'.join(f'{k}={v}' for k, v in sorted(params.items()))}"
+        with self._lock:
+            cached = self._cache.get(cache_key)
+
+        if not self._wait_for_rate_limit():
+            with self._lock:
+                self.stats['deferred'] += 1
+            return cached['data'] if cached else None
+
+        headers = self._get_headers()
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+
+        try:
+            response = self.client.get(url, params=params, headers=headers)
+        except requests.HTTPError as e:
+            if e.response is not None:
+                self._update_rate_limit(e.response)
+            if cached:
+                logger.warning(f"GitHub API 请求失败，使用缓存内容: {url}")
+                return cached['data']
+            raise
+
+        self._update_rate_limit(response)
+        with self._lock:
+            self.stats['requests'] += 1
+            if response.status_code == 304 and cached:
+                self.stats['not_modified'] += 1
+                logger.info(f"内容未变化 (304)，使用缓存: {url}")
+                return cached['data']
+
+        data = response.json()
+        if transform:
+            data = transform(data)
+        etag = response.headers.get('ETag')
+        if etag:
+            with self._lock:
+                self._cache[cache_key] = {'etag': etag, 'data': data}
+                self._cache_dirty = True
+        return data
+
+    # --- 文件列表 ---
+
     def list_files(self, repo: str) -> List[Dict[str, Any]]:
         """
         获取 GitHub 仓库根目录下的文件列表。
+        条目数达到 contents API 上限时改用 git trees API，避免列表被截断。
         """
-        api_url = f"https://api.github.com/repos/{repo}/contents/"
+        api_url = f"{API_ROOT}/repos/{repo}/contents/"
         logger.info(f"正在查询 GitHub API: {api_url}")
 
         try:
-            response = self.client.get(api_url, headers=self._get_headers())
-            data = response.json()
+            data = self._get_json(api_url, transform=_slim_files)
             if isinstance(data, list):
+                if len(data) >= CONTENTS_API_LIMIT:
+                    logger.info(f"目录条目数达到 contents API 上限 ({len(data)})，改用 git trees API。")
+                    return self.list_tree(repo) or data
                 logger.info(f"成功获取文件列表，共 {len(data)} 个文件。")
                 return data
             else:
@@ -40,6 +228,36 @@ class GitHubClient:
             logger.error(f"GitHub API 请求失败: {e}")
             return []
 
+    def list_tree(self, repo: str, ref: str = 'HEAD') -> List[Dict[str, Any]]:
+        """
+        通过 git trees API 获取根目录文件列表，转换为与 contents API 相同的字段。
+        """
+        api_url = f"{API_ROOT}/repos/{repo}/git/trees/{ref}"
+        try:
+            data = self._get_json(api_url, transform=_slim_tree)
+        except Exception as e:
+            logger.error(f"GitHub trees API 请求失败: {e}")
+            return []
+        if not isinstance(data, dict) or not isinstance(data.get('tree'), list):
+            logger.warning(f"GitHub trees API 返回了无效数据: {data}")
+            return []
+        if data.get('truncated'):
+            logger.warning(f"仓库 {repo} 的文件树被截断，结果可能不完整。")
+
+        files = []
+        for entry in data['tree']:
+            path = entry.get('path', '')
+            files.append({
+                'name': path.rsplit('/', 1)[-1],
+                'path': path,
+                'type': 'file' if entry.get('type') == 'blob' else 'dir',
+                'sha': entry.get('sha'),
+                'size': entry.get('size') or 0,
+                'download_url': f"https://raw.githubusercontent.com/{repo}/{ref}/{path}",
+            })
+        logger.info(f"成功获取文件树，共 {len(files)} 个条目。")
+        return files
+
     def find_latest_file(self, repo: str, file_pattern: str) -> Optional[Dict[str, Any]]:
         """
         在 GitHub 仓库中查找符合正则模式的最新文件。
@@ -72,12 +290,39 @@ class GitHubClient:
             return None
 
         # 按文件名降序排序（通常文件名包含日期），获取最新的一个
-        latest = sorted(matched_files, key=lambda x: x['name'], reverse=True)[0]
+        latest = max(matched_files, key=lambda x: x['name'])
         logger.info(f"找到最新的有效配置文件: {latest.get('name')}")
         return latest
 
+    def find_latest_files(self, patterns: Dict[str, str], max_workers: int = 4) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        并发地在多个仓库中查找最新文件，共享同一份 ETag 缓存与速率限制状态。
+
+        Args:
+            patterns: {仓库: 文件名正则}
+
+        Returns:
+            {仓库: 文件信息或 None}
+        """
+        if not patterns:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(patterns))) as executor:
+            futures = {repo: executor.submit(self.find_latest_file, repo, pattern) for repo, pattern in patterns.items()}
+            return {repo: future.result() for repo, future in futures.items()}
+
     def fetch_content(self, url: str) -> Optional[str]:
         """
         下载文件内容，自动携带认证 Token。
         """
-        return self.client.fetch_text(url, headers=self._get_headers())
\ No newline at end of file
+        return self.client.fetch_text(url, headers=self._get_headers())
+
+    def stream_lines(self, url: str) -> Iterator[str]:
+        """
+        以流的方式逐行下载文件内容，自动携带认证 Token。
+        """
+        return self.client.iter_lines(url, headers=self._get_headers())
+
+    def rate_limit_summary(self) -> str:
+        remaining = '未知' if self.rate_remaining is None else self.rate_remaining
+        return (f"请求 {self.stats['requests']} 次 (304: {self.stats['not_modified']})，"
+                f"推迟 {self.stats['deferred']} 次，剩余限额 {remaining}")
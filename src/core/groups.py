@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+根据节点的国家与可靠性评分生成 proxy-groups。
+
+客户端对 url-test 组中的每个节点定时测速，组越大探测量越大。这里为每个国家生成一个 url-test 组，
+只放入该国家评分最高的 K 个节点，另外生成一个全局优选组，放入全部节点中评分最高的若干个；
+模板中的自动选择组引用全局优选组，不再对全部节点测速。生成的组均为 lazy，只在被选中时测速。
+评分为连通性历史记录的通过率置信下界 (见 core/scoring.py)，评分相同时按服务器出现次数排序。
+"""
+import heapq
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from .conn_view import prune_groups
+from .history import endpoint_key
+from .proxy_tools import extract_country_code, extract_appearances, get_flag, is_timestamp_node
+from .scoring import score_rows
+
+GLOBAL_GROUP_NAME = '🏆 全球优选'
+COUNTRY_GROUP_SUFFIX = '优选'
+
+
+def rank_proxies(proxies: Iterable[dict], history_db: dict, method: str = 'wilson', by: str = 'score') -> list:
+    """
+    计算每个节点的排序键，返回 [(排序键, 国家代码, 节点)]，时间戳节点不参与。
+    by 为 'score' 时排序键为 (评分, 出现次数, -原始位置)，为 'appearances' 时为 (出现次数, 评分, -原始位置)；
+    越大越好，原始位置保证结果稳定。没有测试记录的节点使用零样本评分。
+    """
+    candidates = [proxy for proxy in proxies if not is_timestamp_node(proxy)]
+    records = [history_db.get(endpoint_key(proxy)) for proxy in candidates]
+    scores = score_rows([record['pass'] if record else 0 for record in records],
+                        [record['pass'] + record['notpass'] if record else 0 for record in records],
+                        method=method)
+    ranked = []
+    for index, (proxy, score) in enumerate(zip(candidates, scores)):
+        name = proxy.get('name', '')
+        appearances = extract_appearances(name)
+        sort_key = (appearances, score, -index) if by == 'appearances' else (score, appearances, -index)
+        ranked.append((sort_key, extract_country_code(name), proxy))
+    return ranked
+
+
+def _top_k_heaps(ranked: list, k: int) -> dict:
+    """用大小为 K 的小顶堆为每个国家选出排序键最大的 K 个节点，返回 {国家代码: [(排序键, 节点)] (无序)}"""
+    heaps = defaultdict(list)
+    for sort_key, country, proxy in ranked:
+        heap = heaps[country]
+        # 排序键包含唯一的原始位置，比较时不会落到节点字典上
+        if len(heap) < k:
+            heapq.heappush(heap, (sort_key, proxy))
+        elif sort_key > heap[0][0]:
+            heapq.heapreplace(heap, (sort_key, proxy))
+    return heaps
+
+
+def top_k_by_country(ranked: list, k: int) -> dict:
+    """每个国家排序键最大的 K 个节点，返回 {国家代码: [节点 (按排序键降序)]}，无法识别国家的节点不参与"""
+    heaps = _top_k_heaps([item for item in ranked if item[1]], k)
+    return {country: [proxy for _, proxy in sorted(heap, key=lambda item: item[0], reverse=True)]
+            for country, heap in heaps.items()}
+
+
+def select_top_by_country(proxies: list, history_db: dict, per_country: int = 5, limit: Optional[int] = None,
+                          method: str = 'wilson') -> list:
+    """
+    精简节点列表：每个国家按 (出现次数, 评分) 保留前 per_country 个节点，
+    总数超过 limit 时再从中保留排序键最大的 limit 个。无法识别国家的节点 (例如手动节点) 作为一组参与。
+    结果保持节点原有的顺序，时间戳节点总是保留。
+    """
+    ranked = [(key, country or '?', proxy)
+              for key, country, proxy in rank_proxies(proxies, history_db, method, by='appearances')]
+    chosen = [item for heap in _top_k_heaps(ranked, per_country).values() for item in heap]
+    if limit is not None and len(chosen) > limit:
+        chosen = heapq.nlargest(limit, chosen, key=lambda item: item[0])
+    keep = {id(proxy) for _, proxy in chosen}
+    return [proxy for proxy in proxies if id(proxy) in keep or is_timestamp_node(proxy)]
+
+
+def build_country_groups(proxies: list, history_db: dict, top_k: int = 10, global_k: int = 20,
+                         method: str = 'wilson', interval: int = 300, tolerance: int = 100,
+                         url: Optional[str] = None) -> list:
+    """
+    生成按国家划分的 url-test 组 (每组最多 top_k 个节点) 与全局优选组 (最多 global_k 个节点)。
+    国家组按国家代码排序，全局优选组在最前。
+    """
+    ranked = rank_proxies(proxies, history_db, method)
+    if not ranked:
+        return []
+
+    def url_test(name, members):
+        group = {'name': name, 'type': 'url-test', 'proxies': [str(p['name']) for p in members]}
+        if url:
+            group['url'] = url
+        group['interval'] = interval
+        group['tolerance'] = tolerance
+        group['lazy'] = True
+        return group
+
+    groups = []
+    if global_k > 0:
+        best = heapq.nlargest(global_k, ranked, key=lambda item: item[0])
+        groups.append(url_test(GLOBAL_GROUP_NAME, [proxy for _, _, proxy in best]))
+    if top_k > 0:
+        for country, members in sorted(top_k_by_country(ranked, top_k).items()):
+            groups.append(url_test(f"{get_flag(country)} {country} {COUNTRY_GROUP_SUFFIX}", members))
+    return groups
+
+
+def attach_groups(groups: list, generated: list, parent: Optional[str]) -> list:
+    """
+    返回模板中的组加上生成的组；parent 为模板中某个 select 组的名称时，
+    把生成的组追加为它的可选项。不修改传入的模板组。
+    没有生成全局优选组时 (例如 --group-global-k 0 或没有节点)，删除模板中对它的引用，避免输出无效的配置。
+    """
+    names = [group['name'] for group in generated]
+    if GLOBAL_GROUP_NAME not in names:
+        groups = prune_groups(groups or [], {GLOBAL_GROUP_NAME})
+    result = []
+    for group in groups or []:
+        if parent and isinstance(group, dict) and group.get('name') == parent:
+            group = {**group, 'proxies': [*(group.get('proxies') or []), *names]}
+        result.append(group)
+    return result + generated
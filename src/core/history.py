@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import csv
+import logging
+import time
+from pathlib import Path
+from typing import Optional
+
+from core.latency import empty_histogram, update_latency, encode_histogram, decode_histogram
+
+logger = logging.getLogger('Core.History')
+
+# 连通性历史记录 (node-connective.csv) 的列
+# streak: 连续相同结果的次数，正数为连续通过，负数为连续失败
+# last_tested: 最近一次测试的 Unix 时间戳 (秒)
+# latency_hist / jitter / last_delay: 成功探测的延迟分桶计数、平滑抖动与最近延迟 (见 core.latency)
+# country: 最近一次测试时从节点名称中解析出的国家代码，未知时为空
+HISTORY_FIELDS = ['ip', 'port', 'protocol', 'pass', 'notpass', 'success_rate', 'streak', 'last_tested',
+                  'latency_hist', 'jitter', 'last_delay', 'country']
+
+
+def endpoint_key(proxy: dict) -> tuple[str, str, str]:
+    """节点在历史记录中的键: (ip, port, protocol)，端口统一为字符串"""
+    return (str(proxy.get('server')), str(proxy.get('port')), proxy.get('type', 'unknown'))
+
+
+def probe_name(key: tuple[str, str, str]) -> str:
+    """端点在测试内核中使用的唯一代理名称，避免同名节点互相覆盖"""
+    ip, port, protocol = key
+    return f"{protocol}|{ip}:{port}"
+
+
+def group_by_endpoint(proxies: list) -> dict:
+    """
+    按端点 (ip, port, protocol) 对节点分组，保持首次出现的顺序。
+    同一端点的多个节点 (名称不同或同名) 只需测试一次，结果共享给所有别名。
+    """
+    groups = {}
+    for proxy in proxies:
+        if not isinstance(proxy, dict) or 'server' not in proxy or 'port' not in proxy:
+            continue
+        groups.setdefault(endpoint_key(proxy), []).append(proxy)
+    return groups
+
+
+def new_record() -> dict:
+    return {'pass': 0, 'notpass': 0, 'streak': 0, 'last_tested': 0,
+            'hist': empty_histogram(), 'jitter': 0.0, 'last_delay': 0, 'country': ''}
+
+
+def load_history(path: Path) -> dict:
+    """
+    读取连通性历史记录。
+    兼容只有 pass/notpass 列的旧格式，缺失的列按默认值处理。
+    """
+    db = {}
+    path = Path(path)
+    if not path.is_file():
+        return db
+
+    with path.open('r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            key = (row['ip'], str(row['port']), row['protocol'])
+            try:
+                record = new_record()
+                record['pass'] = int(row['pass'])
+                record['notpass'] = int(row['notpass'])
+                record['streak'] = int(row.get('streak') or 0)
+                record['last_tested'] = int(float(row.get('last_tested') or 0))
+                record['hist'] = decode_histogram(row.get('latency_hist'))
+                record['jitter'] = float(row.get('jitter') or 0)
+                record['last_delay'] = int(float(row.get('last_delay') or 0))
+                record['country'] = row.get('country') or ''
+            except (TypeError, ValueError):
+                continue
+            db[key] = record
+    return db
+
+
+def save_history(path: Path, db: dict):
+    """保存连通性历史记录，按成功率降序排列"""
+    rows = []
+    for (ip, port, protocol), stats in db.items():
+        total = stats['pass'] + stats['notpass']
+        rate = f"{(stats['pass'] / total * 100):.1f}" if total > 0 else "0.0"
+        rows.append({
+            'ip': ip, 'port': port, 'protocol': protocol,
+            'pass': stats['pass'], 'notpass': stats['notpass'], 'success_rate': rate,
+            'streak': stats.get('streak', 0), 'last_tested': stats.get('last_tested', 0),
+            'latency_hist': encode_histogram(stats.get('hist') or []),
+            'jitter': f"{stats.get('jitter', 0.0):.1f}", 'last_delay': stats.get('last_delay', 0),
+            'country': stats.get('country', '')
+        })
+
+    rows.sort(key=lambda x: float(x['success_rate']), reverse=True)
+
+    with Path(path).open('w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def record_result(db: dict, key: tuple, is_success: bool, now: Optional[int] = None,
+                  delay: Optional[float] = None, country: Optional[str] = None) -> dict:
+    """记录一次测试结果，更新通过/失败计数、连续次数、测试时间、国家代码以及 (成功时的) 延迟分布"""
+    record = db.get(key)
+    if record is None:
+        record = db[key] = new_record()
+
+    if is_success:
+        record['pass'] += 1
+        record['streak'] = record['streak'] + 1 if record['streak'] > 0 else 1
+        if delay is not None and delay > 0:
+            update_latency(record, delay)
+    else:
+        record['notpass'] += 1
+        record['streak'] = record['streak'] - 1 if record['streak'] < 0 else -1
+    record['last_tested'] = int(now if now is not None else time.time())
+    if country:
+        record['country'] = country
+    return record
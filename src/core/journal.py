@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from core.history import record_result
+
+logger = logging.getLogger('Core.Journal')
+
+
+def read_journal(path: Path) -> tuple[Optional[str], list[dict]]:
+    """
+    读取测试结果日志 (JSON Lines)。
+    首行为会话头 {"session": ..., "started": ...}，其余每行为一条结果。
+    进程崩溃时最后一行可能只写了一半，解析失败的行会被忽略。
+
+    Returns:
+        (会话 ID, 结果条目列表)；文件不存在时返回 (None, [])。
+    """
+    path = Path(path)
+    if not path.is_file():
+        return None, []
+
+    session = None
+    entries = []
+    with path.open('r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if 'session' in item:
+                session = session or item['session']
+            elif {'ip', 'port', 'protocol', 'ok'} <= item.keys():
+                entries.append(item)
+    return session, entries
+
+
+def entry_key(entry: dict) -> tuple[str, str, str]:
+    return (entry['ip'], str(entry['port']), entry['protocol'])
+
+
+def apply_entries(db: dict, entries: list[dict]) -> int:
+    """按时间顺序把日志中的结果合并到历史记录，返回合并的条目数"""
+    for entry in sorted(entries, key=lambda e: e.get('t', 0)):
+        record_result(db, entry_key(entry), bool(entry['ok']), entry.get('t'), entry.get('delay'),
+                      entry.get('country'))
+    return len(entries)
+
+
+class ResultJournal:
+    """
+    测试结果的预写日志。
+
+    每条结果完成后立即追加一行并 flush，Ctrl-C、内核崩溃或 CI 超时都不会丢失已完成的结果；
+    每 fsync_every 条额外 fsync 一次以抵御断电。测试全部结束、结果写入 CSV 后再删除日志。
+    """
+    def __init__(self, path: Path, fsync_every: int = 50):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.session: Optional[str] = None
+        self._fp = None
+        self._pending = 0
+
+    def start(self, session: Optional[str] = None):
+        """开始 (或继续) 一个会话，以追加方式打开日志"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = session is None or not self.path.is_file()
+        self.session = session or uuid.uuid4().hex[:12]
+        self._fp = self.path.open('a', encoding='utf-8')
+        if is_new:
+            self._write({'session': self.session, 'started': int(time.time())})
+            self.sync()
+
+    def record(self, key: tuple, is_success: bool, now: Optional[int] = None, **extra):
+        """追加一条结果"""
+        ip, port, protocol = key
+        entry = {'ip': ip, 'port': port, 'protocol': protocol, 'ok': bool(is_success),
+                 't': int(now if now is not None else time.time())}
+        entry.update(extra)
+        self._write(entry)
+        self._pending += 1
+        if self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        if self._fp:
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+            self._pending = 0
+
+    def close(self):
+        if self._fp:
+            self.sync()
+            self._fp.close()
+            self._fp = None
+
+    def discard(self):
+        """结果已持久化到历史记录后删除日志"""
+        self.close()
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+    def _write(self, item: dict):
+        self._fp.write(json.dumps(item, ensure_ascii=False) + '\n')
+        self._fp.flush()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+import errno
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import time
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+logger = logging.getLogger('Core.Kernel')
+
+
+def wait_for_port(host: str, port: int, timeout: float, process: Optional[subprocess.Popen] = None) -> bool:
+    """
+    等待 TCP 端口可连接。
+
+    连接被拒绝时以 10ms 起步、最多 100ms 的退避重试，端口一旦监听即可在毫秒级返回，
+    不再依赖固定的 0.5s 轮询。如果传入 process 且进程已退出，则立即返回 False。
+    """
+    deadline = time.monotonic() + timeout
+    backoff = 0.01
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection((host, port), timeout=0.2):
+                return True
+        except OSError as e:
+            if e.errno not in (errno.ECONNREFUSED, errno.ECONNRESET, errno.ETIMEDOUT, None):
+                logger.debug(f"端口探测异常 {host}:{port}: {e}")
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 0.1)
+    return False
+
+
+class KernelManager:
+    """
+    Mihomo 测试内核管理器。
+
+    负责启动内核、检测 API 就绪、通过控制器的 `PUT /configs` 热重载代理集合，
+    以及以常驻 (daemon) 模式保留内核供后续测试复用。
+    """
+    def __init__(self, kernel_path: str, work_dir: str, controller_port: int, secret: str,
+                 state_file: str, log_file: str, host: str = '127.0.0.1'):
+        self.kernel_path = kernel_path
+        self.work_dir = work_dir
+        self.host = host
+        self.controller_port = controller_port
+        self.secret = secret
+        self.state_file = Path(state_file)
+        self.log_file = Path(log_file)
+        self.process: Optional[subprocess.Popen] = None
+        self.pid: Optional[int] = None
+        self.attached = False
+        self.startup_seconds: Optional[float] = None
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {secret}"})
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.controller_port}"
+
+    def is_api_ready(self, timeout: float = 1) -> bool:
+        """检查控制器 /version 接口是否可用"""
+        try:
+            resp = self.session.get(f"{self.base_url}/version", timeout=timeout)
+            return resp.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def attach(self) -> bool:
+        """
+        尝试复用已在运行的常驻内核。
+        只有状态文件存在、进程仍存活且 API 可用时才视为复用成功。
+        """
+        if not self.state_file.is_file():
+            return False
+        try:
+            state = json.loads(self.state_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return False
+
+        pid = state.get('pid')
+        if state.get('port') != self.controller_port or not pid or not _pid_alive(pid):
+            self._remove_state()
+            return False
+        if not self.is_api_ready():
+            return False
+
+        self.pid = pid
+        self.attached = True
+        logger.info(f"复用常驻测试内核 (PID: {pid}, 端口: {self.controller_port})")
+        return True
+
+    def start(self, config_path: str, timeout: float = 10, detach: bool = False) -> bool:
+        """
+        启动内核并等待 API 就绪。
+
+        Args:
+            config_path: 初始配置文件路径。
+            timeout: 等待就绪的最长秒数。
+            detach: 是否以独立会话启动，使内核在测试脚本退出后继续运行。
+        """
+        logger.info(f"正在启动测试内核 (端口: {self.controller_port})...")
+        # -d 指定工作目录(用于存放/读取 GeoIP/GeoSite 数据库)，-f 指定配置文件
+        cmd = [self.kernel_path, "-d", self.work_dir, "-f", config_path]
+
+        # 内核日志写入文件而非管道：常驻模式下父进程退出后管道会断开
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        log_fp = self.log_file.open('wb')
+        started_at = time.monotonic()
+        try:
+            self.process = subprocess.Popen(cmd, stdout=log_fp, stderr=subprocess.STDOUT,
+                                            start_new_session=detach)
+        finally:
+            log_fp.close()
+        self.pid = self.process.pid
+
+        if not wait_for_port(self.host, self.controller_port, timeout, self.process):
+            if self.process.poll() is not None:
+                logger.error(f"内核进程已意外退出，退出码: {self.process.returncode}")
+            else:
+                logger.error("内核启动超时，请检查配置或内核文件。")
+            self._dump_log_tail()
+            return False
+
+        # 端口已监听，再确认一次 API 可用
+        if not self.is_api_ready(timeout=timeout):
+            logger.error("控制器端口已监听，但 API 无响应。")
+            self._dump_log_tail()
+            return False
+
+        self.startup_seconds = time.monotonic() - started_at
+        logger.info(f"内核启动成功！API 已就绪，耗时 {self.startup_seconds:.3f}s。")
+        if detach:
+            self._write_state()
+        return True
+
+    def reload(self, payload: str) -> bool:
+        """
+        通过 `PUT /configs?force=true` 热重载配置。
+        使用 payload 直接传入配置文本，避免内核对配置路径的安全目录限制。
+        """
+        started_at = time.monotonic()
+        try:
+            resp = self.session.put(f"{self.base_url}/configs", params={"force": "true"},
+                                    json={"path": "", "payload": payload}, timeout=30)
+        except requests.RequestException as e:
+            logger.error(f"热重载配置失败: {e}")
+            return False
+        if resp.status_code not in (200, 204):
+            logger.error(f"热重载配置失败: HTTP {resp.status_code} {resp.text.strip()}")
+            return False
+        logger.info(f"已热重载测试配置，耗时 {time.monotonic() - started_at:.3f}s。")
+        return True
+
+    def memory_rss_kb(self) -> Optional[int]:
+        """读取内核进程的常驻内存 (KB)，用于衡量配置对内核开销的影响"""
+        if not self.pid:
+            return None
+        status_path = Path(f"/proc/{self.pid}/status")
+        try:
+            if status_path.is_file():
+                for line in status_path.read_text().splitlines():
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1])
+            # macOS 等没有 /proc 的系统
+            out = subprocess.run(['ps', '-o', 'rss=', '-p', str(self.pid)],
+                                 capture_output=True, text=True, timeout=5).stdout.strip()
+            return int(out) if out else None
+        except (OSError, ValueError, subprocess.SubprocessError):
+            return None
+
+    def stop(self):
+        """停止内核 (包括此前以常驻模式启动的内核)"""
+        if self.process is not None:
+            logger.info("正在关闭测试内核...")
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        elif self.pid and _pid_alive(self.pid):
+            logger.info(f"正在关闭常驻测试内核 (PID: {self.pid})...")
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except OSError as e:
+                logger.warning(f"关闭常驻内核失败: {e}")
+        self.process = None
+        self.pid = None
+        self.attached = False
+        self._remove_state()
+
+    def _write_state(self):
+        state = {'pid': self.pid, 'port': self.controller_port}
+        try:
+            self.state_file.write_text(json.dumps(state), encoding='utf-8')
+        except OSError as e:
+            logger.warning(f"写入内核状态文件失败: {e}")
+
+    def _remove_state(self):
+        try:
+            self.state_file.unlink()
+        except OSError:
+            pass
+
+    def _dump_log_tail(self, lines: int = 20):
+        try:
+            tail = self.log_file.read_text(encoding='utf-8', errors='replace').splitlines()[-lines:]
+        except OSError:
+            return
+        if tail:
+            logger.error("内核日志 (末尾):\n" + "\n".join(tail))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_left
+from typing import Optional
+
+# 固定延迟分桶的上界 (ms)，最后一个桶收纳所有超过 5000ms 的样本
+BUCKET_BOUNDS_MS = (50, 100, 150, 200, 300, 500, 800, 1200, 2000, 5000)
+BUCKET_COUNT = len(BUCKET_BOUNDS_MS) + 1
+# 抖动按 RFC 3550 的方式做指数平滑: J += (|D| - J) / 16
+JITTER_GAIN = 1 / 16
+
+
+def empty_histogram() -> list[int]:
+    return [0] * BUCKET_COUNT
+
+
+def bucket_index(delay_ms: float) -> int:
+    return bisect_left(BUCKET_BOUNDS_MS, delay_ms)
+
+
+def update_latency(record: dict, delay_ms: float):
+    """
+    把一次成功探测的延迟计入记录，O(1) 更新直方图、抖动和最近延迟。
+    record 需包含 'hist'、'jitter'、'last_delay' 三个字段。
+    """
+    record['hist'][bucket_index(delay_ms)] += 1
+    last = record.get('last_delay') or 0
+    if last > 0:
+        record['jitter'] += (abs(delay_ms - last) - record['jitter']) * JITTER_GAIN
+    record['last_delay'] = int(delay_ms)
+
+
+def quantile(hist: list[int], q: float) -> Optional[float]:
+    """在直方图上估算分位数，桶内按线性插值；没有样本时返回 None"""
+    total = sum(hist)
+    if total == 0:
+        return None
+    target = q * total
+    seen = 0
+    for index, count in enumerate(hist):
+        if count and seen + count >= target:
+            lower = BUCKET_BOUNDS_MS[index - 1] if index > 0 else 0
+            # 溢出桶没有上界，取最后一个上界的两倍作为估计
+            upper = BUCKET_BOUNDS_MS[index] if index < len(BUCKET_BOUNDS_MS) else BUCKET_BOUNDS_MS[-1] * 2
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return float(BUCKET_BOUNDS_MS[-1] * 2)
+
+
+def summarize(record: dict) -> dict:
+    """返回记录的延迟摘要: 样本数、p50、p95、抖动"""
+    hist = record.get('hist') or empty_histogram()
+    return {
+        'samples': sum(hist),
+        'p50': quantile(hist, 0.5),
+        'p95': quantile(hist, 0.95),
+        'jitter': record.get('jitter', 0.0),
+    }
+
+
+def encode_histogram(hist: list[int]) -> str:
+    """序列化为紧凑文本，末尾连续的 0 桶省略，例如 '0.3.5.1'"""
+    end = len(hist)
+    while end and hist[end - 1] == 0:
+        end -= 1
+    return '.'.join(str(c) for c in hist[:end])
+
+
+def decode_histogram(text: Optional[str]) -> list[int]:
+    hist = empty_histogram()
+    if not text:
+        return hist
+    for index, part in enumerate(text.split('.')[:BUCKET_COUNT]):
+        hist[index] = int(part) if part else 0
+    return hist
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+生成的 merge.yml 的快速读取器。
+
+merge.py 写出的配置中，proxies 是一个顶层键，其下每个节点占一行 flow 风格的映射：
+
+    proxies:
+      - {name: '...', server: 1.2.3.4, port: 443, type: vless, ...}
+    dns:
+      ...
+
+读取器逐行识别这种布局，只对节点行做单行 YAML 解析，并以生成器的形式逐个返回节点，
+调用方可以边读边过滤或提前停止；line_filter 可以在解析之前按原始行丢弃节点 (见 flow_scalar)。遇到不符合该布局的文件 (例如手写或第三方配置)
+时自动退回完整的 YAML 解析，结果与 yaml.safe_load 一致。
+"""
+import logging
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+import yaml
+
+logger = logging.getLogger('Core.MergeReader')
+
+_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+_SECTION = 'proxies:'
+_ITEM_PREFIX = '  - {'
+# flow_scalar 无法确定取值时放弃 (锚点、别名、标签、嵌套结构)
+_UNCERTAIN_VALUE_START = '&*!{['
+
+LineFilter = Callable[[str], bool]
+
+
+class _LayoutMismatch(Exception):
+    """文件不是 merge.py 生成的布局；consumed 为已经返回的节点数"""
+    def __init__(self, consumed: int):
+        super().__init__(consumed)
+        self.consumed = consumed
+
+
+def _parse_line(line: str) -> dict:
+    return yaml.load(line[4:], Loader=_LOADER)
+
+
+def _read_quoted(line: str, start: int):
+    """读取从 start 开始的引号字符串，返回 (值, 结束位置)；含转义时返回 (None, -1)"""
+    quote = line[start]
+    end = line.find(quote, start + 1)
+    if end < 0:
+        return None, -1
+    value = line[start + 1:end]
+    if quote == "'" and line.startswith("'", end + 1):
+        return None, -1
+    if quote == '"' and '\\' in value:
+        return None, -1
+    return value, end + 1
+
+
+def flow_scalar(line: str, key: str) -> Optional[str]:
+    """
+    不做 YAML 解析，从单行节点 (`  - {k: v, ...}`) 中取出顶层键 key 的字符串值。
+    只识别普通标量与不含转义的引号标量，键不存在或无法确定时返回 None，
+    因此调用方只能在返回值明确命中时据此丢弃节点。
+    """
+    marker = f"{key}:"
+    if marker not in line or not line.startswith(_ITEM_PREFIX):
+        return None
+    depth = 0
+    expect_key = False
+    prev = ''
+    i = len(_ITEM_PREFIX) - 1
+    length = len(line)
+    while i < length:
+        ch = line[i]
+        if ch == ' ':
+            i += 1
+            continue
+        if ch in '\'"' and prev in '{[,:':
+            # 只有位于标量开头的引号才是引号标量，普通标量中间的引号是普通字符
+            _, i = _read_quoted(line, i)
+            if i < 0:
+                return None
+            expect_key, prev = False, ch
+            continue
+        if ch in '{[':
+            depth += 1
+            expect_key = ch == '{' and depth == 1
+        elif ch in '}]':
+            depth -= 1
+            if depth <= 0:
+                return None
+        elif ch == ',':
+            expect_key = depth == 1
+        elif expect_key:
+            expect_key = False
+            if line.startswith(marker, i) and line.startswith(' ', i + len(marker)):
+                return _read_scalar(line, i + len(marker) + 1)
+        prev = ch
+        i += 1
+    return None
+
+
+def _read_scalar(line: str, start: int) -> Optional[str]:
+    """读取 flow 映射中 start 处的值，非简单字符串标量时返回 None"""
+    start = len(line) - len(line[start:].lstrip(' '))
+    if start >= len(line) or line[start] in _UNCERTAIN_VALUE_START:
+        return None
+    if line[start] in '\'"':
+        value, end = _read_quoted(line, start)
+    else:
+        end = start
+        while end < len(line) and line[end] not in ',}':
+            end += 1
+        value = line[start:end].rstrip(' ')
+        if not value or any(ch in value for ch in '#\'"'):
+            return None
+    if end < 0 or line[end:].lstrip(' ')[:1] not in (',', '}'):
+        return None
+    return value
+
+
+def _iter_flow_proxies(lines: Iterable[str], rest: Optional[list] = None,
+                       line_filter: Optional[LineFilter] = None) -> Iterator[dict]:
+    """
+    逐行扫描并返回 proxies 下的节点。
+    rest 不为 None 时收集 proxies 以外的行 (proxies 所在位置替换为占位行)，用于解析其余配置。
+    line_filter 对节点行返回 False 时该节点不解析、直接跳过 (仍计入 consumed)。
+    """
+    in_section = False
+    seen_section = False
+    consumed = 0
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if in_section:
+            if line.startswith(_ITEM_PREFIX) and line.rstrip().endswith('}'):
+                if line_filter is not None and not line_filter(line):
+                    consumed += 1
+                    continue
+                try:
+                    proxy = _parse_line(line)
+                except yaml.YAMLError:
+                    raise _LayoutMismatch(consumed)
+                if not isinstance(proxy, dict):
+                    raise _LayoutMismatch(consumed)
+                consumed += 1
+                yield proxy
+                continue
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            if line[0] in ' \t-':
+                raise _LayoutMismatch(consumed)
+            in_section = False
+
+        if line.startswith(_SECTION):
+            if seen_section or line[len(_SECTION):].split('#', 1)[0].strip():
+                raise _LayoutMismatch(consumed)
+            in_section = seen_section = True
+            if rest is not None:
+                rest.append('proxies: []')
+            continue
+        if rest is not None:
+            rest.append(line)
+
+    if not seen_section:
+        raise _LayoutMismatch(consumed)
+
+
+def _load_full(text: str) -> dict:
+    return yaml.load(text, Loader=_LOADER)
+
+
+def _proxies_of(config) -> list:
+    if isinstance(config, dict):
+        return config.get('proxies') or []
+    if isinstance(config, list):
+        return config
+    return []
+
+
+def iter_proxies_from_text(text: str, line_filter: Optional[LineFilter] = None) -> Iterator[dict]:
+    """
+    从配置文本中逐个返回节点，跳过非映射项。
+    line_filter 只作用于生成布局的节点行；退回完整解析时全部节点照常返回，由调用方自行过滤。
+    """
+    try:
+        yield from _iter_flow_proxies(text.splitlines(), line_filter=line_filter)
+        return
+    except _LayoutMismatch as e:
+        consumed = e.consumed
+    logger.debug("配置不是 merge.yml 的生成布局，退回完整 YAML 解析")
+    for proxy in _proxies_of(_load_full(text))[consumed:]:
+        if isinstance(proxy, dict):
+            yield proxy
+
+
+def iter_proxies(path: Path, line_filter: Optional[LineFilter] = None) -> Iterator[dict]:
+    """
+    从文件中逐个返回节点 (惰性读取)。
+    生成布局下文件按行流式读取，不会一次性载入整个配置。line_filter 见 iter_proxies_from_text。
+    """
+    path = Path(path)
+    try:
+        with path.open('r', encoding='utf-8') as f:
+            yield from _iter_flow_proxies(f, line_filter=line_filter)
+        return
+    except _LayoutMismatch as e:
+        consumed = e.consumed
+    logger.debug(f"{path} 不是 merge.yml 的生成布局，退回完整 YAML 解析")
+    for proxy in _proxies_of(_load_full(path.read_text(encoding='utf-8')))[consumed:]:
+        if isinstance(proxy, dict):
+            yield proxy
+
+
+def load_config_from_text(text: str):
+    """
+    解析完整配置。生成布局下节点逐行解析，其余部分作为普通 YAML 解析，键的顺序保持不变。
+    其他布局退回完整 YAML 解析。
+    """
+    rest = []
+    try:
+        proxies = list(_iter_flow_proxies(text.splitlines(), rest))
+    except _LayoutMismatch:
+        return _load_full(text)
+    config = _load_full('\n'.join(rest))
+    if not isinstance(config, dict):
+        return _load_full(text)
+    config['proxies'] = proxies
+    return config
+
+
+def load_config(path: Path):
+    """从文件解析完整配置，见 load_config_from_text"""
+    return load_config_from_text(Path(path).read_text(encoding='utf-8'))
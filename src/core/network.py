@@ -2,7 +2,8 @@
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from typing import Optional, Dict, Any
+import codecs
+from typing import Optional, Dict, Any, Iterator
 import logging
 
 logger = logging.getLogger('Network')
@@ -53,4 +54,25 @@ class NetworkClient:
             response = self.get(url, **kwargs)
             return response.text
         except requests.RequestException:
-            return None
\ No newline at end of file
+            return None
+
+    def iter_lines(self, url: str, chunk_size: int = 64 * 1024, **kwargs) -> Iterator[str]:
+        """
+        以流的方式下载 URL 内容 (UTF-8)，逐行返回，不含换行符。
+        网络错误会以 requests.RequestException 抛出，调用方需自行处理已读取的部分。
+        """
+        response = self.get(url, stream=True, **kwargs)
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        pending = ''
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                pending += decoder.decode(chunk)
+                lines = pending.split('\n')
+                pending = lines.pop()
+                for line in lines:
+                    yield line.rstrip('\r')
+            pending += decoder.decode(b'', final=True)
+            if pending:
+                yield pending.rstrip('\r')
+        finally:
+            response.close()
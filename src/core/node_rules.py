@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+来源级别的节点清洗规则。
+
+sources.json 中每个来源可以声明 "clean" 列表，解析该来源时每读出一个节点就依次执行规则，
+被任一规则拒绝的节点立即丢弃，不会进入合并队列。列表项可以是规则名，
+也可以是带参数的对象，例如:
+
+    "clean": [
+      "require-fields",
+      "drop-ss-cipher",
+      {"rule": "drop-type", "types": ["http"]},
+      {"rule": "drop-name", "pattern": "剩余流量|官网"}
+    ]
+
+来源是一行一个节点的 flow 布局时，drop-type / drop-ss-cipher 在 YAML 解析之前按原始行判断
+(见 merge_reader.flow_scalar)，命中的节点不会被解析；无法从行内确定的节点解析后照常过滤。
+"""
+import logging
+import re
+from collections import Counter
+from typing import Iterable, Optional, Union
+
+from .merge_reader import flow_scalar
+
+logger = logging.getLogger('Core.NodeRules')
+
+
+def _needles(key: str, values: Iterable[str]) -> tuple:
+    """行级判断的子串预筛：只有包含 `key: value` (含引号形式) 的行才需要逐字符确认"""
+    return tuple(f"{key}: {quote}{value}{quote}" for value in values for quote in ('', "'", '"'))
+
+
+class NodeRule:
+    """节点规则的基类：keep 返回 False 表示丢弃该节点"""
+    name = ''
+
+    def keep(self, proxy: dict) -> bool:
+        return True
+
+    def reject_line(self, line: str) -> bool:
+        """解析前的行级判断：返回 True 表示该节点一定会被 keep 拒绝，默认无法判断"""
+        return False
+
+
+class RequireFieldsRule(NodeRule):
+    """丢弃缺少必要字段或端口无效的节点"""
+    name = 'require-fields'
+
+    def __init__(self, fields: Iterable[str] = ('name', 'server', 'port', 'type')):
+        self.fields = tuple(fields)
+
+    def keep(self, proxy):
+        if any(proxy.get(field) in (None, '') for field in self.fields):
+            return False
+        if 'port' not in proxy:
+            return True
+        try:
+            return 0 < int(proxy['port']) < 65536
+        except (TypeError, ValueError):
+            return False
+
+
+class DropSSCipherRule(NodeRule):
+    """丢弃 type 为 ss 且加密方式在列表中的节点 (默认 cipher 为 ss 的无效节点)"""
+    name = 'drop-ss-cipher'
+
+    def __init__(self, ciphers: Iterable[str] = ('ss',)):
+        self.ciphers = set(ciphers)
+        self._type_needles = _needles('type', ['ss'])
+        self._cipher_needles = _needles('cipher', self.ciphers)
+
+    def keep(self, proxy):
+        return not (proxy.get('type') == 'ss' and proxy.get('cipher') in self.ciphers)
+
+    def reject_line(self, line):
+        if not any(n in line for n in self._cipher_needles) or not any(n in line for n in self._type_needles):
+            return False
+        return flow_scalar(line, 'type') == 'ss' and flow_scalar(line, 'cipher') in self.ciphers
+
+
+class DropTypeRule(NodeRule):
+    """丢弃指定协议类型的节点"""
+    name = 'drop-type'
+
+    def __init__(self, types: Iterable[str] = ('http',)):
+        self.types = set(types)
+        self._needles = _needles('type', self.types)
+
+    def keep(self, proxy):
+        return proxy.get('type') not in self.types
+
+    def reject_line(self, line):
+        return any(n in line for n in self._needles) and flow_scalar(line, 'type') in self.types
+
+
+class DropNameRule(NodeRule):
+    """丢弃名称匹配正则的节点 (例如订阅中的流量/到期提示节点)"""
+    name = 'drop-name'
+
+    def __init__(self, pattern: str):
+        self.pattern = re.compile(pattern)
+
+    def keep(self, proxy):
+        return not self.pattern.search(str(proxy.get('name', '')))
+
+
+RULES = {rule.name: rule for rule in (RequireFieldsRule, DropSSCipherRule, DropTypeRule, DropNameRule)}
+
+
+def build_rule(spec: Union[str, dict]) -> NodeRule:
+    """根据 sources.json 中的声明构建规则，未知规则或参数错误时抛出 ValueError"""
+    if isinstance(spec, str):
+        spec = {'rule': spec}
+    if not isinstance(spec, dict) or 'rule' not in spec:
+        raise ValueError(f"无效的清洗规则声明: {spec}")
+    params = {k: v for k, v in spec.items() if k != 'rule'}
+    rule_cls = RULES.get(spec['rule'])
+    if rule_cls is None:
+        raise ValueError(f"未知的清洗规则: {spec['rule']} (可用: {', '.join(RULES)})")
+    try:
+        return rule_cls(**params)
+    except (TypeError, re.error) as e:
+        raise ValueError(f"清洗规则 {spec['rule']} 参数错误: {e}")
+
+
+class CleaningPipeline:
+    """按顺序执行的规则列表，并按规则统计丢弃数量"""
+    def __init__(self, rules: Iterable[NodeRule] = ()):
+        self.rules = list(rules)
+        self.dropped = Counter()
+
+    @classmethod
+    def from_specs(cls, specs: Optional[list]) -> 'CleaningPipeline':
+        return cls(build_rule(spec) for spec in (specs or []))
+
+    def accept(self, proxy: dict) -> bool:
+        for rule in self.rules:
+            if not rule.keep(proxy):
+                self.dropped[rule.name] += 1
+                return False
+        return True
+
+    def accept_line(self, line: str) -> bool:
+        """作为 merge_reader 的 line_filter：行级规则命中时丢弃该节点，不做 YAML 解析"""
+        for rule in self.rules:
+            if rule.reject_line(line):
+                self.dropped[rule.name] += 1
+                return False
+        return True
+
+    def filter(self, proxies: Iterable[dict]) -> Iterable[dict]:
+        """惰性过滤节点流"""
+        return (proxy for proxy in proxies if self.accept(proxy))
+
+    def summary(self) -> str:
+        return ', '.join(f"{name} {count}" for name, count in self.dropped.most_common())
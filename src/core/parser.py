@@ -251,18 +251,11 @@ def to_vless(p):
         return link + "#" + urllib.parse.quote(str(p.get('name', 'vless')))
     except: return None
 
-def generate_v2ray_sub(proxies):
-    """生成 V2Ray 订阅内容 (Base64)"""
-    links = []
-    for p in proxies:
-        link = None
-        ptype = p.get('type')
-        if ptype == 'vmess': link = to_vmess(p)
-        elif ptype == 'ss': link = to_ss(p)
-        elif ptype == 'trojan': link = to_trojan(p)
-        elif ptype == 'vless': link = to_vless(p)
-        
-        if link:
-            links.append(link)
-            
-    return safe_base64_encode("\n".join(links))
+def to_link(p):
+    """把 Clash 节点转换为分享链接，不支持的类型返回 None"""
+    ptype = p.get('type')
+    if ptype == 'vmess': return to_vmess(p)
+    elif ptype == 'ss': return to_ss(p)
+    elif ptype == 'trojan': return to_trojan(p)
+    elif ptype == 'vless': return to_vless(p)
+    return None
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import ssl
+import time
+from typing import Optional
+
+logger = logging.getLogger('Core.Preflight')
+
+# 基于 UDP/QUIC 的协议无法通过 TCP 连接判断可达性，预检时直接放行
+UDP_PROTOCOLS = {'hysteria', 'hysteria2', 'tuic', 'wireguard', 'mieru-udp'}
+# 始终使用 TLS 的协议
+TLS_PROTOCOLS = {'trojan', 'anytls'}
+
+
+def endpoint_tls(proxy: dict) -> tuple[bool, Optional[str]]:
+    """
+    判断节点是否需要 TLS 握手，并返回握手使用的 SNI。
+    Reality 节点同样会完成一次面向伪装站点的 TLS 握手，因此按 TLS 处理。
+    """
+    ptype = proxy.get('type')
+    uses_tls = ptype in TLS_PROTOCOLS or bool(proxy.get('tls')) or 'reality-opts' in proxy
+    if not uses_tls:
+        return False, None
+    sni = proxy.get('servername') or proxy.get('sni') or proxy.get('server')
+    return True, str(sni) if sni else None
+
+
+def collect_endpoints(proxies: list) -> tuple[dict, int]:
+    """
+    从节点列表中提取需要预检的唯一 (server, port) 端点。
+    同一端点只要有一个节点使用 TLS，就以该节点的 SNI 做握手检查。
+
+    Returns:
+        ({(server, port): {'host', 'port', 'tls', 'sni'}}, 因使用 UDP 而跳过的节点数)
+    """
+    endpoints = {}
+    skipped = 0
+    for proxy in proxies:
+        if not isinstance(proxy, dict) or not proxy.get('server') or not proxy.get('port'):
+            continue
+        if proxy.get('type') in UDP_PROTOCOLS:
+            skipped += 1
+            continue
+        try:
+            port = int(proxy['port'])
+        except (TypeError, ValueError):
+            continue
+        key = (str(proxy['server']), str(proxy['port']))
+        uses_tls, sni = endpoint_tls(proxy)
+        entry = endpoints.get(key)
+        if entry is None:
+            endpoints[key] = {'host': str(proxy['server']).strip('[]'), 'port': port, 'tls': uses_tls, 'sni': sni}
+        elif uses_tls and not entry['tls']:
+            entry['tls'], entry['sni'] = True, sni
+    return endpoints, skipped
+
+
+def is_proxy_reachable(proxy: dict, result: Optional[dict]) -> bool:
+    """
+    根据端点预检结果判断单个节点是否可达。
+    同一端点上的非 TLS 节点只要求 TCP 可连接，TLS 节点还要求握手成功。
+    UDP 协议没有经过预检，即使与 TCP 节点共用 server:port 也不采用该端点的 TCP 结果；
+    没有预检结果的节点同样视为可达。
+    """
+    if result is None or proxy.get('type') in UDP_PROTOCOLS:
+        return True
+    if not result['connected']:
+        return False
+    uses_tls, _ = endpoint_tls(proxy)
+    return not uses_tls or result['tls_ok'] is not False
+
+
+def _insecure_context() -> ssl.SSLContext:
+    # 只验证握手能否完成，免费节点普遍使用自签名证书，因此不校验证书
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+async def probe_endpoint(host: str, port: int, tls: bool = False, sni: Optional[str] = None,
+                         timeout: float = 3.0, ssl_context: Optional[ssl.SSLContext] = None) -> dict:
+    """
+    对单个端点做 TCP 连接 (以及可选的 TLS 握手) 检查。
+
+    Returns:
+        {'reachable', 'connected', 'tls_ok', 'connect_ms', 'handshake_ms', 'error'}
+        tls_ok 在未做握手时为 None；reachable 表示连接及 (如有) 握手均成功。
+    """
+    result = {'reachable': False, 'connected': False, 'tls_ok': None,
+              'connect_ms': None, 'handshake_ms': None, 'error': None}
+    writer = None
+    started = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        connected = time.perf_counter()
+        result['connect_ms'] = (connected - started) * 1000
+        result['connected'] = True
+
+        if tls:
+            result['tls_ok'] = False
+            ctx = ssl_context or _insecure_context()
+            remaining = max(0.1, timeout - (connected - started))
+            await asyncio.wait_for(
+                writer.start_tls(ctx, server_hostname=sni or host, ssl_handshake_timeout=remaining),
+                remaining
+            )
+            result['handshake_ms'] = (time.perf_counter() - connected) * 1000
+            result['tls_ok'] = True
+        result['reachable'] = True
+    except asyncio.TimeoutError:
+        result['error'] = 'timeout'
+    except ssl.SSLError as e:
+        result['error'] = f"tls: {e.reason or e}"
+    except OSError as e:
+        result['error'] = e.strerror or str(e)
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        if writer is not None:
+            writer.close()
+            try:
+                await asyncio.wait_for(writer.wait_closed(), 1)
+            except Exception:
+                pass
+    return result
+
+
+async def probe_endpoints(endpoints: dict, concurrency: int = 2000, timeout: float = 3.0) -> dict:
+    """并发预检全部端点，返回 {key: result}"""
+    semaphore = asyncio.Semaphore(concurrency)
+    ctx = _insecure_context()
+
+    async def _probe(key, entry):
+        async with semaphore:
+            return key, await probe_endpoint(entry['host'], entry['port'], entry['tls'], entry['sni'],
+                                             timeout=timeout, ssl_context=ctx)
+
+    results = await asyncio.gather(*(_probe(key, entry) for key, entry in endpoints.items()))
+    return dict(results)
+
+
+def raise_fd_limit(wanted: int) -> int:
+    """尽量提高进程可打开的文件描述符上限，返回实际可用的上限"""
+    try:
+        import resource
+    except ImportError:
+        return wanted
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    if soft != resource.RLIM_INFINITY and soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError) as e:
+            logger.warning(f"无法提高文件描述符上限: {e}")
+    return soft
+
+
+def run_preflight(endpoints: dict, concurrency: int = 2000, timeout: float = 3.0) -> dict:
+    """
+    同步入口：在新的事件循环中预检全部端点。
+    并发数会受文件描述符上限约束 (预留 64 个给进程其他用途)。
+    """
+    if not endpoints:
+        return {}
+    fd_limit = raise_fd_limit(concurrency + 64)
+    concurrency = max(1, min(concurrency, fd_limit - 64))
+    logger.info(f"开始预检 {len(endpoints)} 个端点 (并发: {concurrency}, 超时: {timeout}s)...")
+    return asyncio.run(probe_endpoints(endpoints, concurrency=concurrency, timeout=timeout))
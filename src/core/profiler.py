@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+流水线分阶段计时 (merge.py --profile)。
+
+每个阶段记录墙钟时间、CPU 时间、输入/输出条目数，启用 tracemalloc 时还记录该阶段的峰值内存
+(每个阶段开始前重置峰值)。报告为 JSON，便于对比定时任务在不同时间的耗时变化。
+tracemalloc 会明显拖慢分配密集的代码，因此只在 memory=True 时启用。
+"""
+import json
+import logging
+import os
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger('Core.Profiler')
+
+
+class StageProfiler:
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.stages = []
+        self.started = time.perf_counter()
+        self.started_at = datetime.now()
+        self._owns_tracemalloc = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+    @contextmanager
+    def stage(self, name: str, items_in: Optional[int] = None):
+        """
+        记录一个阶段；在 with 块内设置 record['items_out'] 表示输出条目数。
+        阶段抛出异常 (包括 sys.exit) 时同样记录，并标记 status。
+        """
+        record = {'name': name, 'items_in': items_in, 'items_out': None}
+        if self.memory:
+            tracemalloc.reset_peak()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        status = 'ok'
+        try:
+            yield record
+        except SystemExit:
+            status = 'exit'
+            raise
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            record['wall_ms'] = round((time.perf_counter() - wall) * 1000, 2)
+            record['cpu_ms'] = round((time.process_time() - cpu) * 1000, 2)
+            if self.memory:
+                record['peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            record['status'] = status
+            self.stages.append(record)
+            logger.debug(f"[{name}] 墙钟 {record['wall_ms']:.0f}ms, CPU {record['cpu_ms']:.0f}ms, "
+                         f"条目 {items_in} -> {record['items_out']}")
+
+    def run(self, name: str, func, items: list, *args, **kwargs):
+        """以 items 为第一个参数调用 func 并记录为一个阶段，输入/输出条目数取 len"""
+        with self.stage(name, len(items)) as record:
+            result = func(items, *args, **kwargs)
+            record['items_out'] = len(result) if result is not None else None
+        return result
+
+    def report(self) -> dict:
+        return {
+            'started': self.started_at.isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'tracemalloc': self.memory,
+            'stages': self.stages,
+        }
+
+    def write(self, path: Path):
+        """写出 JSON 报告 (先写临时文件再替换)"""
+        tmp_path = path.with_name(path.name + '.tmp')
+        try:
+            with tmp_path.open('w', encoding='utf-8') as f:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+                f.write('\n')
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        logger.info(f"性能报告已写入: {path}")
+
+    def close(self):
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
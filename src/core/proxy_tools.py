@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 import logging
+import re
 from core.yaml_handler import SingleQuotedString, FlowStyleDict
 
 logger = logging.getLogger("Core.ProxyTools")
 
+# merge.py 生成的节点名称: "count#Flag Code|国家-城市 序号"，例如 "58#🇲🇩 MD|摩尔多瓦 05"
+COUNTRY_CODE_PATTERN = re.compile(r'^(?:\d+#)?.*? ([A-Z]{2})')
+APPEARANCES_PATTERN = re.compile(r'^(\d+)#')
+
 def reorder_proxy_keys(proxy: dict) -> dict:
     # 对代理字典的键进行排序: name, port, type 优先, 其余按字母排序。
     # 注意: 此函数会通过 pop 修改传入的 proxy 字典。
@@ -86,4 +91,37 @@ def apply_node_statistics(proxies: list[dict], stats: dict) -> list[dict]:
             original_name = str(proxy.get('name', ''))
             proxy['name'] = SingleQuotedString(f"{count}#{original_name}")
     
-    return proxies
\ No newline at end of file
+    return proxies
+
+
+def extract_country_code(name) -> str:
+    """
+    从生成的节点名称中提取国家代码。
+    例如 "58#🇲🇩 MD|摩尔多瓦 05" -> "MD"；无法识别 (例如手动节点) 时返回空字符串。
+    """
+    match = COUNTRY_CODE_PATTERN.match(str(name or ''))
+    return match.group(1) if match else ''
+
+
+def extract_appearances(name) -> int:
+    """
+    从生成的节点名称中提取服务器出现次数。
+    例如 "58#🇲🇩 MD|摩尔多瓦 05" -> 58；没有次数前缀时返回 0。
+    """
+    match = APPEARANCES_PATTERN.match(str(name or ''))
+    return int(match.group(1)) if match else 0
+
+
+def is_timestamp_node(proxy: dict) -> bool:
+    """merge.py 在列表末尾追加的时间戳节点，名称形如 "[2024-01-01 00:00:00]-Timestamp" """
+    return str(proxy.get('name', '')).endswith('-Timestamp')
+
+
+def get_flag(country_code: str) -> str:
+    """将国家代码转换为 Emoji 国旗"""
+    if not country_code or len(country_code) != 2 or country_code == 'UNK':
+        return "XX"
+    if country_code.upper() == 'XX':
+        return "🌐"
+    # 区域指示符符号 A 的 Unicode 是 127462，'A' 是 65，偏移量 127397
+    return "".join([chr(ord(c) + 127397) for c in country_code.upper()])
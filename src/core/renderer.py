@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+输出产物的单次渲染。
+
+合并得到的节点列表只在内存中保存一份，由 Renderer 同时交给每个输出目标 (sink)，
+各个 sink 直接从内存中的节点生成自己的文件，不再重新解析 merge.yml。
+新增输出格式时只需实现一个 Sink 子类并加入渲染列表。
+
+每个 sink 先渲染到临时文件，同时计算内容摘要 (忽略时间戳节点)，与现有文件的摘要相同时丢弃临时文件，
+不同时才原子地替换目标文件：既避免无意义的写盘与 git 提交，也不会让客户端拉到写了一半的文件。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import yaml
+
+from .b64stream import Base64Writer, iter_base64_decode
+from .compress import write_compressed
+from .conn_view import filter_by_history
+from .groups import attach_groups
+from .merge_reader import iter_proxies
+from .proxy_tools import is_timestamp_node
+from .template import CompiledTemplate, load_compiled
+from .yaml_handler import IndentedDumper, FlowStyleDict, SingleQuotedString
+
+logger = logging.getLogger('Core.Renderer')
+
+
+class PlainDumper(yaml.Dumper):
+    """与 yaml.dump 默认输出一致 (conn.yml 的格式)，节点的标记类型按普通 dict / str 输出"""
+    pass
+
+PlainDumper.add_representer(FlowStyleDict, lambda dumper, data: dumper.represent_dict(data))
+PlainDumper.add_representer(SingleQuotedString, lambda dumper, data: dumper.represent_str(str(data)))
+
+
+# 时间戳节点的名称 (明文或分享链接中 URL 编码后的形式)，计算摘要时替换为固定值
+TIMESTAMP_PATTERN = re.compile(
+    rb'(?:\[|%5B)\d{4}-\d\d-\d\d(?: |%20)\d\d(?::|%3A)\d\d(?::|%3A)\d\d(?:\]|%5D)-Timestamp')
+TIMESTAMP_PLACEHOLDER = b'[timestamp]-Timestamp'
+
+
+class ContentDigest:
+    """按行计算内容的 SHA-256，时间戳节点的名称不参与比较"""
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self._partial = b''
+
+    def _feed(self, data: bytes):
+        if b'Timestamp' in data:
+            data = TIMESTAMP_PATTERN.sub(TIMESTAMP_PLACEHOLDER, data)
+        self._hash.update(data)
+
+    def update(self, data: bytes):
+        # 时间戳可能被拆分在两次写入之间，只对完整的行做替换
+        data = self._partial + data
+        cut = data.rfind(b'\n') + 1
+        self._partial = data[cut:]
+        if cut:
+            self._feed(data[:cut])
+
+    def hexdigest(self) -> str:
+        if self._partial:
+            self._feed(self._partial)
+            self._partial = b''
+        return self._hash.hexdigest()
+
+
+class _DigestStream:
+    """把写入的明文同时交给摘要计算与下游 (文件或 Base64 编码器)"""
+    def __init__(self, target, digest: ContentDigest):
+        self.target = target
+        self.digest = digest
+
+    def write(self, data: bytes):
+        self.digest.update(data)
+        self.target.write(data)
+
+
+class Sink:
+    """
+    输出目标的基类。
+
+    render 把节点的明文内容 (bytes) 写入 fp，返回写出的条目数。
+    base64 为 True 时明文在写入文件前经过 Base64 编码 (URL Safe，无填充)。
+    compress 为要生成的压缩副本格式，例如 ('gz', 'br')。
+    """
+    name = ''
+    base64 = False
+
+    def __init__(self, path: Path, name: Optional[str] = None, compress: Iterable[str] = ()):
+        self.path = Path(path)
+        if name:
+            self.name = name
+        self.compress = tuple(compress)
+
+    def prepare(self):
+        """在任何 sink 写出文件之前调用，用于读取上一次的产物"""
+        pass
+
+    def render(self, proxies: list, fp) -> int:
+        raise NotImplementedError
+
+    def current_digest(self):
+        """现有文件明文内容的摘要，文件不存在时返回 None"""
+        if not self.path.is_file():
+            return None
+        digest = ContentDigest()
+        with self.path.open('rb') as f:
+            chunks = iter_base64_decode(f) if self.base64 else iter(lambda: f.read(64 * 1024), b'')
+            for chunk in chunks:
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def write(self, proxies: list) -> dict:
+        """
+        渲染到临时文件，内容 (忽略时间戳) 有变化时才替换目标文件。
+
+        Returns:
+            {'count': 条目数, 'digest': 内容摘要, 'changed': 是否替换了目标文件}
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        digest = ContentDigest()
+        try:
+            with tmp_path.open('wb') as f:
+                target = Base64Writer(f) if self.base64 else f
+                count = self.render(proxies, _DigestStream(target, digest))
+                if self.base64:
+                    target.close()
+            new_digest = digest.hexdigest()
+            changed = new_digest != self.current_digest()
+            if changed:
+                os.replace(tmp_path, self.path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        # 内容未变化时只补齐缺失的压缩副本
+        if self.compress:
+            write_compressed(self.path, self.compress, force=changed)
+        return {'count': count, 'digest': new_digest, 'changed': changed}
+
+
+class ClashSink(Sink):
+    """
+    以模板为基础输出 Clash 配置 (merge.yml)。
+    模板预编译为文本段 (见 core/template.py)，每次只序列化 slots 中的键；
+    cache_dir 不为空时编译结果按 sink 名称缓存到该目录。
+    group_builder 根据输出的节点生成额外的代理组 (追加在模板的代理组之后)，
+    group_parent 为模板中的 select 组名称时，生成的组同时加入该组的可选项。
+    """
+    name = 'clash'
+    dump_options = {'indent': 2, 'width': 9999}
+    slots = ('proxies', 'proxy-groups')
+
+    def __init__(self, path: Path, template_path: Path, dumper=IndentedDumper, name: Optional[str] = None,
+                 compress: Iterable[str] = (), cache_dir: Optional[Path] = None,
+                 group_builder: Optional[Callable[[list], list]] = None, group_parent: Optional[str] = None):
+        super().__init__(path, name, compress)
+        self.template_path = Path(template_path)
+        self.dumper = dumper
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.group_builder = group_builder
+        self.group_parent = group_parent
+        self.compiled: Optional[CompiledTemplate] = None
+
+    def prepare(self):
+        cache_path = self.cache_dir / f"{self.name}.template.json" if self.cache_dir else None
+        self.compiled = load_compiled(self.template_path, self.slots, self.dumper, cache_path, **self.dump_options)
+
+    def slot_values(self, proxies: list) -> dict:
+        """插入点处的值，未提供的键使用模板中原有的值"""
+        generated = self.group_builder(proxies) if self.group_builder else []
+        return {
+            'proxies': proxies,
+            'proxy-groups': attach_groups(self.compiled.defaults.get('proxy-groups'), generated, self.group_parent),
+        }
+
+    def render(self, proxies, fp):
+        if self.compiled is None:
+            self.prepare()
+        values = self.slot_values(proxies)
+        self.compiled.render(fp, values, self.dumper, **self.dump_options)
+        return len(values['proxies'])
+
+
+class ConnViewSink(ClashSink):
+    """
+    按连通性历史记录过滤后的配置视图 (conn.yml)。
+    filter_options 传给 conn_view.filter_by_history，最近一次的过滤结果保存在 result 中。
+    """
+    name = 'conn'
+    dump_options = {}
+
+    def __init__(self, path: Path, template_path: Path, history_db: dict, name: Optional[str] = None,
+                 cache_dir: Optional[Path] = None, group_builder: Optional[Callable[[list], list]] = None,
+                 group_parent: Optional[str] = None, **filter_options):
+        super().__init__(path, template_path, dumper=PlainDumper, name=name, cache_dir=cache_dir,
+                         group_builder=group_builder, group_parent=group_parent)
+        self.history_db = history_db
+        self.filter_options = filter_options
+        self.result: Optional[dict] = None
+
+    def slot_values(self, proxies):
+        self.result = filter_by_history(proxies, self.history_db, **self.filter_options)
+        return super().slot_values(self.result['proxies'])
+
+
+class SelectedClashSink(ClashSink):
+    """
+    只输出部分节点的 Clash 配置 (例如 mobile.yml)，select 从完整节点列表中选出要输出的节点。
+    生成的代理组同样基于选出的节点。
+    """
+    name = 'selected'
+
+    def __init__(self, path: Path, template_path: Path, select: Callable[[list], list], **kwargs):
+        super().__init__(path, template_path, **kwargs)
+        self.select = select
+
+    def slot_values(self, proxies):
+        return super().slot_values(self.select(proxies))
+
+
+class LinkSubSink(Sink):
+    """
+    分享链接订阅 (Base64，URL Safe，无填充)。
+    convert 把节点转换为分享链接，不支持的节点返回 None。
+    """
+    name = 'links'
+    base64 = True
+
+    def __init__(self, path: Path, convert: Callable[[dict], Optional[str]], name: Optional[str] = None,
+                 compress: Iterable[str] = ()):
+        super().__init__(path, name, compress)
+        self.convert = convert
+
+    def render(self, proxies, fp):
+        count = 0
+        for proxy in proxies:
+            link = self.convert(proxy)
+            if not link:
+                continue
+            fp.write((b'\n' if count else b'') + link.encode('utf-8'))
+            count += 1
+        return count
+
+
+def proxy_fingerprint(proxy: dict) -> str:
+    """
+    节点除名称以外全部字段的规范化 JSON 的摘要。
+    合并流程每次运行都会重写名称 (出现次数前缀、GeoIP 序号)，名称不参与指纹，改名通过增量文件的 renamed 传递。
+    """
+    canonical = json.dumps({k: v for k, v in proxy.items() if k != 'name'}, sort_keys=True, ensure_ascii=False,
+                           separators=(',', ':'), default=str)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+class DeltaSink(Sink):
+    """
+    增量文件：相对上一次产物新增的节点 (含完整定义)、被移除节点的指纹，
+    以及仍然保留但名称变化的节点 (renamed: {指纹: 新名称})，附带递增的版本号。
+    客户端持有版本 base 的配置时，只需下载该文件即可更新到 version。
+
+    上一次的节点从 source_path (merge.yml) 读取，因此必须在 prepare 阶段、任何 sink 写出之前完成。
+    """
+    name = 'delta'
+
+    def __init__(self, path: Path, source_path: Path, name: Optional[str] = None):
+        super().__init__(path, name)
+        self.source_path = Path(source_path)
+        self.previous: Optional[dict] = None
+        self.version = 0
+
+    def prepare(self):
+        if self.path.is_file():
+            try:
+                self.version = int(json.loads(self.path.read_text(encoding='utf-8')).get('version', 0))
+            except (OSError, ValueError, AttributeError) as e:
+                logger.warning(f"读取增量文件 {self.path} 失败: {e}，版本号从 0 开始。")
+        if self.source_path.is_file():
+            self.previous = {}
+            for proxy in iter_proxies(self.source_path):
+                if not is_timestamp_node(proxy):
+                    self.previous.setdefault(proxy_fingerprint(proxy), str(proxy.get('name', '')))
+
+    def write(self, proxies):
+        current = {}
+        for proxy in proxies:
+            if not is_timestamp_node(proxy):
+                current.setdefault(proxy_fingerprint(proxy), proxy)
+        previous = self.previous or {}
+        added = [{'id': fp, 'proxy': dict(proxy)} for fp, proxy in current.items() if fp not in previous]
+        removed = sorted(previous.keys() - current.keys())
+        renamed = {fp: str(proxy.get('name', '')) for fp, proxy in current.items()
+                   if fp in previous and previous[fp] != str(proxy.get('name', ''))}
+
+        # 没有上一次的产物或节点没有变化时保留现有增量文件
+        if self.previous is None:
+            logger.info(f"[{self.name}] 没有上一次的 {self.source_path.name}，不生成增量文件。")
+        if self.previous is None or not (added or removed or renamed):
+            return {'count': 0, 'digest': None, 'changed': False}
+
+        delta = {
+            'version': self.version + 1,
+            'base': self.version,
+            'generated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'total': len(current),
+            'added': added,
+            'removed': removed,
+            'renamed': renamed,
+        }
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        try:
+            with tmp_path.open('w', encoding='utf-8') as f:
+                json.dump(delta, f, ensure_ascii=False, separators=(',', ':'), default=str)
+            os.replace(tmp_path, self.path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        logger.info(f"[{self.name}] 版本 {delta['base']} -> {delta['version']}: "
+                    f"新增 {len(added)}，移除 {len(removed)}，改名 {len(renamed)}")
+        return {'count': len(added) + len(removed) + len(renamed), 'digest': None, 'changed': True}
+
+
+class Renderer:
+    """把同一份节点列表并行交给所有 sink 渲染"""
+    def __init__(self, sinks: Iterable[Sink], workers: Optional[int] = None):
+        self.sinks = list(sinks)
+        self.workers = workers
+
+    def render(self, proxies: list) -> dict:
+        """
+        渲染全部输出目标。单个 sink 失败不影响其他 sink。
+
+        Returns:
+            {sink 名称: Sink.write 的结果，失败时为 None}
+        """
+        results = {}
+        ready = []
+        for sink in self.sinks:
+            # prepare 失败 (模板无法编译、缓存目录不可写、上一次产物损坏等) 只跳过该 sink
+            try:
+                sink.prepare()
+                ready.append(sink)
+            except Exception as e:
+                results[sink.name] = None
+                logger.error(f"[{sink.name}] 准备 {sink.path} 失败: {e}")
+        if not ready:
+            return results
+        with ThreadPoolExecutor(max_workers=self.workers or len(ready)) as executor:
+            futures = {sink: executor.submit(sink.write, proxies) for sink in ready}
+            for sink, future in futures.items():
+                try:
+                    result = results[sink.name] = future.result()
+                    if result['changed']:
+                        logger.info(f"[{sink.name}] 已写出 {result['count']} 个条目: {sink.path}")
+                    else:
+                        logger.info(f"[{sink.name}] 内容未变化 (忽略时间戳)，保留现有文件: {sink.path}")
+                except Exception as e:
+                    results[sink.name] = None
+                    logger.error(f"[{sink.name}] 渲染 {sink.path} 失败: {e}")
+        return results
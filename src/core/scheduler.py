@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from typing import Iterable, Optional
+
+from core.scoring import wilson_interval
+
+logger = logging.getLogger('Core.Scheduler')
+
+# 默认测试间隔 (秒)：结果不稳定的节点每次运行都会到期，
+# 连续相同结果的节点间隔按 2 的幂次增长，直到上限
+DEFAULT_BASE_INTERVAL = 3600
+DEFAULT_MAX_INTERVAL = 7 * 86400
+
+
+def probe_interval(record: dict, base_interval: int = DEFAULT_BASE_INTERVAL,
+                   max_interval: int = DEFAULT_MAX_INTERVAL) -> int:
+    """
+    根据连续相同结果的次数计算下次测试的间隔。
+    streak 为 ±1 时间隔为 base_interval，每多一次连续相同结果间隔翻倍。
+    """
+    streak = abs(record.get('streak', 0))
+    if streak <= 1:
+        return base_interval
+    # 限制指数，避免超大 streak 造成无意义的大整数运算
+    exponent = min(streak - 1, 32)
+    return min(base_interval * (2 ** exponent), max_interval)
+
+
+def plan_probes(keys: Iterable[tuple], db: dict, budget: Optional[int] = None, now: Optional[float] = None,
+                base_interval: int = DEFAULT_BASE_INTERVAL,
+                max_interval: int = DEFAULT_MAX_INTERVAL) -> tuple[list[tuple], dict]:
+    """
+    根据历史记录挑选本次需要测试的节点。
+
+    优先级：
+      1. 历史中没有记录的新节点；
+      2. 已到期的节点，按通过率 Wilson 置信区间宽度降序 (越不确定越优先)，
+         宽度相同时按逾期程度降序；
+    未到期的稳定节点本次跳过。设置 budget 时只返回前 budget 个。
+
+    Returns:
+        (待测试的键列表, 统计信息字典)
+    """
+    now = now if now is not None else time.time()
+    new_keys = []
+    due = []
+    skipped = 0
+
+    for key in dict.fromkeys(keys):
+        record = db.get(key)
+        if record is None or record['pass'] + record['notpass'] == 0:
+            new_keys.append(key)
+            continue
+
+        interval = probe_interval(record, base_interval, max_interval)
+        elapsed = now - record.get('last_tested', 0)
+        if elapsed < interval:
+            skipped += 1
+            continue
+
+        low, high = wilson_interval(record['pass'], record['pass'] + record['notpass'])
+        due.append((high - low, elapsed / interval, key))
+
+    due.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    planned = new_keys + [key for _, _, key in due]
+
+    deferred = 0
+    if budget is not None and budget >= 0 and len(planned) > budget:
+        deferred = len(planned) - budget
+        planned = planned[:budget]
+
+    summary = {
+        'new': len(new_keys),
+        'due': len(due),
+        'skipped': skipped,
+        'deferred': deferred,
+        'planned': len(planned),
+    }
+    return planned, summary
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+import heapq
+import math
+from typing import Sequence
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+# 95% 置信度对应的 z 值
+DEFAULT_Z = 1.96
+# Bayesian 评分使用的 Beta(alpha, beta) 先验，默认均匀先验
+DEFAULT_PRIOR = (1.0, 1.0)
+SCORING_METHODS = ('wilson', 'bayes')
+
+
+def wilson_interval(passed: int, total: int, z: float = DEFAULT_Z) -> tuple[float, float]:
+    """
+    计算通过率的 Wilson 置信区间。
+    没有任何记录时返回 (0.0, 1.0)，即完全不确定。
+    """
+    if total <= 0:
+        return 0.0, 1.0
+    p = passed / total
+    z2 = z * z
+    denominator = 1 + z2 / total
+    center = (p + z2 / (2 * total)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / total + z2 / (4 * total * total)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def bayes_lower_bound(passed: int, total: int, z: float = DEFAULT_Z,
+                      prior: tuple[float, float] = DEFAULT_PRIOR) -> float:
+    """
+    通过率 Beta 后验分布的下界 (均值减 z 倍标准差，正态近似)。
+    先验让样本很少的节点向先验均值收缩，没有记录时只由先验决定。
+    """
+    a = passed + prior[0]
+    b = total - passed + prior[1]
+    n = a + b
+    mean = a / n
+    std = math.sqrt(a * b / (n * n * (n + 1)))
+    return max(0.0, mean - z * std)
+
+
+def score_rows(passed: Sequence[int], total: Sequence[int], method: str = 'wilson', z: float = DEFAULT_Z,
+               prior: tuple[float, float] = DEFAULT_PRIOR) -> list[float]:
+    """
+    一次性计算多行历史记录的可靠性评分 (通过率置信下界)。
+    安装了 NumPy 时整体向量化计算，否则逐行计算，两者结果一致。
+
+    Args:
+        passed: 每行的通过次数。
+        total: 每行的测试总次数。
+        method: 'wilson' (Wilson 区间下界，无记录为 0) 或 'bayes' (Beta 后验下界)。
+    """
+    if method not in SCORING_METHODS:
+        raise ValueError(f"未知的评分方法: {method}")
+
+    if HAS_NUMPY:
+        return _score_rows_numpy(passed, total, method, z, prior).tolist()
+    if method == 'wilson':
+        return [wilson_interval(p, t, z)[0] if t > 0 else 0.0 for p, t in zip(passed, total)]
+    return [bayes_lower_bound(p, t, z, prior) for p, t in zip(passed, total)]
+
+
+def _score_rows_numpy(passed, total, method, z, prior):
+    passed = np.asarray(passed, dtype=np.float64)
+    total = np.asarray(total, dtype=np.float64)
+    if method == 'wilson':
+        safe_total = np.where(total > 0, total, 1.0)
+        p = passed / safe_total
+        z2 = z * z
+        denominator = 1 + z2 / safe_total
+        center = (p + z2 / (2 * safe_total)) / denominator
+        margin = z * np.sqrt(p * (1 - p) / safe_total + z2 / (4 * safe_total * safe_total)) / denominator
+        return np.where(total > 0, np.clip(center - margin, 0.0, 1.0), 0.0)
+
+    a = passed + prior[0]
+    b = total - passed + prior[1]
+    n = a + b
+    std = np.sqrt(a * b / (n * n * (n + 1)))
+    return np.maximum(0.0, a / n - z * std)
+
+
+def top_k_indices(scores: Sequence[float], k: int) -> list[int]:
+    """返回评分最高的 k 行的下标 (按评分降序)，评分相同时下标小者优先"""
+    if k <= 0:
+        return []
+    if k >= len(scores):
+        return sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+    if HAS_NUMPY:
+        values = np.asarray(scores, dtype=np.float64)
+        candidates = np.argpartition(-values, k - 1)[:k]
+        # argpartition 不保证同分时的取舍，补齐与第 k 名同分的行后再稳定排序
+        threshold = values[candidates].min()
+        candidates = np.flatnonzero(values >= threshold)
+        order = candidates[np.lexsort((candidates, -values[candidates]))]
+        return order[:k].tolist()
+    return heapq.nsmallest(k, range(len(scores)), key=lambda i: (-scores[i], i))
@@ -7,7 +7,8 @@ from pathlib import Path
 from core.network import NetworkClient
 from core.download import fetch_and_save_source
 from core.sha256 import calculate_content_sha256
-from core.yaml_handler import load_yaml_from_string
+from core.merge_reader import iter_proxies_from_text
+from core.node_rules import CleaningPipeline
 
 logger = logging.getLogger("Core.SourceManager")
 
@@ -27,11 +28,20 @@ def load_and_update_sources(sources_path: Path) -> list[dict]:
         logger.error(f"解析JSON文件 {sources_path} 失败: {e}")
         sys.exit(1)
 
+    # 先校验全部来源的清洗规则，配置错误时在下载前退出
+    pipelines = {}
+    for index, source in enumerate(sources):
+        try:
+            pipelines[index] = CleaningPipeline.from_specs(source.get('clean'))
+        except ValueError as e:
+            logger.error(f"来源 '{source.get('name', '未命名来源')}' 的清洗规则无效: {e}")
+            sys.exit(1)
+
     client = NetworkClient()
     all_proxies = []
     has_updates = False
 
-    for source in sources:
+    for index, source in enumerate(sources):
         name = source.get('name', '未命名来源')
         url = source.get('url')
         if not url:
@@ -56,9 +66,16 @@ def load_and_update_sources(sources_path: Path) -> list[dict]:
         else:
             logger.info(f"  - 来源 '{name}' 内容无变化。")
 
-        data = load_yaml_from_string(content, name)
-        proxies = data.get('proxies', []) or []
+        # 边解析边清洗：行级规则在解析前丢弃节点，其余节点逐个读出后立即执行清洗规则
+        pipeline = pipelines[index]
+        try:
+            proxies = list(pipeline.filter(iter_proxies_from_text(content, pipeline.accept_line)))
+        except Exception as e:
+            logger.warning(f"解析来自 '{name}' 的YAML内容失败: {e}，已跳过此来源。")
+            continue
         logger.info(f"  - 从 '{name}' 找到 {len(proxies)} 个代理。")
+        if pipeline.dropped:
+            logger.info(f"  - 清洗规则丢弃 {sum(pipeline.dropped.values())} 个代理 ({pipeline.summary()})。")
         all_proxies.extend(proxies)
 
     if has_updates:
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Clash 配置的单遍流式清洗。
+
+StreamCleaner 逐行读取配置，维护当前所在的顶层段 (proxies、proxy-groups、rules 等)，
+把每一行依次交给规则插件处理后立即输出，不构建中间的整文件行列表。
+每个插件只关心自己的段：可以丢弃、保留或替换当前行，也可以在段开头插入新行。
+"""
+import logging
+import re
+from typing import Iterable, Iterator, Optional
+
+logger = logging.getLogger('Core.StreamCleaner')
+
+_NAME_PATTERN = re.compile(r"name:\s*(?:\"([^\"]+)\"|'([^']+)'|([^,]+))")
+_GROUP_NAME_PATTERN = re.compile(r'-\s+name:\s*(.*)')
+
+
+def extract_proxy_name(line: str) -> Optional[str]:
+    """从单行 flow 风格的代理定义中提取 name 字段的值"""
+    match = _NAME_PATTERN.search(line)
+    if not match:
+        return None
+    name = next((group for group in match.groups() if group is not None), None)
+    return name.strip() if name else None
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip(' '))
+
+
+class CleanerRule:
+    """
+    清洗规则插件的基类。
+
+    process 接收当前段名、是否为段首行以及行内容，返回要输出的行 (空元组表示丢弃)。
+    段名为顶层键名；顶层注释行的段名为 None。
+    sections 声明规则关心的段，其他段的行不会交给该规则；为 None 时处理所有段。
+    """
+    sections: Optional[frozenset] = None
+
+    def process(self, section: Optional[str], is_header: bool, line: str) -> Iterable[str]:
+        return (line,)
+
+    def report(self) -> Optional[str]:
+        """返回该规则的处理摘要，用于日志输出"""
+        return None
+
+
+class RemoveSSRule(CleanerRule):
+    """
+    移除 type 为 ss 且 cipher 为 ss 的代理，并删除代理组中对它们的引用。
+    代理定义位于 proxy-groups 之前，因此单遍扫描时引用出现前已知道全部被移除的名称。
+    """
+    sections = frozenset({'proxies', 'proxy-groups'})
+
+    def __init__(self):
+        self.removed: set[str] = set()
+
+    def process(self, section, is_header, line):
+        if is_header:
+            return (line,)
+        if section == 'proxies':
+            # 先做廉价的子串判断，只对命中的行运行正则
+            if 'type: ss' in line and 'cipher: ss' in line:
+                name = extract_proxy_name(line)
+                if name:
+                    self.removed.add(name)
+                    return ()
+        elif section == 'proxy-groups' and self.removed:
+            stripped = line.strip()
+            if stripped.startswith('- ') and stripped[2:].strip().strip("'\"") in self.removed:
+                return ()
+        return (line,)
+
+    def report(self):
+        if not self.removed:
+            return "没有找到需要清理的 SS 服务器配置。"
+        return f"移除了 {len(self.removed)} 个 SS 服务器配置。"
+
+
+class GroupWhitelistRule(CleanerRule):
+    """只保留名称在白名单中的代理组，其余代理组整块丢弃"""
+    sections = frozenset({'proxy-groups'})
+
+    def __init__(self, keep: Iterable[str]):
+        self.keep = set(keep)
+        self.kept: list[str] = []
+        self.dropped = 0
+        self._block_indent: Optional[int] = None
+        self._keeping = False
+        self._seen = False
+
+    def process(self, section, is_header, line):
+        if section != 'proxy-groups':
+            return (line,)
+        if is_header:
+            self._seen = True
+            return (line,)
+
+        # 段内第一行的缩进即为代理组条目的缩进
+        if self._block_indent is None:
+            self._block_indent = _indent(line)
+        if line.strip() and _indent(line) == self._block_indent and line.lstrip().startswith('-'):
+            match = _GROUP_NAME_PATTERN.search(line)
+            name = match.group(1).strip().strip("'\"") if match else ""
+            self._keeping = name in self.keep
+            if self._keeping:
+                self.kept.append(name)
+            else:
+                self.dropped += 1
+        return (line,) if self._keeping else ()
+
+    def report(self):
+        if not self._seen:
+            return "未找到 'proxy-groups:' 配置块，跳过代理组清理。"
+        return f"保留代理组 {len(self.kept)} 个，移除 {self.dropped} 个。"
+
+
+class ReplaceRulesRule(CleanerRule):
+    """把 rules 段的全部规则替换为给定的规则列表"""
+    sections = frozenset({'rules'})
+
+    def __init__(self, rules: Iterable[str], indent: str = '  '):
+        self.rules = [f"{indent}- {rule}" for rule in rules]
+        self.replaced = 0
+
+    def process(self, section, is_header, line):
+        if section != 'rules':
+            return (line,)
+        if is_header:
+            return (line, *self.rules)
+        self.replaced += 1
+        return ()
+
+    def report(self):
+        return f"已将 {self.replaced} 行规则替换为 {len(self.rules)} 条。"
+
+
+class StreamCleaner:
+    """按行驱动的段感知状态机，按顺序串联规则插件"""
+    def __init__(self, rules: Iterable[CleanerRule]):
+        self.rules = list(rules)
+        self.lines_in = 0
+        self.lines_out = 0
+
+    def clean(self, lines: Iterable[str]) -> Iterator[str]:
+        """逐行清洗，返回清洗后的行 (不含换行符)"""
+        section = None
+        active = self._active_rules(section)
+        for raw in lines:
+            line = raw.rstrip('\r\n')
+            self.lines_in += 1
+
+            # 顶层 (无缩进) 的非空行开启新的段
+            is_header = False
+            if line and not line[0].isspace():
+                if line.startswith('#'):
+                    section = None
+                else:
+                    section = line.split(':', 1)[0].strip()
+                    is_header = True
+                active = self._active_rules(section)
+
+            current = (line,)
+            for rule in active:
+                if len(current) == 1:
+                    current = rule.process(section, is_header, current[0])
+                else:
+                    current = [out for item in current for out in rule.process(section, is_header, item)]
+                if not current:
+                    break
+            self.lines_out += len(current)
+            yield from current
+
+    def _active_rules(self, section: Optional[str]) -> list[CleanerRule]:
+        return [rule for rule in self.rules if rule.sections is None or section in rule.sections]
+
+    def write(self, lines: Iterable[str], fp) -> int:
+        """把清洗结果逐行写入文件对象，返回写出的行数"""
+        count = 0
+        for line in self.clean(lines):
+            fp.write(line)
+            fp.write('\n')
+            count += 1
+        return count
+
+    def log_reports(self):
+        for rule in self.rules:
+            message = rule.report()
+            if message:
+                logger.info(message)
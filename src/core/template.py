@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Clash 模板的预编译与拼接输出。
+
+模板中除 proxies 等动态键 (slot) 以外的内容在每次运行之间都不变，
+因此只在模板变化时序列化一次，按插入点切分为文本段并缓存到磁盘 (以模板内容与输出选项的哈希为键)。
+生成配置时依次写出缓存的文本段，在插入点处只序列化该键的值，
+输出与把完整配置交给 yaml.dump 的结果逐字节一致。
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+import yaml
+
+logger = logging.getLogger('Core.Template')
+
+
+def _slot_marker(key: str) -> str:
+    return f"__slot_{key}__"
+
+
+class CompiledTemplate:
+    """
+    segments 为按顺序排列的 ['text', 文本] 或 ['slot', 键]；
+    defaults 保存模板中各 slot 键原有的值，渲染时未提供该键的值则使用它。
+    """
+    def __init__(self, segments: list, defaults: dict, key: str = ''):
+        self.segments = segments
+        self.defaults = defaults
+        self.key = key
+
+    def to_json(self) -> dict:
+        return {'key': self.key, 'segments': self.segments, 'defaults': self.defaults}
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'CompiledTemplate':
+        return cls(data['segments'], data['defaults'], data['key'])
+
+    def render(self, fp, values: dict, dumper, **dump_options):
+        """把文本段与 slot 的序列化结果依次写入二进制文件对象 fp"""
+        for kind, value in self.segments:
+            if kind == 'text':
+                fp.write(value.encode('utf-8'))
+            else:
+                data = {value: values[value] if value in values else self.defaults.get(value)}
+                yaml.dump(data, fp, Dumper=dumper, allow_unicode=True, sort_keys=False,
+                          encoding='utf-8', **dump_options)
+
+
+def compile_template(template: dict, slots: Iterable[str], dumper, key: str = '', **dump_options) -> CompiledTemplate:
+    """
+    把模板序列化一次并在 slot 键处切分。slot 键的值先替换为占位符，
+    序列化后占位符所在的整行即为插入点；模板中没有的 slot 键追加在末尾。
+    """
+    slots = list(slots)
+    marked = {k: (_slot_marker(k) if k in slots else v) for k, v in template.items()}
+    for slot in slots:
+        marked.setdefault(slot, _slot_marker(slot))
+    text = yaml.dump(marked, Dumper=dumper, allow_unicode=True, sort_keys=False, **dump_options)
+
+    segments = []
+    rest = text
+    for slot in sorted(slots, key=lambda k: list(marked).index(k)):
+        line = f"{slot}: {_slot_marker(slot)}\n"
+        index = rest.find(line)
+        if index < 0 or (index > 0 and rest[index - 1] != '\n'):
+            raise ValueError(f"无法在模板中定位插入点: {slot}")
+        if index:
+            segments.append(['text', rest[:index]])
+        segments.append(['slot', slot])
+        rest = rest[index + len(line):]
+    if rest:
+        segments.append(['text', rest])
+    return CompiledTemplate(segments, {slot: template.get(slot) for slot in slots}, key)
+
+
+def template_key(template_path: Path, slots: Iterable[str], dumper, **dump_options) -> str:
+    """模板内容、slot 与输出选项共同决定编译结果"""
+    digest = hashlib.sha256(template_path.read_bytes())
+    digest.update(json.dumps([sorted(slots), dumper.__name__, sorted(dump_options.items())]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_compiled(template_path: Path, slots: Iterable[str], dumper, cache_path: Optional[Path] = None,
+                  **dump_options) -> CompiledTemplate:
+    """
+    读取模板的编译结果：缓存的键与当前模板一致时直接使用，否则解析模板、重新编译并写回缓存。
+    """
+    slots = list(slots)
+    key = template_key(template_path, slots, dumper, **dump_options)
+    if cache_path and cache_path.is_file():
+        try:
+            with cache_path.open('r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('key') == key:
+                return CompiledTemplate.from_json(data)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取模板缓存 {cache_path} 失败: {e}，将重新编译。")
+
+    logger.info(f"模板已变化，重新编译: {template_path.name}")
+    with template_path.open('r', encoding='utf-8') as f:
+        template = yaml.safe_load(f) or {}
+    compiled = compile_template(template, slots, dumper, key, **dump_options)
+
+    if cache_path:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+        try:
+            with tmp_path.open('w', encoding='utf-8') as f:
+                json.dump(compiled.to_json(), f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, cache_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+    return compiled
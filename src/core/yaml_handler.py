@@ -34,6 +34,14 @@ def single_quoted_string_representer(dumper, data):
 NoAliasDumper.add_representer(FlowStyleDict, flow_style_dict_representer)
 IndentedDumper.add_representer(SingleQuotedString, single_quoted_string_representer)
 
+class FastDumper(getattr(yaml, 'CSafeDumper', yaml.SafeDumper)):
+    """libyaml 提供的 C 实现比纯 Python 的 Dumper 快一个数量级，不可用时退回 SafeDumper"""
+    def ignore_aliases(self, data):
+        return True
+
+FastDumper.add_representer(FlowStyleDict, lambda dumper, data: dumper.represent_dict(data))
+FastDumper.add_representer(SingleQuotedString, lambda dumper, data: dumper.represent_str(str(data)))
+
 
 # --- 核心 IO 函数 ---
 
@@ -98,29 +106,20 @@ def load_yaml_from_string(content: str, source_name: str) -> dict:
         print(f"警告: 处理来自 '{source_name}' 的内容时发生未知错误: {e}，返回空配置。")
         return {}
 
-def save_yaml_file(data: dict, file_path: Path):
+def dump_yaml_fast(data, stream=None):
     """
-    将Python字典保存为YAML文件。
+    使用 libyaml 快速序列化数据，适用于仅供程序读取的临时文件。
+    不保留 FlowStyleDict / SingleQuotedString 的输出风格。
 
     Args:
-        data: 要保存的字典数据。
-        file_path: 输出文件的路径。
+        data: 要序列化的数据。
+        stream: 输出流；为 None 时返回字符串。
     """
-    print(f"正在保存合并后的配置文件到: {file_path}")
-    try:
-        # 确保目标目录存在，如果不存在则创建
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        with file_path.open('w', encoding='utf-8') as f:
-            yaml.dump(
-                data,
-                f,
-                Dumper=IndentedDumper,
-                allow_unicode=True,
-                sort_keys=False,
-                indent=2,
-                width=9999
-            )
-        print("保存成功。")
-    except Exception as e:
-        print(f"错误: 写入文件 {file_path} 失败: {e}", file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+    return yaml.dump(
+        data,
+        stream,
+        Dumper=FastDumper,
+        allow_unicode=True,
+        sort_keys=False,
+        width=9999
+    )
@@ -1,99 +1,169 @@
 # -*- coding: utf-8 -*-
+"""
+把 extra_subs.txt 中的明文链接与 Base64 订阅串解码为逐行的节点链接。
+
+输入逐行读取、结果逐行写出，不在内存中保留整个文件；
+每个链接只保存 64 位哈希值用于去重，大的 Base64 订阅串交给进程池并行解码，输出顺序与输入一致。
+"""
+import argparse
 import base64
-import sys
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+LINK_PREFIXES = ('vmess://', 'vless://', 'ss://', 'trojan://', 'hysteria')
+# 超过该长度的 Base64 串交给进程池解码，较短的直接在主进程解码
+PARALLEL_THRESHOLD = 64 * 1024
+# 同时在途的解码任务上限，限制未写出结果占用的内存
+MAX_PENDING = 8
+
+
 def safe_base64_decode(s):
     """尝试解码 Base64 字符串"""
     if not s: return None
     s = s.strip()
     # 简单的过滤：如果包含空格，通常不是有效的 Base64 订阅串
     if ' ' in s: return None
-    
+
     # URL Safe 处理
     s = s.replace('-', '+').replace('_', '/')
     missing_padding = len(s) % 4
     if missing_padding:
         s += '=' * (4 - missing_padding)
-    
+
     try:
         decoded = base64.b64decode(s).decode('utf-8', errors='ignore')
         # 验证解码后的内容是否看起来像链接列表
         # 只要包含常见协议头，就认为是有效的解码结果
-        if any(p in decoded for p in ['vmess://', 'vless://', 'ss://', 'trojan://', 'hysteria']):
+        if any(p in decoded for p in LINK_PREFIXES):
             return decoded
         return None
     except Exception:
         return None
 
+
+def split_links(decoded):
+    """把解码后的内容拆分为链接列表，无法解码 (None) 时返回空列表"""
+    if not decoded:
+        return []
+    return [line.strip() for line in decoded.splitlines() if line.strip()]
+
+
+class SubsDecoder:
+    """逐行解码并去重的写出器"""
+    def __init__(self, workers=None, threshold=PARALLEL_THRESHOLD, max_pending=MAX_PENDING):
+        self.workers = workers
+        self.threshold = threshold
+        self.max_pending = max_pending
+        self.seen = set()
+        self.count = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self._executor = None
+
+    def _submit(self, line):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor.submit(safe_base64_decode, line)
+
+    def _entries(self, lines):
+        """把输入行转换为按顺序输出的条目: ('comment', 行)、('links', 列表) 或 ('future', 解码任务)"""
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            # 如果是注释，直接保留
+            if line.startswith('#'):
+                yield 'comment', line
+            # 已经是明文链接，直接输出
+            elif line.startswith(LINK_PREFIXES):
+                yield 'links', [line]
+            elif self.workers != 1 and len(line) >= self.threshold:
+                yield 'future', self._submit(line)
+            else:
+                yield 'links', split_links(safe_base64_decode(line))
+
+    def _write(self, kind, value, f_out):
+        if kind == 'comment':
+            f_out.write(value + '\n')
+            return
+        # 工作进程只返回解码后的文本，拆分在主进程进行，减少跨进程传输的对象数量
+        links = split_links(value.result()) if kind == 'future' else value
+        if not links:
+            # 既不是链接也无法解码，可能是无效内容，丢弃
+            self.invalid += 1
+        seen = self.seen
+        fresh = []
+        for link in links:
+            # 只保存 128 位摘要而不是链接本身，去重集合的内存与链接长度无关；
+            # 内置 hash 只有 64 位，碰撞时不同的链接会被误判为重复而丢弃
+            digest = hashlib.blake2b(link.encode('utf-8'), digest_size=16).digest()
+            if digest in seen:
+                self.duplicates += 1
+                continue
+            seen.add(digest)
+            fresh.append(link)
+        if fresh:
+            f_out.write('\n'.join(fresh))
+            f_out.write('\n')
+            self.count += len(fresh)
+
+    def run(self, lines, f_out):
+        """
+        解码 lines 并写入 f_out。进程池中的任务按提交顺序取回结果，
+        在途任务达到上限时先写出最早的结果，再继续读取输入。
+        """
+        pending = deque()
+        try:
+            for kind, value in self._entries(lines):
+                pending.append((kind, value))
+                # 排在最前面的不是解码任务或任务已完成时可以立即写出
+                while pending and (pending[0][0] != 'future' or pending[0][1].done()
+                                   or len(pending) > self.max_pending):
+                    self._write(*pending.popleft(), f_out)
+            while pending:
+                self._write(*pending.popleft(), f_out)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
 def main():
     # 默认读取 config/extra_subs.txt
     project_root = Path(__file__).parent.parent
     default_file = project_root / "config" / "extra_subs.txt"
-    
-    file_path = default_file
-    if len(sys.argv) > 1:
-        file_path = Path(sys.argv[1])
-        
+
+    parser = argparse.ArgumentParser(description='解码订阅文件中的 Base64 订阅串并去重')
+    parser.add_argument('file', nargs='?', type=Path, default=default_file, help='输入文件 (默认 config/extra_subs.txt)')
+    parser.add_argument('-o', '--output', type=Path, help='输出文件 (默认与输入同目录的 decode_subs.txt)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='解码大订阅串的进程数')
+    args = parser.parse_args()
+
+    file_path = args.file
     if not file_path.is_file():
         print(f"错误: 文件未找到: {file_path}")
         return
 
-    # 读取文件内容
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except Exception as e:
-        print(f"错误: 无法读取文件: {e}")
-        return
-        
-    output_path = file_path.with_name("decode_subs.txt")
+    output_path = args.output or file_path.with_name("decode_subs.txt")
 
     print(f"# --- 开始处理文件: {file_path.name} ---")
     print(f"# 正在解析并写入到: {output_path}")
     print("")
 
-    lines = content.splitlines()
-    count = 0
-    unique_lines = set()
-    
+    decoder = SubsDecoder(workers=args.workers)
     try:
-        with open(output_path, 'w', encoding='utf-8') as f_out:
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                    
-                # 如果是注释，直接保留
-                if line.startswith('#'):
-                    f_out.write(line + '\n')
-                    continue
-
-                # 1. 检查是否已经是明文链接，如果是直接输出
-                if any(line.startswith(p) for p in ['vmess://', 'vless://', 'ss://', 'trojan://', 'hysteria']):
-                    f_out.write(line + '\n')
-                    count += 1
-                    continue
-                    
-                # 2. 尝试 Base64 解码
-                decoded = safe_base64_decode(line)
-                if decoded:
-                    # Base64 解码后可能包含多行链接
-                    sub_lines = decoded.splitlines()
-                    for sub_line in sub_lines:
-                        sub_line = sub_line.strip()
-                        if sub_line:
-                            f_out.write(sub_line + '\n')
-                            count += 1
-                else:
-                    # 既不是链接也无法解码，可能是无效内容，作为注释保留
-                    pass
-    except Exception as e:
-        print(f"写入文件失败: {e}")
+        with open(file_path, 'r', encoding='utf-8') as f_in, open(output_path, 'w', encoding='utf-8') as f_out:
+            decoder.run(f_in, f_out)
+    except OSError as e:
+        print(f"错误: 读写文件失败: {e}")
         return
 
     print("")
-    print(f"# --- 处理完成，共提取出 {count} 个节点链接 ---")
+    print(f"# --- 处理完成，共提取出 {decoder.count} 个节点链接 ---")
+    print(f"# 跳过重复链接 {decoder.duplicates} 个，无法解码的行 {decoder.invalid} 行")
     print(f"# 结果已保存至: {output_path}")
 
 
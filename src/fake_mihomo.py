@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+本地 mihomo 控制器替身，用于在没有内核二进制的环境 (例如 Linux CI) 中测试和压测 test.py。
+
+实现的接口:
+  GET  /version
+  GET  /proxies/{name}/delay?timeout=&url=
+  PUT  /configs              (payload 或 path，读取其中的代理名称)
+
+每个代理按名称生成确定性的画像：是否失效、基础延迟 (对数正态分布)；
+每次请求在基础延迟上叠加抖动，超过 timeout 时返回 504，与真实内核一致。
+设置 capacity 后，在途请求超过容量时延迟按比例放大，用于模拟测试机过载。
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+import yaml
+
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class FakeController:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, secret: str = None,
+                 latency_median_ms: float = 250, latency_sigma: float = 0.6, failure_rate: float = 0.4,
+                 jitter: float = 0.2, time_scale: float = 1.0, capacity: int = None,
+                 check_proxies: bool = True, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.latency_median_ms = latency_median_ms
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.jitter = jitter
+        self.time_scale = time_scale
+        self.capacity = capacity
+        self.check_proxies = check_proxies
+        self.seed = seed
+
+        self.proxy_names: set[str] = set()
+        self.stats = {'delay_requests': 0, 'passed': 0, 'timeouts': 0, 'not_found': 0, 'reloads': 0,
+                      'max_in_flight': 0}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    # --- 节点画像 ---
+
+    def profile(self, name: str) -> tuple[bool, float]:
+        """返回 (是否失效, 基础延迟 ms)，同一名称在同一 seed 下结果固定"""
+        rng = random.Random(f"{self.seed}:{name}")
+        dead = rng.random() < self.failure_rate
+        base = rng.lognormvariate(math.log(self.latency_median_ms), self.latency_sigma)
+        return dead, base
+
+    def load_payload(self, text: str):
+        config = yaml.load(text, Loader=_YAML_LOADER) or {}
+        proxies = config.get('proxies') or []
+        with self._lock:
+            self.proxy_names = {str(p.get('name')) for p in proxies if isinstance(p, dict)}
+            self.stats['reloads'] += 1
+
+    # --- 服务控制 ---
+
+    def start(self) -> int:
+        controller = self
+
+        class Handler(_Handler):
+            pass
+        Handler.controller = controller
+
+        ThreadingHTTPServer.request_queue_size = 1024
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.port
+
+    def serve_forever(self):
+        self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # --- 延迟测试 ---
+
+    def delay(self, name: str, timeout_ms: float) -> tuple[int, dict]:
+        with self._lock:
+            self.stats['delay_requests'] += 1
+            if self.check_proxies and name not in self.proxy_names:
+                self.stats['not_found'] += 1
+                return 404, {'message': 'Resource not found'}
+            self._in_flight += 1
+            in_flight = self._in_flight
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], in_flight)
+
+        try:
+            dead, base = self.profile(name)
+            delay_ms = base * (1 + random.uniform(-self.jitter, self.jitter))
+            if self.capacity and in_flight > self.capacity:
+                delay_ms *= in_flight / self.capacity
+
+            if dead or delay_ms > timeout_ms:
+                time.sleep(timeout_ms / 1000 * self.time_scale)
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                return 504, {'message': 'Timeout'}
+
+            time.sleep(delay_ms / 1000 * self.time_scale)
+            with self._lock:
+                self.stats['passed'] += 1
+            return 200, {'delay': int(delay_ms)}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    controller: FakeController = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict = None):
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def _authorized(self) -> bool:
+        secret = self.controller.secret
+        if secret and self.headers.get('Authorization') != f"Bearer {secret}":
+            self._send(401, {'message': 'Unauthorized'})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        parsed = urlparse(self.path)
+        parts = [unquote(p) for p in parsed.path.split('/') if p]
+        if parts == ['version']:
+            self._send(200, {'meta': True, 'version': 'fake-mihomo'})
+        elif len(parts) == 3 and parts[0] == 'proxies' and parts[2] == 'delay':
+            query = parse_qs(parsed.query)
+            try:
+                timeout_ms = float(query['timeout'][0])
+                query['url'][0]
+            except (KeyError, ValueError):
+                self._send(400, {'message': 'Body invalid'})
+                return
+            self._send(*self.controller.delay(parts[1], timeout_ms))
+        else:
+            self._send(404, {'message': 'Resource not found'})
+
+    def do_PUT(self):
+        if not self._authorized():
+            return
+        if urlparse(self.path).path != '/configs':
+            self._send(404, {'message': 'Resource not found'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if body.get('payload'):
+                self.controller.load_payload(body['payload'])
+            elif body.get('path'):
+                with open(body['path'], 'r', encoding='utf-8') as f:
+                    self.controller.load_payload(f.read())
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            self._send(400, {'message': str(e)})
+            return
+        self._send(204)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地 mihomo 控制器替身')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=19090)
+    parser.add_argument('--secret', type=str, default='test_secret_123')
+    parser.add_argument('--latency', type=float, default=250, help='节点基础延迟的中位数 (ms)')
+    parser.add_argument('--sigma', type=float, default=0.6, help='基础延迟对数正态分布的 sigma')
+    parser.add_argument('--failure-rate', type=float, default=0.4, help='失效节点比例')
+    parser.add_argument('--jitter', type=float, default=0.2, help='单次请求的相对抖动幅度')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='实际等待时间的缩放系数')
+    parser.add_argument('--capacity', type=int, help='模拟的并发容量，超过后延迟按比例放大')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fake = FakeController(host=args.host, port=args.port, secret=args.secret,
+                          latency_median_ms=args.latency, latency_sigma=args.sigma,
+                          failure_rate=args.failure_rate, jitter=args.jitter,
+                          time_scale=args.time_scale, capacity=args.capacity, seed=args.seed)
+    print(f"fake mihomo 控制器已启动: http://{args.host}:{args.port}")
+    fake.serve_forever()
@@ -5,12 +5,13 @@ import re
 from pathlib import Path
 from datetime import datetime
 import argparse
+import functools
 import json
 import logging
 
 import config
 from core.yaml_handler import (
-    load_yaml_file, save_yaml_file,
+    load_yaml_file,
     FlowStyleDict, SingleQuotedString
 )
 from core.logger import setup_logger
@@ -19,12 +20,42 @@ from core import filters
 from core import proxy_tools
 from core import source_manager
 from core import geoip
+from core import groups
+from core import history
+from core import latency
 from core import parser as link_parser
+from core import profiler as stage_profiler
+from core import renderer
+from core import v2rayn
 
 setup_logger(name=None)
 logger = logging.getLogger("Merge")
 
 
+# 可渲染的输出目标，见 build_sinks
+RENDER_TARGETS = ('clash', 'mobile', 'v2ray', 'v2rayn', 'conn', 'delta')
+# 默认生成的输出。v2rayn.txt 由工作流按需加入 --targets，conn.yml 由 Connective 工作流 (conn.py) 生成
+DEFAULT_TARGETS = ('clash', 'mobile', 'v2ray', 'delta')
+# 预压缩副本的格式，未安装 brotli 时自动跳过 br
+COMPRESS_FORMATS = ('gz', 'br')
+# 生成的国家优选组 / 全局优选组加入模板中该 select 组的可选项
+GENERATED_GROUPS_PARENT = '🚀 代理'
+# 每个国家优选组与全局优选组的节点数上限
+GROUP_TOP_K = 10
+GROUP_GLOBAL_K = 20
+# mobile.yml 每个国家保留的节点数与节点总数上限
+MOBILE_TOP_K = 5
+MOBILE_MAX_NODES = 150
+
+
+def parse_targets(value: str) -> set:
+    targets = {item.strip() for item in value.split(',') if item.strip()}
+    unknown = targets - set(RENDER_TARGETS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"未知的输出目标: {', '.join(sorted(unknown))}")
+    return targets
+
+
 def check_content_changes(new_proxies: list, output_path: Path, manual_file_path: Path) -> bool:
     """
     检查新生成的代理列表与现有文件是否一致。
@@ -135,16 +166,6 @@ def merge_manual_nodes(unique_proxies: list, manual_file_path: Path) -> list:
     return unique_proxies
 
 
-def get_flag(country_code: str) -> str:
-    """将国家代码转换为 Emoji 国旗"""
-    if not country_code or len(country_code) != 2 or country_code == 'UNK':
-        return "XX"
-    if country_code.upper() == 'XX':
-        return "🌐"
-    # 区域指示符符号 A 的 Unicode 是 127462，'A' 是 65，偏移量 127397
-    return "".join([chr(ord(c) + 127397) for c in country_code.upper()])
-
-
 def rename_proxies_by_country(proxies: list, db_path: Path, debug: bool = False) -> list:
     """根据 IP 归属地重命名代理"""
     if not geoip.is_available():
@@ -175,7 +196,7 @@ def rename_proxies_by_country(proxies: list, db_path: Path, debug: bool = False)
         # 统计计数，用于生成序号
         count = country_counter.get(code, 0) + 1
         country_counter[code] = count
-        flag = get_flag(code)
+        flag = proxy_tools.get_flag(code)
         if code == 'XX':
             new_name = f"{flag} {code} {count:02d}"
         else:
@@ -191,14 +212,20 @@ def rename_proxies_by_country(proxies: list, db_path: Path, debug: bool = False)
     return proxies
 
 
-def sort_proxies_by_country_and_count(proxies: list) -> list:
+def sort_proxies_by_country_and_count(proxies: list, history_db: dict = None) -> list:
     """
     根据名称中的国家代码和统计次数进行排序。
     格式: "count#Flag Code|..." (例如: "58#🇲🇩 MD|摩尔多瓦 05")
-    排序规则: Code 升序, count 降序
+    排序规则: Code 升序, count 降序, 连通性测试的延迟中位数升序 (无延迟数据的排在后面)
     """
     logger.info("正在根据国家代码和统计次数对节点进行排序...")
-    
+    history_db = history_db or {}
+
+    def get_latency(proxy):
+        record = history_db.get(history.endpoint_key(proxy))
+        p50 = latency.summarize(record)['p50'] if record else None
+        return p50 if p50 is not None else float('inf')
+
     def get_sort_key(proxy):
         name = str(proxy.get('name', ''))
         # 匹配: 数字#剩余部分
@@ -213,15 +240,15 @@ def sort_proxies_by_country_and_count(proxies: list) -> list:
                 code_match = re.match(r'^.*? ([A-Z]{2})', rest)
                 if code_match:
                     code = code_match.group(1)
-                    return (0, code, -count)
+                    return (0, code, -count, get_latency(proxy))
                 
                 # 如果没有代码 (例如手动节点)，按剩余部分排序
-                return (1, rest, -count)
+                return (1, rest, -count, get_latency(proxy))
             except ValueError:
                 pass
         
         # 不符合格式的节点
-        return (2, name, 0)
+        return (2, name, 0, 0)
 
     return sorted(proxies, key=get_sort_key)
 
@@ -249,9 +276,8 @@ def filter_proxies(proxies: list, blocklist_path: Path) -> list:
     return proxies
 
 
-def save_configs(proxies: list, template_data: dict, output_path: Path):
-    """构建并保存最终的配置文件 (merge.yml 和 mobile.yml)"""
-    # --- 新增时间戳节点 ---
+def add_timestamp_node(proxies: list):
+    """在 proxies 列表末尾新增时间戳节点，客户端可据此看到配置的更新时间"""
     logger.info("新增时间戳节点")
     update_time_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     timestamp_node_name = f"[{update_time_str}]-Timestamp"
@@ -267,28 +293,88 @@ def save_configs(proxies: list, template_data: dict, output_path: Path):
     proxies.append(FlowStyleDict(timestamp_node))
     logger.info(f"已在 proxies 列表末尾新增: {timestamp_node_name}")
 
-    # --- 构建最终配置 ---
-    logger.info("开始构建最终配置文件")
-    final_config = template_data
-    final_config['proxies'] = proxies
 
-    # --- 保存结果 ---
-    save_yaml_file(final_config, output_path)
+def group_sink_options(history_db: dict, group_top_k: int = GROUP_TOP_K, group_global_k: int = GROUP_GLOBAL_K) -> dict:
+    """ClashSink 生成国家优选组的参数 (conn.py 渲染 conn.yml 时复用)，两个上限都为 0 时不生成"""
+    if group_top_k <= 0 and group_global_k <= 0:
+        return {}
+    return {
+        'group_builder': functools.partial(groups.build_country_groups, history_db=history_db,
+                                           top_k=group_top_k, global_k=group_global_k),
+        'group_parent': GENERATED_GROUPS_PARENT,
+    }
+
+
+def build_sinks(targets: set, template_path: Path, output_path: Path, history_db: dict,
+                group_top_k: int = GROUP_TOP_K, group_global_k: int = GROUP_GLOBAL_K,
+                mobile_top_k: int = MOBILE_TOP_K, mobile_max_nodes: int = MOBILE_MAX_NODES) -> list:
+    """
+    根据要生成的目标构建输出 sink 列表，所有产物与 merge.yml 位于同一目录:
+      clash:  merge.yml (Clash 配置)
+      mobile: mobile.yml (每个国家按出现次数与通过率保留前 mobile_top_k 个节点，总数不超过 mobile_max_nodes)
+      v2ray:  v2ray_sub.txt (Base64 订阅)
+      v2rayn: v2rayn.txt (V2RayN 订阅，支持 hysteria2 / http)
+      conn:   conn.yml (按连通性历史记录过滤的配置，需要历史记录)
+      delta:  merge.delta.json (相对上一次 merge.yml 新增/移除的节点与版本号)
+    merge.yml 与 v2ray_sub.txt 同时生成 .gz 副本 (安装 brotli 后还有 .br)。
+    Clash 配置中追加按国家生成的 url-test 优选组，各组节点数分别不超过 group_top_k / group_global_k。
+    """
+    output_dir = output_path.parent
+    group_options = group_sink_options(history_db, group_top_k, group_global_k)
+    sinks = []
+    if 'clash' in targets:
+        sinks.append(renderer.ClashSink(output_path, template_path, compress=COMPRESS_FORMATS,
+                                       cache_dir=config.TEMPLATE_CACHE_DIR, **group_options))
+    if 'mobile' in targets:
+        select = functools.partial(groups.select_top_by_country, history_db=history_db,
+                                   per_country=mobile_top_k, limit=mobile_max_nodes)
+        sinks.append(renderer.SelectedClashSink(output_dir / config.MOBILE_OUTPUT_FILE.name, template_path, select,
+                                                name='mobile', compress=COMPRESS_FORMATS,
+                                                cache_dir=config.TEMPLATE_CACHE_DIR, **group_options))
+    if 'v2ray' in targets:
+        sinks.append(renderer.LinkSubSink(output_dir / "v2ray_sub.txt", link_parser.to_link, name='v2ray',
+                                          compress=COMPRESS_FORMATS))
+    if 'v2rayn' in targets:
+        sinks.append(renderer.LinkSubSink(output_dir / "v2rayn.txt", v2rayn.convert_node, name='v2rayn'))
+    if 'conn' in targets:
+        if history_db:
+            sinks.append(renderer.ConnViewSink(output_dir / "conn.yml", template_path, history_db,
+                                                  cache_dir=config.TEMPLATE_CACHE_DIR, **group_options))
+        else:
+            logger.info("没有连通性历史记录，跳过 conn.yml。")
+    if 'delta' in targets:
+        sinks.append(renderer.DeltaSink(output_path.with_suffix('.delta.json'), output_path))
+    return sinks
+
+
+def save_configs(proxies: list, template_path: Path, output_path: Path, targets: set = None,
+                 history_db: dict = None, **group_limits) -> dict:
+    """新增时间戳节点后，一次渲染全部输出产物 (merge.yml、mobile.yml、v2ray_sub.txt 等)，返回各 sink 的结果"""
+    add_timestamp_node(proxies)
+
+    logger.info("开始渲染输出文件")
+    sinks = build_sinks(targets or set(DEFAULT_TARGETS), template_path, output_path, history_db or {}, **group_limits)
+    results = renderer.Renderer(sinks).render(proxies)
+    if results.get('clash', 0) is None:
+        logger.error(f"写入 {output_path} 失败。")
+        sys.exit(1)
     logger.info("合并完成")
+    return results
 
-def save_v2ray_sub(proxies: list, output_path: Path):
-    """生成并保存 V2RayN 格式的订阅文件 (Base64)"""
-    logger.info("正在生成 V2RayN 订阅文件...")
-    try:
-        content = link_parser.generate_v2ray_sub(proxies)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        logger.info(f"V2RayN 订阅已保存至: {output_path}")
-    except Exception as e:
-        logger.error(f"生成 V2RayN 订阅失败: {e}")
 
 def main(args):
-    """主执行函数"""
+    """主执行函数。指定 --profile 时，无论是否提前退出都在输出目录写出分阶段性能报告"""
+    profiler = stage_profiler.StageProfiler(memory=args.profile)
+    try:
+        run_stages(args, profiler)
+    finally:
+        if args.profile:
+            profiler.write(Path(args.output).resolve().with_suffix('.profile.json'))
+        profiler.close()
+
+
+def run_stages(args, profiler: stage_profiler.StageProfiler):
+    """按顺序执行合并流程的各个阶段，每个阶段的耗时与条目数记录在 profiler 中"""
     if args.dev:
         root_logger = logging.getLogger()
         root_logger.setLevel(logging.DEBUG)
@@ -305,22 +391,27 @@ def main(args):
     output_path = Path(args.output).resolve()
 
     # --- 加载数据 ---
-    template_data = load_yaml_file(template_path)
-    all_proxies, sources_data, has_updates = source_manager.load_and_update_sources(sources_path)
-    
-    # --- [新增] 强制加载 extra_subs.txt ---
-    # 即使 source_manager 未能正确解析非 YAML 格式，这里也会作为补充加载
-    extra_subs_path = sources_path.parent / "extra_subs.txt"
-    if extra_subs_path.is_file():
-        logger.info(f"正在解析本地订阅文件: {extra_subs_path}")
-        try:
-            content = extra_subs_path.read_text(encoding='utf-8')
-            extra_nodes = link_parser.parse_content(content)
-            if extra_nodes:
-                logger.info(f"成功解析出 {len(extra_nodes)} 个节点，加入合并队列。")
-                all_proxies.extend([FlowStyleDict(n) for n in extra_nodes])
-        except Exception as e:
-            logger.warning(f"解析 extra_subs.txt 失败: {e}")
+    # 模板在渲染时按预编译的文本段拼接输出 (见 core/template.py)，这里只检查文件存在
+    if not template_path.is_file():
+        logger.error(f"模板文件未找到: {template_path}")
+        sys.exit(1)
+    with profiler.stage('fetch') as stage:
+        all_proxies, sources_data, has_updates = source_manager.load_and_update_sources(sources_path)
+
+        # --- [新增] 强制加载 extra_subs.txt ---
+        # 即使 source_manager 未能正确解析非 YAML 格式，这里也会作为补充加载
+        extra_subs_path = sources_path.parent / "extra_subs.txt"
+        if extra_subs_path.is_file():
+            logger.info(f"正在解析本地订阅文件: {extra_subs_path}")
+            try:
+                content = extra_subs_path.read_text(encoding='utf-8')
+                extra_nodes = link_parser.parse_content(content)
+                if extra_nodes:
+                    logger.info(f"成功解析出 {len(extra_nodes)} 个节点，加入合并队列。")
+                    all_proxies.extend([FlowStyleDict(n) for n in extra_nodes])
+            except Exception as e:
+                logger.warning(f"解析 extra_subs.txt 失败: {e}")
+        stage['items_out'] = len(all_proxies)
 
     if not has_updates and not args.force:
         logger.info("所有来源均无更新，程序退出。")
@@ -335,55 +426,70 @@ def main(args):
         logger.error(f"保存来源配置文件失败: {e}")
 
     # --- 清洗步骤 ---
-    all_proxies = filter_proxies(all_proxies, blocklist_path)
+    all_proxies = profiler.run('filter', filter_proxies, all_proxies, blocklist_path)
 
     # --- 合并与去重 ---
     logger.info("开始合并与去重")
-    unique_proxies = proxy_tools.deduplicate_proxies(all_proxies, debug=args.dev)
+    unique_proxies = profiler.run('dedup', proxy_tools.deduplicate_proxies, all_proxies, debug=args.dev)
     logger.info(f"合并去重后，总计 {len(unique_proxies)} 个独立代理。")
 
     # --- 排序 ---
     logger.info("开始对代理列表按名称排序")
-    # 使用 proxy.get('name', '') 确保即使缺少name键也不会出错
-    unique_proxies.sort(key=lambda p: p.get('name', ''))
+    with profiler.stage('sort', len(unique_proxies)) as stage:
+        # 使用 proxy.get('name', '') 确保即使缺少name键也不会出错
+        unique_proxies.sort(key=lambda p: p.get('name', ''))
+        stage['items_out'] = len(unique_proxies)
     logger.info("排序完成。")
 
     # --- 检查与旧文件是否有变化 ---
     if not args.force:
-        if not check_content_changes(unique_proxies, output_path, config.MANUAL_NODES_FILE):
+        with profiler.stage('diff', len(unique_proxies)) as stage:
+            changed = check_content_changes(unique_proxies, output_path, config.MANUAL_NODES_FILE)
+            stage['items_out'] = len(unique_proxies) if changed else 0
+        if not changed:
             logger.info("检测到自动抓取节点无变化，操作提前结束。")
             sys.exit(0)
 
     # --- 更新节点服务器统计 ---
     logger.info("开始更新节点服务器统计")
-    # 提取所有有效节点的 server 字段
-    server_ips = [p.get('server') for p in unique_proxies if p.get('server')]
-    stats = csvtool.read_stats(config.NODE_STATS_FILE)
-    if not args.nostats:
-        csvtool.update_stats(stats, server_ips)
-        csvtool.write_stats(config.NODE_STATS_FILE, stats)
-        logger.info("节点服务器统计更新完成。")
-    else:
-        logger.info("节点服务器统计跳过。")
+    with profiler.stage('stats', len(unique_proxies)) as stage:
+        # 提取所有有效节点的 server 字段
+        server_ips = [p.get('server') for p in unique_proxies if p.get('server')]
+        stats = csvtool.read_stats(config.NODE_STATS_FILE)
+        if not args.nostats:
+            csvtool.update_stats(stats, server_ips)
+            csvtool.write_stats(config.NODE_STATS_FILE, stats)
+            logger.info("节点服务器统计更新完成。")
+        else:
+            logger.info("节点服务器统计跳过。")
+        stage['items_out'] = len(stats)
 
     # --- 添加手动配置节点 ---
-    unique_proxies = merge_manual_nodes(unique_proxies, config.MANUAL_NODES_FILE)
+    unique_proxies = profiler.run('manual', merge_manual_nodes, unique_proxies, config.MANUAL_NODES_FILE)
 
     # --- 根据 IP 归属地重命名 ---
-    unique_proxies = rename_proxies_by_country(unique_proxies, config.GEOIP_CITY_DB_FILE, debug=args.dev)
+    unique_proxies = profiler.run('geoip', rename_proxies_by_country, unique_proxies, config.GEOIP_CITY_DB_FILE,
+                                  debug=args.dev)
     
     # --- 统一根据统计数据更新所有节点名称 ---
     logger.info("根据统计数据更新所有节点名称")
-    unique_proxies = proxy_tools.apply_node_statistics(unique_proxies, stats)
+    unique_proxies = profiler.run('naming', proxy_tools.apply_node_statistics, unique_proxies, stats)
 
-    # --- 根据国家和统计次数排序 ---
-    unique_proxies = sort_proxies_by_country_and_count(unique_proxies)
+    # --- 根据国家、统计次数和连通性延迟排序 ---
+    with profiler.stage('history') as stage:
+        history_db = history.load_history(config.NODE_CONNECTIVE_FILE)
+        stage['items_out'] = len(history_db)
+    unique_proxies = profiler.run('final_sort', sort_proxies_by_country_and_count, unique_proxies, history_db)
 
-    # --- 保存配置文件 ---
-    save_configs(unique_proxies, template_data, output_path)
-    
-    # --- [新增] 保存 V2RayN 订阅 ---
-    save_v2ray_sub(unique_proxies, output_path.parent / "v2ray_sub.txt")
+    # --- 一次渲染全部输出文件 (merge.yml、mobile.yml、v2ray_sub.txt、v2rayn.txt、conn.yml、增量文件) ---
+    with profiler.stage('save', len(unique_proxies)) as stage:
+        results = save_configs(unique_proxies, template_path, output_path, args.targets, history_db,
+                               group_top_k=args.group_top_k, group_global_k=args.group_global_k,
+                               mobile_top_k=args.mobile_top_k, mobile_max_nodes=args.mobile_max_nodes)
+        stage['items_out'] = (results.get('clash') or {}).get('count')
+        # 各输出目标 (包括 V2Ray 订阅导出) 的条目数与是否写出
+        stage['sinks'] = {name: result and {'count': result['count'], 'changed': result['changed']}
+                          for name, result in results.items()}
 
 
 if __name__ == '__main__':
@@ -406,6 +512,19 @@ if __name__ == '__main__':
                         help='强制执行，跳过更新检测和旧文件对比检查')
     parser.add_argument('--nostats', action='store_true',
                         help='跳过服务器计数更新')
+    parser.add_argument('--targets', type=parse_targets, default=set(DEFAULT_TARGETS),
+                        help=f"要生成的输出，逗号分隔，可选: {','.join(RENDER_TARGETS)} "
+                             f"(默认: {','.join(DEFAULT_TARGETS)})")
+    parser.add_argument('--group-top-k', type=int, default=GROUP_TOP_K,
+                        help=f'每个国家优选组的节点数上限，0 表示不生成国家组 (默认: {GROUP_TOP_K})')
+    parser.add_argument('--group-global-k', type=int, default=GROUP_GLOBAL_K,
+                        help=f'全局优选组的节点数上限，0 表示不生成 (默认: {GROUP_GLOBAL_K})')
+    parser.add_argument('--mobile-top-k', type=int, default=MOBILE_TOP_K,
+                        help=f'mobile.yml 每个国家保留的节点数 (默认: {MOBILE_TOP_K})')
+    parser.add_argument('--mobile-max-nodes', type=int, default=MOBILE_MAX_NODES,
+                        help=f'mobile.yml 的节点总数上限 (默认: {MOBILE_MAX_NODES})')
+    parser.add_argument('--profile', action='store_true',
+                        help='记录各阶段的耗时、条目数与峰值内存 (tracemalloc)，写入输出目录下的 merge.profile.json')
 
     parsed_args = parser.parse_args()
     main(parsed_args)
\ No newline at end of file
@@ -1,14 +1,27 @@
-import yaml
-import csv
 import requests
-import subprocess
-import time
 import os
-import signal
 import sys
+import time
 import concurrent.futures
 import argparse
-from urllib.parse import urlparse
+import threading
+import zlib
+
+from core.kernel import KernelManager
+from core.history import (
+    load_history, save_history, record_result, endpoint_key, group_by_endpoint, probe_name
+)
+from core.scheduler import plan_probes
+from core.adaptive import AIMDController, percentile
+from core.journal import ResultJournal, read_journal, apply_entries, entry_key
+from core.preflight import collect_endpoints, run_preflight, is_proxy_reachable
+from core.yaml_handler import dump_yaml_fast
+from core.proxy_tools import extract_country_code
+from core.merge_reader import load_config, load_config_from_text
+from core.conn_view import prune_groups
+from core.logger import setup_logger
+
+setup_logger(name=None)
 
 # ================= 配置区域 =================
 # 1. 文件路径
@@ -20,7 +33,12 @@ KERNEL_PATH = os.path.join(PROJECT_ROOT, "bin", "mihomo-darwin-amd64-v3-v1.19.19
 SOURCE_YAML = os.path.join(PROJECT_ROOT, "s/merge.yml")
 TEMP_CONFIG = os.path.join(PROJECT_ROOT, "s/node-connective-temp-config.yaml")
 CSV_DB_PATH = os.path.join(PROJECT_ROOT, "s/node-connective.csv")
+# 测试结果预写日志：结果逐条追加，全部完成并写入 CSV 后删除
+JOURNAL_PATH = os.path.join(PROJECT_ROOT, "s/node-connective.journal")
 CONFIG_DIR = os.path.join(PROJECT_ROOT, "config")
+# 常驻内核的状态文件与日志
+KERNEL_STATE_FILE = os.path.join(PROJECT_ROOT, "s/.node-connective-kernel.json")
+KERNEL_LOG_FILE = os.path.join(PROJECT_ROOT, "s/node-connective-kernel.log")
 
 # 2. 隔离环境端口 (确保不和 Clash Party 冲突)
 TEST_HTTP_PORT = 17890
@@ -30,19 +48,32 @@ TEST_SECRET = "test_secret_123"
 
 # 3. 测试参数
 TEST_URL = "http://www.gstatic.com/generate_204"
+# 并发数与单次超时为初始值，运行中由 AIMD 控制器根据延迟与失败率自适应调整
 TIMEOUT_MS = 2000
 CONCURRENCY = 32
+MIN_CONCURRENCY = 4
+MAX_CONCURRENCY = 256
+# 超时不低于初始值：超时的探测不进入延迟样本，允许缩短会让超时自我强化地收缩，把慢节点误判为失败
+MIN_TIMEOUT_MS = TIMEOUT_MS
+MAX_TIMEOUT_MS = 5000
+# 控制器未在 (探测超时 + 该余量) 内响应即视为测试机过载
+CLIENT_TIMEOUT_MARGIN = 1.0
+STALLED_ERROR = "控制器响应超时"
+
+# 4. 预检参数：进入内核前先用原始 TCP/TLS 连接剔除不可达端点
+PREFLIGHT_CONCURRENCY = 2000
+PREFLIGHT_TIMEOUT = 3.0
 # ===========================================
 
-def generate_test_config(url=None):
-    """读取原始订阅，生成一个只用于测试的临时配置"""
+def load_source_config(url=None):
+    """读取原始订阅 (本地 merge.yml 或 URL)"""
     config = None
     if url:
         print(f"正在从 URL 下载配置: {url}")
         try:
             resp = requests.get(url, timeout=30)
             resp.raise_for_status()
-            config = yaml.safe_load(resp.text)
+            config = load_config_from_text(resp.text)
         except Exception as e:
             print(f"下载或解析 URL 失败: {e}")
             sys.exit(1)
@@ -51,13 +82,47 @@ def generate_test_config(url=None):
             print(f"错误: 找不到源文件 {SOURCE_YAML}")
             sys.exit(1)
 
-        with open(SOURCE_YAML, 'r', encoding='utf-8') as f:
-            try:
-                config = yaml.safe_load(f)
-            except Exception as e:
-                print(f"解析 YAML 失败: {e}")
-                sys.exit(1)
+        try:
+            config = load_config(SOURCE_YAML)
+        except Exception as e:
+            print(f"解析 YAML 失败: {e}")
+            sys.exit(1)
 
+    # 确保 proxies 存在
+    if not isinstance(config, dict) or 'proxies' not in config:
+        print("错误: 订阅文件中没有找到 'proxies' 列表")
+        sys.exit(1)
+    return config
+
+def build_minimal_config(proxies):
+    """
+    构建只用于延迟测试的精简配置。
+    只保留 proxies、一个 select 组和 MATCH,DIRECT 规则，不引用任何 GeoIP/GeoSite 数据库，
+    内核无需加载规则集即可启动。
+    """
+    names = [p['name'] for p in proxies if isinstance(p, dict) and 'name' in p]
+    return {
+        'mixed-port': TEST_HTTP_PORT,
+        'socks-port': TEST_SOCKS_PORT,
+        'allow-lan': False,
+        'mode': 'rule',
+        'log-level': 'warning',
+        'ipv6': False,
+        'external-controller': f"127.0.0.1:{TEST_CONTROLLER_PORT}",
+        'secret': TEST_SECRET,
+        # 关闭干扰项
+        'tun': {'enable': False},
+        'dns': {'enable': False},  # 节点域名交给系统解析，避免占用 DNS 端口
+        'geodata-mode': False,
+        'geo-auto-update': False,
+        'profile': {'store-selected': False, 'store-fake-ip': False},
+        'proxies': proxies,
+        'proxy-groups': [{'name': 'TEST', 'type': 'select', 'proxies': names or ['DIRECT']}],
+        'rules': ['MATCH,DIRECT'],
+    }
+
+def build_full_config(config):
+    """在完整订阅配置上覆盖测试所需设置 (保留模板规则，仅用于对比测量)"""
     # 强制覆盖关键设置，确保不影响宿主机
     config['port'] = TEST_HTTP_PORT
     config['socks-port'] = TEST_SOCKS_PORT
@@ -70,36 +135,115 @@ def generate_test_config(url=None):
     config['system-proxy'] = False # 绝对不要开启系统代理
     config['dns'] = {'enable': True, 'listen': '0.0.0.0:1053'} # 防止DNS端口冲突
     config['geo-auto-update'] = False # 禁止自动更新数据库，由用户手工下载
-    
-    # 确保 proxies 存在
-    if 'proxies' not in config:
-        print("错误: 订阅文件中没有找到 'proxies' 列表")
-        sys.exit(1)
+    return config
+
+def build_probe_set(proxies_list):
+    """
+    按端点 (server, port, type) 对节点分组，每组只挑一个代表节点交给内核。
+    代表节点以端点生成的唯一名称注册到内核，避免同名节点在内核中互相覆盖。
+
+    Returns:
+        ({内核中的代理名: 端点键}, [代表节点配置], {端点键: [别名节点]})
+    """
+    groups = group_by_endpoint(proxies_list)
+    probes = {}
+    representatives = []
+    for key, aliases in groups.items():
+        name = probe_name(key)
+        probes[name] = key
+        representative = dict(aliases[0])
+        representative['name'] = name
+        representatives.append(representative)
+    return probes, representatives, groups
+
+def rename_group_members(groups, renamed, removed):
+    """
+    完整配置中代表节点改用端点名称注册，代理组的成员随之改名 (同一端点的别名合并为一个)，
+    本次不测试的节点从组中删除，避免内核因引用不存在的节点而拒绝加载配置。
+    """
+    result = []
+    for group in groups or []:
+        members = group.get('proxies') if isinstance(group, dict) else None
+        if members:
+            members = list(dict.fromkeys(renamed.get(str(m), m) for m in members))
+            group = {**group, 'proxies': members}
+        result.append(group)
+    return prune_groups(result, removed)
+
+def generate_test_config(config, proxies, full=False, aliases=None):
+    """
+    根据待测节点生成一个只用于测试的临时配置。
+    full 时 aliases 为 build_probe_set 返回的 {端点键: [别名节点]}，用于改写代理组成员。
+    """
+    if full:
+        renamed = {}
+        for representative, members in zip(proxies, (aliases or {}).values()):
+            for alias in members:
+                renamed.setdefault(str(alias.get('name')), representative['name'])
+        original = {str(p['name']) for p in config.get('proxies') or [] if isinstance(p, dict) and 'name' in p}
+        config['proxies'] = proxies
+        config['proxy-groups'] = rename_group_members(config.get('proxy-groups'), renamed, original - set(renamed))
+        test_config = build_full_config(config)
+    else:
+        test_config = build_minimal_config(proxies)
 
     # 写入临时文件
     with open(TEMP_CONFIG, 'w', encoding='utf-8') as f:
-        yaml.dump(config, f, allow_unicode=True)
-    
-    return config['proxies']
-
-def start_kernel():
-    """启动 Mihomo 内核子进程"""
-    # 检查数据库文件是否存在 (因为已设置为不自动下载)
-    for db_file in ["Country.mmdb", "GeoSite.dat"]:
-        db_path = os.path.join(CONFIG_DIR, db_file)
-        if not os.path.exists(db_path):
-            print(f"警告: 未在 {CONFIG_DIR} 找到 {db_file}，内核启动可能会失败。")
-
-    print(f"正在启动测试内核 (端口: {TEST_CONTROLLER_PORT})...")
-    # -d 指定工作目录(用于存放/读取 GeoIP/GeoSite 数据库)，-f 指定配置文件
-    cmd = [KERNEL_PATH, "-d", CONFIG_DIR, "-f", TEMP_CONFIG]
-    
+        dump_yaml_fast(test_config, f)
+
+def create_kernel(host='127.0.0.1', port=TEST_CONTROLLER_PORT):
+    """创建测试内核管理器"""
+    return KernelManager(
+        kernel_path=KERNEL_PATH,
+        work_dir=CONFIG_DIR,
+        controller_port=port,
+        secret=TEST_SECRET,
+        state_file=KERNEL_STATE_FILE,
+        log_file=KERNEL_LOG_FILE,
+        host=host,
+    )
+
+def parse_controller(value):
+    """解析 HOST:PORT 形式的控制器地址"""
+    host, sep, port = value.rpartition(':')
+    if not sep or not port.isdigit():
+        raise argparse.ArgumentTypeError("控制器地址格式应为 HOST:PORT，例如 127.0.0.1:19090")
+    return host or '127.0.0.1', int(port)
+
+def start_kernel(kernel, daemon=False, full=False, external=False):
+    """
+    准备好可用的测试内核。
+    优先复用常驻内核并通过 PUT /configs 热重载代理集合，否则启动新内核。
+    external 为 True 时只连接已有的控制器 (例如 fake_mihomo.py)，不启动内核。
+    """
+    if external:
+        if not kernel.is_api_ready():
+            print(f"错误: 无法连接控制器 {kernel.base_url}")
+            return False
+        with open(TEMP_CONFIG, 'r', encoding='utf-8') as f:
+            return kernel.reload(f.read())
+
+    if kernel.attach():
+        with open(TEMP_CONFIG, 'r', encoding='utf-8') as f:
+            if kernel.reload(f.read()):
+                return True
+        print("常驻内核热重载失败，将重新启动内核。")
+        kernel.stop()
+
+    # 完整配置依赖规则数据库，检查数据库文件是否存在 (因为已设置为不自动下载)
+    if full:
+        for db_file in ["Country.mmdb", "GeoSite.dat"]:
+            db_path = os.path.join(CONFIG_DIR, db_file)
+            if not os.path.exists(db_path):
+                print(f"警告: 未在 {CONFIG_DIR} 找到 {db_file}，内核启动可能会失败。")
+
     try:
-        # 使用 subprocess.Popen 启动，不阻塞主线程
-        # stdout/stderr 可以重定向到 DEVNULL 以保持控制台整洁，或者保留用于调试
-        # 为了调试启动失败的问题，这里暂时移除 stdout/stderr 的屏蔽，让日志直接输出到终端
-        process = subprocess.Popen(cmd)
-        return process
+        if not kernel.start(TEMP_CONFIG, detach=daemon):
+            return False
+        rss_kb = kernel.memory_rss_kb()
+        memory = f"{rss_kb / 1024:.1f} MB" if rss_kb else "未知"
+        print(f"内核启动耗时: {kernel.startup_seconds:.3f}s，内存占用: {memory} ({'完整' if full else '精简'}配置)")
+        return True
     except FileNotFoundError:
         print(f"错误: 找不到内核文件 {KERNEL_PATH}")
         sys.exit(1)
@@ -107,68 +251,24 @@ def start_kernel():
         print(f"错误: 权限不足，请执行: chmod +x {KERNEL_PATH}")
         sys.exit(1)
 
-def wait_for_api(process):
-    """轮询等待 API 启动成功"""
-    url = f"http://127.0.0.1:{TEST_CONTROLLER_PORT}/version"
-    headers = {"Authorization": f"Bearer {TEST_SECRET}"}
-    
-    for i in range(20): # 最多等待 10 秒
-        if process.poll() is not None:
-            print(f"错误: 内核进程已意外退出，退出码: {process.returncode}")
-            print("请检查上方输出的日志以确定原因 (通常是缺少 GeoIP 文件或配置错误)。")
-            return False
-        try:
-            resp = requests.get(url, headers=headers, timeout=1)
-            if resp.status_code == 200:
-                print("内核启动成功！API 已就绪。")
-                return True
-        except:
-            pass
-        time.sleep(0.5)
-    
-    print("错误: 内核启动超时，请检查配置或内核文件。")
-    return False
-
-def load_csv_db(path):
-    """读取 CSV 数据库"""
-    db = {}
-    if not os.path.exists(path):
-        return db
-    with open(path, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            key = (row['ip'], row['port'], row['protocol'])
-            try:
-                db[key] = {'pass': int(row['pass']), 'notpass': int(row['notpass'])}
-            except: continue
-    return db
-
-def save_csv_db(path, db):
-    """保存 CSV 数据库"""
-    headers = ['ip', 'port', 'protocol', 'pass', 'notpass', 'success_rate']
-    rows = []
-    for (ip, port, protocol), stats in db.items():
-        total = stats['pass'] + stats['notpass']
-        rate = f"{(stats['pass'] / total * 100):.1f}" if total > 0 else "0.0"
-        rows.append({
-            'ip': ip, 'port': port, 'protocol': protocol,
-            'pass': stats['pass'], 'notpass': stats['notpass'], 'success_rate': rate
-        })
-    
-    rows.sort(key=lambda x: float(x['success_rate']), reverse=True)
-    
-    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
-        writer = csv.DictWriter(f, fieldnames=headers)
-        writer.writeheader()
-        writer.writerows(rows)
+_thread_local = threading.local()
+
+def _get_session():
+    """每个工作线程复用一个 Session，保持与控制器的长连接"""
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = _thread_local.session = requests.Session()
+    return session
 
-def test_single_node(proxy_name):
+def test_single_node(proxy_name, timeout_ms=TIMEOUT_MS, controller_url=None):
     """测试单个节点"""
-    safe_name = requests.utils.quote(proxy_name)
-    url = f"http://127.0.0.1:{TEST_CONTROLLER_PORT}/proxies/{safe_name}/delay"
+    safe_name = requests.utils.quote(proxy_name, safe='')
+    base_url = controller_url or f"http://127.0.0.1:{TEST_CONTROLLER_PORT}"
+    url = f"{base_url}/proxies/{safe_name}/delay"
     headers = {"Authorization": f"Bearer {TEST_SECRET}"}
     try:
-        resp = requests.get(url, params={"timeout": TIMEOUT_MS, "url": TEST_URL}, headers=headers, timeout=3)
+        resp = _get_session().get(url, params={"timeout": timeout_ms, "url": TEST_URL}, headers=headers,
+                                  timeout=timeout_ms / 1000 + CLIENT_TIMEOUT_MARGIN)
         if resp.status_code == 200:
             try:
                 delay = resp.json().get('delay', -1)
@@ -177,24 +277,119 @@ def test_single_node(proxy_name):
             return True, delay, None
         else:
             return False, -1, f"HTTP {resp.status_code}"
+    except requests.Timeout:
+        return False, -1, STALLED_ERROR
     except Exception as e:
         return False, -1, str(e)
 
-def run_tests(proxies_list):
-    """执行并发测试逻辑"""
-    db = load_csv_db(CSV_DB_PATH)
-    
-    # 建立 name -> (ip, port, protocol) 映射
-    name_map = {}
+def probe_node(controller, proxy_name, controller_url=None):
+    """在自适应控制器的并发名额内测试单个节点，并回报结果"""
+    controller.acquire()
+    is_success, delay, error = False, -1, None
+    try:
+        is_success, delay, error = test_single_node(proxy_name, controller.timeout_ms, controller_url)
+        return is_success, delay, error
+    finally:
+        controller.release(is_success, delay if is_success else None, stalled=(error == STALLED_ERROR))
+
+def in_shard(key, shard):
+    """按端点名称的 CRC32 把端点稳定地分配到 N 个分片之一"""
+    if not shard:
+        return True
+    index, total = shard
+    return zlib.crc32(probe_name(key).encode('utf-8')) % total == index
+
+def schedule_proxies(proxies_list, db, budget=None, probe_all=False, done_keys=None, shard=None):
+    """
+    根据历史记录挑选本次需要测试的节点。
+    新节点优先，其次是通过率最不确定的节点，稳定节点按逐步拉长的间隔复测。
+    done_keys 中的端点 (本会话已测过) 与不属于当前分片的端点会被跳过。
+    """
+    done_keys = done_keys or set()
+    candidates = [
+        p for p in proxies_list
+        if isinstance(p, dict) and 'server' in p and 'port' in p and 'name' in p
+        and endpoint_key(p) not in done_keys and in_shard(endpoint_key(p), shard)
+    ]
+    if done_keys:
+        print(f"续测模式: 跳过本会话已测试的 {len(done_keys)} 个端点。")
+    if probe_all:
+        keys = list(dict.fromkeys(endpoint_key(p) for p in candidates))
+        planned = keys[:budget] if budget is not None else keys
+        print(f"全量测试模式: 计划测试 {len(planned)} 个端点。")
+    else:
+        planned, summary = plan_probes((endpoint_key(p) for p in candidates), db, budget=budget)
+        print(f"调度结果: 新节点 {summary['new']}，到期节点 {summary['due']}，"
+              f"未到期跳过 {summary['skipped']}，超出预算延后 {summary['deferred']}，"
+              f"本次计划测试 {summary['planned']} 个端点。")
+
+    planned_set = set(planned)
+    return [p for p in candidates if endpoint_key(p) in planned_set]
+
+def preflight_proxies(proxies_list, db, journal):
+    """
+    对待测节点做 TCP/TLS 预检，只把可达端点交给内核测试。
+    不可达端点直接记为一次失败；基于 UDP 的协议无法预检，原样放行。
+    """
+    endpoints, udp_skipped = collect_endpoints(proxies_list)
+    results = run_preflight(endpoints, concurrency=PREFLIGHT_CONCURRENCY, timeout=PREFLIGHT_TIMEOUT)
+
+    unreachable = {key for key, r in results.items() if not r['reachable']}
+    connect = sorted(r['connect_ms'] for r in results.values() if r['connect_ms'] is not None)
+    handshake = sorted(r['handshake_ms'] for r in results.values() if r['handshake_ms'] is not None)
+    print(f"预检完成: 端点 {len(results)}，可达 {len(results) - len(unreachable)}，不可达 {len(unreachable)}，"
+          f"UDP 协议跳过 {udp_skipped}")
+    if connect:
+        print(f"  TCP 连接延迟中位数: {percentile(connect, 0.5):.0f}ms")
+    if handshake:
+        print(f"  TLS 握手延迟中位数: {percentile(handshake, 0.5):.0f}ms")
+
+    now = int(time.time())
+    passed = []
+    failed_keys = set()
     for p in proxies_list:
-        if 'server' in p and 'port' in p and 'name' in p:
-            name_map[p['name']] = (p['server'], str(p['port']), p.get('type', 'unknown'))
+        if not is_proxy_reachable(p, results.get((str(p.get('server')), str(p.get('port'))))):
+            key = endpoint_key(p)
+            if key not in failed_keys:
+                failed_keys.add(key)
+                country = extract_country_code(p.get('name'))
+                journal.record(key, False, now, country=country)
+                record_result(db, key, False, now, country=country)
+        else:
+            passed.append(p)
+    if failed_keys:
+        print(f"已将 {len(failed_keys)} 个不可达端点记为失败。")
+    return passed
+
+def endpoint_country(aliases):
+    """取端点下第一个能从名称中识别出国家代码的别名节点的国家代码"""
+    for proxy in aliases:
+        code = extract_country_code(proxy.get('name'))
+        if code:
+            return code
+    return ''
+
+def run_tests(probes, groups, db, journal, controller_url=None, verbose=True):
+    """
+    执行并发测试逻辑。
+    每个端点只测试一次，结果分发给该端点下的所有别名节点。
+    每条结果完成后立即写入预写日志，中途中断也不会丢失已完成的结果。
 
-    print(f"开始测试 {len(name_map)} 个节点...")
+    Returns:
+        AIMD 控制器的运行摘要。
+    """
+    alias_count = sum(len(groups[key]) for key in probes.values())
+    print(f"开始测试 {len(probes)} 个端点 (覆盖 {alias_count} 个节点)...")
     
-    results = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
-        future_to_info = {executor.submit(test_single_node, name): (name, key) for name, key in name_map.items()}
+    controller = AIMDController(
+        initial_limit=CONCURRENCY, min_limit=MIN_CONCURRENCY, max_limit=MAX_CONCURRENCY,
+        initial_timeout_ms=TIMEOUT_MS, min_timeout_ms=MIN_TIMEOUT_MS, max_timeout_ms=MAX_TIMEOUT_MS,
+    )
+    completed = 0
+    # 线程池按并发上限的最大值创建，实际在途数量由控制器限制
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+    try:
+        future_to_info = {executor.submit(probe_node, controller, name, controller_url): (name, key) for name, key in probes.items()}
         
         for future in concurrent.futures.as_completed(future_to_info):
             name, key = future_to_info[future]
@@ -203,34 +398,113 @@ def run_tests(proxies_list):
             except Exception as e:
                 is_success, delay, error = False, -1, str(e)
             
-            if is_success:
-                print(f"[PASS] {name} | Delay: {delay}ms")
-            else:
-                print(f"[FAIL] {name} | Error: {error}")
+            if verbose:
+                aliases = ", ".join(str(p.get('name')) for p in groups[key])
+                if is_success:
+                    print(f"[PASS] {aliases} | Delay: {delay}ms")
+                else:
+                    print(f"[FAIL] {aliases} | Error: {error}")
             
-            results.append((key, is_success))
+            now = int(time.time())
+            delay = delay if is_success and delay and delay > 0 else None
+            country = endpoint_country(groups[key])
+            journal.record(key, is_success, now, delay=delay, country=country)
+            record_result(db, key, is_success, now, delay, country)
+            completed += 1
+    finally:
+        # 中断时取消尚未开始的探测，已完成的结果都已在日志中
+        executor.shutdown(wait=True, cancel_futures=True)
 
-    # 更新数据库
-    update_cnt = 0
-    for key, is_success in results:
-        if key not in db:
-            db[key] = {'pass': 0, 'notpass': 0}
-        
-        if is_success:
-            db[key]['pass'] += 1
+    print(f"测试完成，共记录 {completed} 条结果。")
+    summary = controller.summary()
+    print_run_summary(summary)
+    return summary
+
+def commit_results(db, journal):
+    """把本会话的结果写入 CSV 历史记录并删除预写日志"""
+    save_history(CSV_DB_PATH, db)
+    journal.discard()
+    print(f"已将测试结果写入 {CSV_DB_PATH}")
+
+def open_journal(db, path, resume=False, commit=True):
+    """
+    打开预写日志。
+    上次运行遗留的日志总会先合并进内存中的历史记录：
+    --resume 时继续沿用原会话并跳过其中已测试的端点；否则先落盘再开启新会话。
+    commit=False (--no-commit) 时不写 CSV，遗留结果留在原日志中，本会话继续追加，
+    之后由 --apply-journal 一并合并。
+
+    Returns:
+        (ResultJournal, 本会话已测试的端点集合)
+    """
+    journal = ResultJournal(path)
+    session, entries = read_journal(path)
+    if session is None and not entries:
+        journal.start()
+        return journal, set()
+
+    apply_entries(db, entries)
+    if resume:
+        print(f"继续会话 {session}: 已恢复 {len(entries)} 条结果。")
+        journal.start(session)
+        return journal, {entry_key(e) for e in entries}
+
+    print(f"发现上次未完成的测试日志，已恢复 {len(entries)} 条结果。")
+    if not commit:
+        journal.start(session)
+        return journal, set()
+    commit_results(db, journal)
+    journal.start()
+    return journal, set()
+
+def apply_journals(paths):
+    """把若干预写日志 (例如多个 CI 分片任务的产物) 合并进 CSV 历史记录"""
+    db = load_history(CSV_DB_PATH)
+    entries = []
+    for path in paths:
+        _, journal_entries = read_journal(path)
+        entries.extend(journal_entries)
+        print(f"已读取 {path}: {len(journal_entries)} 条结果")
+    # 各分片的结果交错发生，合并后统一按记录时间应用，连续成功/失败次数才正确
+    total = apply_entries(db, entries)
+    save_history(CSV_DB_PATH, db)
+    for path in paths:
+        ResultJournal(path).discard()
+    print(f"已合并 {total} 条结果至 {CSV_DB_PATH}")
+
+def parse_shard(value):
+    """解析 K/N 形式的分片参数"""
+    try:
+        index, total = (int(x) for x in value.split('/', 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError("分片格式应为 K/N，例如 0/4")
+    if total <= 0 or not 0 <= index < total:
+        raise argparse.ArgumentTypeError("分片序号需满足 0 <= K < N")
+    return index, total
+
+def print_run_summary(summary):
+    """输出自适应控制器最终选用的参数"""
+    p50 = f"{summary['latency_p50']:.0f}ms" if summary['latency_p50'] is not None else "-"
+    p95 = f"{summary['latency_p95']:.0f}ms" if summary['latency_p95'] is not None else "-"
+    print("-" * 30)
+    print(f"探测总数: {summary['completed']}")
+    print(f"并发上限: 最终 {summary['concurrency']}，峰值 {summary['peak_concurrency']} "
+          f"(加性增 {summary['increases']} 次，乘性减 {summary['decreases']} 次)")
+    print(f"单次超时: {summary['timeout_ms']}ms")
+    print(f"成功延迟: p50 {p50}，p95 {p95}")
+
+def cleanup(kernel, keep_alive=False, external=False):
+    """
+    清理工作：关闭本进程启动的内核，删除临时文件。
+    常驻模式启动的内核、复用的常驻内核 (只能由 --stop 关闭) 与外部控制器保留。
+    """
+    if kernel and not external:
+        if kernel.attached:
+            print(f"保留复用的常驻测试内核 (PID: {kernel.pid})，使用 --stop 关闭。")
+        elif keep_alive and kernel.pid and kernel.is_api_ready():
+            print(f"常驻模式：保留测试内核 (PID: {kernel.pid})，下次测试将直接热重载配置。")
         else:
-            db[key]['notpass'] += 1
-        update_cnt += 1
-        
-    save_csv_db(CSV_DB_PATH, db)
-    print(f"测试完成，已更新 {update_cnt} 条记录至 {CSV_DB_PATH}")
-
-def cleanup(process):
-    """清理工作：杀掉内核进程，删除临时文件"""
-    if process:
-        print("正在关闭测试内核...")
-        process.terminate()
-        process.wait()
+            kernel.stop()
     
     if os.path.exists(TEMP_CONFIG):
         try:
@@ -241,28 +515,77 @@ def cleanup(process):
 def main():
     parser = argparse.ArgumentParser(description="测试节点连通性")
     parser.add_argument('--url', type=str, help='从指定 URL 下载配置文件进行测试')
+    parser.add_argument('--daemon', action='store_true', help='常驻模式：测试结束后保留内核，后续测试通过热重载复用')
+    parser.add_argument('--stop', action='store_true', help='关闭常驻测试内核后退出')
+    parser.add_argument('--full-config', action='store_true', help='使用完整订阅配置 (含模板规则) 启动内核，用于对比启动耗时与内存')
+    parser.add_argument('--budget', type=int, help='本次最多测试的端点数，未测到的节点留到后续运行')
+    parser.add_argument('--all', action='store_true', help='忽略调度策略，测试全部节点')
+    parser.add_argument('--no-preflight', action='store_true', help='跳过 TCP/TLS 预检，全部节点交给内核测试')
+    parser.add_argument('--resume', action='store_true', help='继续上次中断的会话，跳过已测试的端点')
+    parser.add_argument('--journal', type=str, default=JOURNAL_PATH, help='预写日志路径 (默认: s/node-connective.journal)')
+    parser.add_argument('--shard', type=parse_shard, help='只测试第 K 个分片 (共 N 片)，格式 K/N，用于拆分到多个 CI 任务')
+    parser.add_argument('--no-commit', action='store_true', help='结果只保留在预写日志中，不写入 CSV (配合 --shard 使用)')
+    parser.add_argument('--apply-journal', nargs='+', metavar='PATH', help='把指定的预写日志合并进 CSV 后退出')
+    parser.add_argument('--controller', type=parse_controller, metavar='HOST:PORT',
+                        help='连接已运行的控制器 (例如 fake_mihomo.py)，不启动本地内核')
+    parser.add_argument('--quiet', action='store_true', help='不逐个输出节点测试结果')
     args = parser.parse_args()
 
-    process = None
+    if args.apply_journal:
+        apply_journals(args.apply_journal)
+        return
+
+    external = args.controller is not None
+    kernel = create_kernel(*args.controller) if external else create_kernel()
+    if args.stop:
+        if kernel.attach():
+            kernel.stop()
+        else:
+            print("没有正在运行的常驻测试内核。")
+        return
+
+    journal = None
+    db = None
+    finished = False
     try:
-        # 1. 生成配置
-        proxies_list = generate_test_config(args.url)
-        
-        # 2. 启动内核
-        process = start_kernel()
+        # 1. 读取订阅并根据历史记录挑选本次测试的节点
+        config = load_source_config(args.url)
+        db = load_history(CSV_DB_PATH)
+        journal, done_keys = open_journal(db, args.journal, resume=args.resume,
+                                          commit=not args.no_commit)
+        proxies_list = schedule_proxies(config['proxies'] or [], db, budget=args.budget, probe_all=args.all,
+                                        done_keys=done_keys, shard=args.shard)
+        if not args.no_preflight:
+            proxies_list = preflight_proxies(proxies_list, db, journal)
+        if not proxies_list:
+            print("本次没有需要测试的节点。")
+            finished = True
+            return
+
+        # 2. 按端点去重并生成配置
+        probes, representatives, groups = build_probe_set(proxies_list)
+        generate_test_config(config, representatives, full=args.full_config, aliases=groups)
         
-        # 3. 等待 API 就绪
-        if wait_for_api(process):
+        # 3. 启动或复用内核，等待 API 就绪
+        if start_kernel(kernel, daemon=args.daemon, full=args.full_config, external=external):
             # 4. 运行测试
-            run_tests(proxies_list)
+            run_tests(probes, groups, db, journal, controller_url=kernel.base_url, verbose=not args.quiet)
+            finished = True
         
     except KeyboardInterrupt:
         print("\n用户中断操作")
     except Exception as e:
         print(f"\n发生未知错误: {e}")
     finally:
-        # 5. 无论如何都要清理现场
-        cleanup(process)
+        # 5. 测试完成后提交结果；中断时结果保留在预写日志中，可用 --resume 继续
+        if journal:
+            if finished and not args.no_commit:
+                commit_results(db, journal)
+            else:
+                journal.close()
+                print(f"测试结果保留在预写日志中: {args.journal}")
+        # 6. 无论如何都要清理现场
+        cleanup(kernel, keep_alive=args.daemon, external=external)
 
 if __name__ == "__main__":
     main()
@@ -1,78 +1,197 @@
-import yaml
+import argparse
+import heapq
+import json
 import re
-import os
 import sys
+import time
+
+import yaml
+
 import config
+from core import csvtool
+from core.history import endpoint_key, load_history
+from core.latency import summarize
+from core.merge_reader import iter_proxies
+from core.proxy_tools import extract_country_code
+from core.scoring import score_rows
+
+SORT_CHOICES = ('appearances', 'pass-rate', 'latency')
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
 
-def extract_leading_number(name):
+
+def parse_duration(value):
     """
-    从字符串开头提取数字。
-    例如: "101 香港节点" -> 101
-    如果没有数字，返回 -1 以便排在最后。
+    解析时长参数，返回秒数。
+    例如: "90" -> 90, "30m" -> 1800, "12h" -> 43200, "7d" -> 604800
     """
-    if not isinstance(name, str):
-        return -1
-    
-    match = re.match(r'^(\d+)', name.strip())
-    if match:
-        return int(match.group(1))
-    return -1
-
-
-#需要/2   源2小时更新  
-# 7天=168/2=84
-# 15天=360/2=180
-# 30天=720/2=360
-def main():
-    # 1. 确定 merge.yml 的路径 (从 config.py 读取)
-    yaml_path = config.MERGE_OUTPUT_FILE
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([smhdw]?)', value.strip().lower())
+    if not match:
+        raise argparse.ArgumentTypeError("时长格式应为数字加单位 (s/m/h/d/w)，例如 7d")
+    return float(match.group(1)) * DURATION_UNITS.get(match.group(2) or 's')
 
-    if not yaml_path.exists():
-        print(f"错误: 找不到文件 {yaml_path}")
-        return
 
-    print(f"正在读取文件: {yaml_path} ...")
+def parse_list(value):
+    """解析逗号分隔的列表参数，例如 "US,JP" -> {'US', 'JP'}"""
+    return {item.strip() for item in value.split(',') if item.strip()}
+
 
-    # 2. 读取 YAML 文件
+def load_name_countries(path):
+    """
+    从合并后的配置 (merge.yml) 中按节点名称提取国家代码，返回 {端点键: 国家代码}。
+    历史记录的国家列只在测试时写入，较早的行为空，以此作为补充；文件不存在时返回空字典。
+    """
+    countries = {}
     try:
-        with open(yaml_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-    except Exception as e:
-        print(f"读取 YAML 失败: {e}")
-        return
+        for proxy in iter_proxies(path):
+            code = extract_country_code(proxy.get('name'))
+            if code:
+                countries.setdefault(endpoint_key(proxy), code)
+    except (OSError, yaml.YAMLError) as e:
+        print(f"警告: 无法从 {path} 读取节点名称: {e}", file=sys.stderr)
+    return countries
+
+
+def fill_countries(rows, countries):
+    """国家列为空的行按端点从 countries 中补全"""
+    for row in rows:
+        if not row['country']:
+            row['country'] = countries.get((row['ip'], row['port'], row['protocol']), '')
+    return rows
+
+
+def build_rows(stats, db):
+    """
+    以连通性历史记录为索引构建查询行 (每个端点一行)，
+    出现次数从服务器统计中按 IP 关联，评分一次性向量化计算。
+    """
+    keys = list(db)
+    scores = score_rows([db[k]['pass'] for k in keys], [db[k]['pass'] + db[k]['notpass'] for k in keys])
+    rows = []
+    for key, score in zip(keys, scores):
+        record = db[key]
+        total = record['pass'] + record['notpass']
+        rows.append({
+            'ip': key[0], 'port': key[1], 'protocol': key[2],
+            'country': record.get('country', ''),
+            'appearances': stats.get(key[0], 0),
+            'pass': record['pass'], 'total': total,
+            'rate': record['pass'] / total if total else None,
+            'score': score,
+            'last_tested': record.get('last_tested', 0),
+            'record': record,
+        })
+    return rows
 
-    # 3. 获取节点列表
-    # 通常 Clash 配置的节点在 'proxies' 键下，如果是纯列表则直接使用
-    proxies = []
-    if isinstance(data, dict) and 'proxies' in data:
-        proxies = data['proxies']
-    elif isinstance(data, list):
-        proxies = data
+
+def filter_rows(rows, countries=None, protocols=None, since=None, min_tests=0, now=None):
+    """按国家、协议、最近测试时间与最少测试次数过滤 (惰性)"""
+    now = now if now is not None else time.time()
+    for row in rows:
+        if countries and row['country'] not in countries:
+            continue
+        if protocols and row['protocol'] not in protocols:
+            continue
+        if since is not None and now - row['last_tested'] > since:
+            continue
+        if row['total'] < min_tests:
+            continue
+        yield row
+
+
+def top_rows(rows, sort_by, limit):
+    """
+    用堆取前 N 行，无需对全部数据排序。
+      appearances: 出现次数降序
+      pass-rate:   通过率 Wilson 置信下界降序 (样本少的节点不会因一次通过而排在前面)
+      latency:     成功延迟中位数升序，没有延迟数据的行不参与
+    """
+    if sort_by == 'appearances':
+        return heapq.nlargest(limit, rows, key=lambda r: (r['appearances'], r['score']))
+    if sort_by == 'pass-rate':
+        return heapq.nlargest(limit, rows, key=lambda r: (r['score'], r['appearances']))
+
+    with_latency = []
+    for row in rows:
+        row['p50'] = summarize(row['record'])['p50']
+        if row['p50'] is not None:
+            with_latency.append(row)
+    return heapq.nsmallest(limit, with_latency, key=lambda r: (r['p50'], -r['score']))
+
+
+def format_age(seconds):
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    if seconds < 86400:
+        return f"{seconds / 3600:.0f}h"
+    return f"{seconds / 86400:.0f}d"
+
+
+def print_table(rows, now):
+    print(f"{'#':>3}  {'端点':<42} {'国家':<4} {'出现':>5} {'通过/测试':>9} {'评分':>6} {'p50':>7} {'最近测试':>8}")
+    for index, row in enumerate(rows, 1):
+        endpoint = f"{row['protocol']}://{row['ip']}:{row['port']}"
+        p50 = row['p50'] if 'p50' in row else summarize(row['record'])['p50']
+        latency = f"{p50:.0f}ms" if p50 is not None else '-'
+        tested = f"{row['pass']}/{row['total']}"
+        age = format_age(now - row['last_tested']) if row['last_tested'] else '-'
+        print(f"{index:>3}  {endpoint:<42} {row['country'] or '-':<4} {row['appearances']:>5} "
+              f"{tested:>9} {row['score']:>6.3f} {latency:>7} {age:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询节点统计与连通性历史记录的前 N 名")
+    parser.add_argument('-n', '--limit', type=int, default=10, help='输出条数 (默认: 10)')
+    parser.add_argument('--by', choices=SORT_CHOICES, default='appearances',
+                        help='排序依据: appearances (出现次数)、pass-rate (通过率)、latency (延迟)，默认 appearances')
+    parser.add_argument('--country', type=parse_list,
+                        help='只看指定国家代码，逗号分隔，例如 US,JP。历史记录中没有国家代码的端点'
+                             '按 merge.yml 中的节点名称判断，两者都没有的端点不会被选中')
+    parser.add_argument('--protocol', type=parse_list, help='只看指定协议，逗号分隔，例如 vless,trojan')
+    parser.add_argument('--since', type=parse_duration, help='只看最近该时长内测试过的端点，例如 7d、12h')
+    parser.add_argument('--min-tests', type=int, default=0, help='至少测试过的次数')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    now = time.time()
+    stats = csvtool.read_stats(config.NODE_STATS_FILE)
+
+    # 只按出现次数排名且不需要连通性字段过滤时，直接查询服务器统计 (包含从未测试过的服务器)
+    history_needed = (args.by != 'appearances' or args.country or args.protocol
+                      or args.since is not None or args.min_tests > 0)
+    if history_needed:
+        db = load_history(config.NODE_CONNECTIVE_FILE)
+        if not db:
+            print(f"错误: 没有连通性历史记录 {config.NODE_CONNECTIVE_FILE}", file=sys.stderr)
+            sys.exit(1)
+        rows = build_rows(stats, db)
+        if args.country:
+            rows = fill_countries(rows, load_name_countries(config.MERGE_OUTPUT_FILE))
+        rows = filter_rows(rows, args.country, args.protocol, args.since, args.min_tests, now)
+        result = top_rows(rows, args.by, args.limit)
     else:
-        print("错误: 无法识别 YAML 结构，未找到节点列表。")
+        result = [{'ip': ip, 'port': '', 'protocol': '', 'appearances': count}
+                  for ip, count in heapq.nlargest(args.limit, stats.items(), key=lambda item: item[1])]
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if args.json:
+        for row in result:
+            record = row.pop('record', None)
+            if record is not None and 'p50' not in row:
+                row['p50'] = summarize(record)['p50']
+        print(json.dumps(result, ensure_ascii=False, indent=2))
         return
 
-    if not proxies:
-        print("未找到任何节点。")
+    if not result:
+        print("没有符合条件的记录。")
         return
+    print(f"--- 按 {args.by} 排序的前 {len(result)} 条 (耗时 {elapsed_ms:.1f}ms) ---")
+    if history_needed:
+        print_table(result, now)
+    else:
+        for index, row in enumerate(result, 1):
+            print(f"{index:>3}  {row['ip']:<50} {row['appearances']:>5}")
 
-    # 4. 排序逻辑
-    # 过滤掉没有 'name' 字段的节点，并按名称前的数字从大到小排序
-    # key 解释: 获取 name -> 提取数字 -> 用于排序
-    sorted_proxies = sorted(
-        [p for p in proxies if isinstance(p, dict) and 'name' in p],
-        key=lambda x: extract_leading_number(x['name']),
-        reverse=True
-    )
-
-    # 5. 提取前 10 个并打印
-    top_10 = sorted_proxies[:10]
-
-    print(f"\n--- 统计数字最大的前 {len(top_10)} 个节点 ---")
-    for proxy in top_10:
-        # 转换为单行 Flow Style 格式 ({ key: value })，并添加列表项前缀 "- "
-        line = yaml.dump(proxy, allow_unicode=True, default_flow_style=True, sort_keys=False, width=float("inf")).strip()
-        print(f"  - {line}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""脚本与 core 包都以 src 为根目录导入 (与 python src/xxx.py 的运行方式一致)"""
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / 'src'
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""AIMD 控制器的拥塞判断"""
+from core.adaptive import AIMDController
+
+
+def feed_window(controller, delay_ms):
+    for _ in range(controller.window):
+        controller.acquire()
+        controller.release(True, delay_ms)
+
+
+def test_one_fast_window_does_not_pin_concurrency():
+    controller = AIMDController(initial_limit=8, min_limit=2, max_limit=64, window=4)
+    for _ in range(3):
+        feed_window(controller, 200)
+    # 偶然一个很快的窗口，之后延迟恢复正常
+    feed_window(controller, 20)
+    for _ in range(10):
+        feed_window(controller, 200)
+
+    assert controller.decreases == 0
+    assert controller.concurrency == 8 + 14 * 2
+
+
+def test_sustained_latency_increase_reduces_concurrency():
+    controller = AIMDController(initial_limit=32, min_limit=2, max_limit=64, window=4)
+    for _ in range(3):
+        feed_window(controller, 200)
+    feed_window(controller, 800)
+
+    assert controller.decreases == 1
+    assert controller.concurrency == (32 + 3 * 2) // 2
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from core.conn_view import filter_by_history
+from core.history import endpoint_key, new_record
+
+
+def make_proxy(index: int) -> dict:
+    return {'name': f"node-{index}", 'type': 'ss', 'server': f"10.0.0.{index}", 'port': 443}
+
+
+def make_db(proxies: list, results: list) -> dict:
+    db = {}
+    for proxy, (passed, failed) in zip(proxies, results):
+        record = new_record()
+        record['pass'], record['notpass'] = passed, failed
+        db[endpoint_key(proxy)] = record
+    return db
+
+
+def test_few_samples_are_not_filtered_by_score():
+    # 1/1 与 2/2 通过的 Wilson 下界 (约 0.21 / 0.34) 低于或接近默认阈值 0.3，但样本太少不应剔除
+    proxies = [make_proxy(1), make_proxy(2), make_proxy(3)]
+    db = make_db(proxies, [(1, 0), (2, 0), (0, 1)])
+
+    result = filter_by_history(proxies, db, min_score=0.3)
+
+    assert [p['name'] for p in result['proxies']] == ['node-1', 'node-2', 'node-3']
+    assert result['scores'][0] < 0.3
+    assert not result['removed']
+
+
+def test_score_threshold_applies_with_enough_samples():
+    proxies = [make_proxy(1), make_proxy(2), make_proxy(3)]
+    db = make_db(proxies, [(0, 5), (5, 0), (1, 0)])
+
+    removed = []
+    result = filter_by_history(proxies, db, min_score=0.3,
+                               on_removed=lambda proxy, reason, detail: removed.append(proxy['name']))
+
+    assert [p['name'] for p in result['proxies']] == ['node-2', 'node-3']
+    assert removed == ['node-1']
+    assert result['removed']['评分过低'] == 1
+
+
+def test_min_samples_is_configurable():
+    proxies = [make_proxy(1)]
+    db = make_db(proxies, [(1, 0)])
+
+    assert filter_by_history(proxies, db, min_score=0.3, min_samples=1)['proxies'] == []
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""GitHubClient 的 ETag 缓存与速率限制状态持久化"""
+import json
+import time
+
+import requests
+
+from core.github_api import RATE_LIMIT_KEY, GitHubClient
+
+REPO = 'owner/repo'
+FILES = [{'name': 'clash20260101.yml', 'path': 'clash20260101.yml', 'type': 'file', 'sha': 'a', 'size': 10,
+          'download_url': 'https://example.invalid/clash20260101.yml'}]
+
+
+class StubNetwork:
+    def __init__(self, remaining, reset, countdown=False):
+        self.remaining, self.reset = remaining, reset
+        self.countdown = countdown
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        self.calls += 1
+        if self.countdown:
+            self.remaining -= 1
+        response = requests.Response()
+        if (headers or {}).get('If-None-Match') == '"v1"':
+            response.status_code = 304
+        else:
+            response.status_code = 200
+            response._content = json.dumps(FILES).encode()
+        response.headers.update({'ETag': '"v1"', 'X-RateLimit-Remaining': str(self.remaining),
+                                 'X-RateLimit-Reset': str(self.reset)})
+        return response
+
+
+def test_exhausted_rate_limit_defers_next_run(tmp_path):
+    cache_path = tmp_path / 'cache.json'
+    network = StubNetwork(remaining=0, reset=int(time.time()) + 3600)
+    client = GitHubClient(network_client=network, cache_path=cache_path)
+    assert client.find_latest_file(REPO, r'clash\d+\.yml')['sha'] == 'a'
+    client.save_cache()
+    assert json.loads(cache_path.read_text(encoding='utf-8'))[RATE_LIMIT_KEY]['remaining'] == 0
+
+    # 下次运行在第一次请求前就知道限额已耗尽，直接使用缓存
+    client = GitHubClient(network_client=network, cache_path=cache_path)
+    assert client.find_latest_file(REPO, r'clash\d+\.yml')['sha'] == 'a'
+    assert network.calls == 1 and client.stats['deferred'] == 1
+
+
+def test_rate_limit_not_persisted_while_available(tmp_path):
+    cache_path = tmp_path / 'cache.json'
+    network = StubNetwork(remaining=4000, reset=int(time.time()) + 3600)
+    client = GitHubClient(network_client=network, cache_path=cache_path)
+    client.list_files(REPO)
+    client.save_cache()
+    content = cache_path.read_text(encoding='utf-8')
+    assert RATE_LIMIT_KEY not in json.loads(content)
+
+    # 内容与限额状态都没有变化时不重写缓存文件
+    network.remaining = 3999
+    client = GitHubClient(network_client=network, cache_path=cache_path)
+    client.list_files(REPO)
+    cache_path.write_text('sentinel', encoding='utf-8')
+    client.save_cache()
+    assert cache_path.read_text(encoding='utf-8') == 'sentinel'
+
+
+def test_expired_rate_limit_is_ignored_and_cleared(tmp_path):
+    cache_path = tmp_path / 'cache.json'
+    cache_path.write_text(json.dumps({RATE_LIMIT_KEY: {'remaining': 0, 'reset': int(time.time()) - 10}}),
+                          encoding='utf-8')
+    client = GitHubClient(network_client=StubNetwork(remaining=0, reset=0), cache_path=cache_path)
+    assert client.rate_remaining is None
+    client.save_cache()
+    assert json.loads(cache_path.read_text(encoding='utf-8')) == {}
+
+
+def test_find_latest_files_across_repos_shares_cache(tmp_path):
+    cache_path = tmp_path / 'cache.json'
+    patterns = {'a/one': r'clash\d+\.yml', 'b/two': r'clash\d+\.yml', 'c/three': r'v2ray\d+\.txt'}
+    # 每次请求消耗一次限额，最后一个请求后耗尽
+    network = StubNetwork(remaining=len(patterns), reset=int(time.time()) + 3600, countdown=True)
+    client = GitHubClient(network_client=network, cache_path=cache_path)
+    found = client.find_latest_files(patterns)
+    client.save_cache()
+    assert {repo: info and info['sha'] for repo, info in found.items()} == {'a/one': 'a', 'b/two': 'a', 'c/three': None}
+    assert network.calls == 3
+    assert not cache_path.with_name(cache_path.name + '.tmp').exists()
+
+    # 下次运行全部仓库都从缓存返回，限额耗尽时不再发出请求
+    client = GitHubClient(network_client=network, cache_path=cache_path)
+    assert client.find_latest_files(patterns) == found
+    assert network.calls == 3 and client.stats['deferred'] == 3
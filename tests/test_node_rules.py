@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""来源清洗规则与解析前的行级判断"""
+import pytest
+import yaml
+
+from core import merge_reader
+from core.merge_reader import flow_scalar, iter_proxies_from_text
+from core.node_rules import CleaningPipeline
+
+SPECS = ['require-fields', 'drop-ss-cipher', {'rule': 'drop-type', 'types': ['http']}]
+
+SOURCE = """proxies:
+  - {name: ok, server: 1.1.1.1, port: 443, type: vmess, uuid: a}
+  - {name: http, server: 1.1.1.2, port: 80, type: http}
+  - {name: bad-ss, server: 1.1.1.3, port: 8388, type: ss, cipher: ss, password: x}
+  - {name: 'type: http', server: 1.1.1.4, port: 443, type: trojan, password: x}
+  - {name: nested, server: 1.1.1.5, port: 443, type: vless, ws-opts: {type: http}}
+  - {name: quoted, server: 1.1.1.6, port: 80, type: 'http'}
+  - {name: no-port, server: 1.1.1.7, type: vmess}
+"""
+
+
+@pytest.mark.parametrize('line', SOURCE.splitlines()[1:])
+def test_flow_scalar_agrees_with_yaml(line):
+    proxy = yaml.safe_load(line[4:])
+    for key in ('type', 'cipher', 'name'):
+        value = flow_scalar(line, key)
+        assert value is None or value == proxy.get(key)
+
+
+def test_flow_scalar_gives_up_when_unsure():
+    assert flow_scalar("  - {name: x, type: &t ss}", 'type') is None
+    assert flow_scalar("  - {name: x, password: 'a'',b', type: ss}", 'type') is None
+    assert flow_scalar("  - {name: Bob's, type: ss}", 'type') == 'ss'
+
+
+def test_line_filter_skips_parsing_and_matches_full_filter(monkeypatch):
+    full = CleaningPipeline.from_specs(SPECS)
+    expected = list(full.filter(iter_proxies_from_text(SOURCE)))
+
+    parsed = []
+    parse_line = merge_reader._parse_line
+    monkeypatch.setattr(merge_reader, '_parse_line', lambda line: parsed.append(line) or parse_line(line))
+    fast = CleaningPipeline.from_specs(SPECS)
+    assert list(fast.filter(iter_proxies_from_text(SOURCE, fast.accept_line))) == expected
+
+    assert [proxy['name'] for proxy in expected] == ['ok', 'type: http', 'nested']
+    assert fast.dropped == full.dropped
+    # http / bad-ss / quoted 在解析前被丢弃
+    assert len(parsed) == 4
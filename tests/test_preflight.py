@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""TCP/TLS 预检：在 127.0.0.1 上启动本地监听端口"""
+import asyncio
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+
+import pytest
+
+from core.preflight import collect_endpoints, is_proxy_reachable, probe_endpoint, run_preflight
+
+HOST = '127.0.0.1'
+
+
+@pytest.fixture(scope='module')
+def certificate(tmp_path_factory):
+    """用 openssl 生成自签名证书"""
+    if not shutil.which('openssl'):
+        pytest.skip('需要 openssl 生成测试证书')
+    directory = tmp_path_factory.mktemp('cert')
+    cert, key = directory / 'cert.pem', directory / 'key.pem'
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=localhost', '-keyout', str(key), '-out', str(cert)],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+@pytest.fixture(scope='module')
+def servers(certificate):
+    """
+    在后台线程的事件循环中启动:
+      plain    普通 TCP，保持连接
+      tls      TLS 服务 (自签名证书)
+      silent   接受连接但从不响应 (TLS 握手超时)
+      garbage  接受连接后写出非 TLS 的内容 (TLS 握手失败)
+      closed   已关闭的端口 (连接被拒绝)
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    tls_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    tls_context.load_cert_chain(*map(str, certificate))
+
+    async def hold(reader, writer):
+        await reader.read()
+        writer.close()
+
+    async def garbage(reader, writer):
+        writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+        await writer.drain()
+        await reader.read()
+        writer.close()
+
+    async def start_all():
+        started = {
+            'plain': await asyncio.start_server(hold, HOST, 0),
+            'tls': await asyncio.start_server(hold, HOST, 0, ssl=tls_context),
+            'silent': await asyncio.start_server(hold, HOST, 0),
+            'garbage': await asyncio.start_server(garbage, HOST, 0),
+        }
+        return started
+
+    started = asyncio.run_coroutine_threadsafe(start_all(), loop).result(10)
+    ports = {name: server.sockets[0].getsockname()[1] for name, server in started.items()}
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        ports['closed'] = sock.getsockname()[1]
+
+    yield ports
+
+    async def stop_all():
+        for server in started.values():
+            server.close()
+
+    asyncio.run_coroutine_threadsafe(stop_all(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+def probe(port, tls=False, timeout=2.0):
+    return asyncio.run(probe_endpoint(HOST, port, tls=tls, sni='localhost', timeout=timeout))
+
+
+def test_probe_plain_tcp_reachable(servers):
+    result = probe(servers['plain'])
+    assert result['reachable'] and result['connected']
+    assert result['tls_ok'] is None and result['connect_ms'] is not None
+
+
+def test_probe_tls_handshake(servers):
+    result = probe(servers['tls'], tls=True)
+    assert result['reachable'] and result['tls_ok'] is True
+    assert result['handshake_ms'] is not None
+
+
+def test_probe_refused(servers):
+    result = probe(servers['closed'])
+    assert not result['reachable'] and not result['connected']
+    assert result['error']
+
+
+def test_probe_tls_handshake_timeout(servers):
+    result = probe(servers['silent'], tls=True, timeout=0.5)
+    assert result['connected'] and not result['reachable']
+    assert result['tls_ok'] is False and result['error'] == 'timeout'
+
+
+def test_probe_tls_handshake_failure(servers):
+    result = probe(servers['garbage'], tls=True)
+    assert result['connected'] and not result['reachable']
+    assert result['tls_ok'] is False and result['error']
+
+
+def test_run_preflight_classifies_nodes(servers):
+    proxies = [
+        {'name': 'plain', 'type': 'ss', 'server': HOST, 'port': servers['plain']},
+        {'name': 'tls', 'type': 'trojan', 'server': HOST, 'port': servers['tls'], 'sni': 'localhost'},
+        {'name': 'refused', 'type': 'vmess', 'server': HOST, 'port': servers['closed']},
+        {'name': 'timeout', 'type': 'trojan', 'server': HOST, 'port': servers['silent']},
+        {'name': 'bad-tls', 'type': 'vless', 'server': HOST, 'port': servers['garbage'], 'tls': True},
+        # 同一端点上的非 TLS 节点只要求 TCP 可连接
+        {'name': 'plain-on-bad-tls', 'type': 'ss', 'server': HOST, 'port': servers['garbage']},
+        # UDP 协议不做 TCP 预检，与拒绝连接的 TCP 端点共用 server:port 时也视为可达
+        {'name': 'udp', 'type': 'hysteria2', 'server': HOST, 'port': servers['closed']},
+        {'name': 'udp-tuic', 'type': 'tuic', 'server': HOST, 'port': servers['silent']},
+    ]
+    endpoints, skipped = collect_endpoints(proxies)
+    assert skipped == 2 and len(endpoints) == 5
+
+    results = run_preflight(endpoints, concurrency=8, timeout=0.5)
+    assert set(results) == set(endpoints)
+    reachable = {proxy['name'] for proxy in proxies
+                 if is_proxy_reachable(proxy, results.get((str(proxy['server']), str(proxy['port']))))}
+    assert not results[(HOST, str(servers['closed']))]['reachable']
+    assert reachable == {'plain', 'tls', 'plain-on-bad-tls', 'udp', 'udp-tuic'}
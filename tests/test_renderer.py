@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import base64
+
+from core.renderer import ClashSink, DeltaSink, LinkSubSink, Renderer
+
+PROXY = {'name': 'node', 'type': 'ss', 'server': '10.0.0.1', 'port': 443, 'cipher': 'aes-128-gcm', 'password': 'x'}
+
+
+def test_prepare_failure_only_skips_that_sink(tmp_path):
+    template = tmp_path / 'template.yml'
+    template.write_text('proxies: [unclosed\n', encoding='utf-8')
+    (tmp_path / 'merge.yml').write_text('proxies:\n  - {name: a, server: [\n', encoding='utf-8')
+    sinks = [
+        ClashSink(tmp_path / 'out.yml', template, cache_dir=tmp_path / 'cache'),
+        DeltaSink(tmp_path / 'merge.delta.json', tmp_path / 'merge.yml'),
+        LinkSubSink(tmp_path / 'links.txt', lambda proxy: proxy['name'], name='links'),
+    ]
+
+    results = Renderer(sinks).render([PROXY])
+
+    assert results['clash'] is None and results['delta'] is None
+    assert results['links']['count'] == 1
+    encoded = (tmp_path / 'links.txt').read_text(encoding='utf-8')
+    assert base64.b64decode(encoded + '=' * (-len(encoded) % 4)).decode() == 'node'
+    assert not (tmp_path / 'out.yml').exists()
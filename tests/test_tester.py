@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""test.py 的测试流程：以 fake_mihomo.FakeController 代替内核"""
+import pytest
+import yaml
+
+from bench_tester import generate_proxies, load_tester
+from core.adaptive import AIMDController
+from core.history import load_history, save_history
+from core.journal import ResultJournal, read_journal
+from core.kernel import KernelManager
+from core.yaml_handler import dump_yaml_fast
+from fake_mihomo import FakeController
+
+tester = load_tester()
+
+
+@pytest.fixture
+def controller_factory(tmp_path):
+    started = []
+
+    def start(**options):
+        fake = FakeController(secret=tester.TEST_SECRET, **options)
+        port = fake.start()
+        started.append(fake)
+        kernel = KernelManager(kernel_path='', work_dir=str(tmp_path), controller_port=port, secret=fake.secret,
+                               state_file=str(tmp_path / 'state.json'), log_file=str(tmp_path / 'kernel.log'))
+        return fake, kernel
+
+    yield start
+    for fake in started:
+        fake.stop()
+
+
+def run_session(fake, kernel, proxies, tmp_path):
+    probes, representatives, groups = tester.build_probe_set(proxies)
+    assert kernel.reload(dump_yaml_fast(tester.build_minimal_config(representatives)))
+    db = {}
+    journal = ResultJournal(tmp_path / 'session.journal')
+    journal.start()
+    summary = tester.run_tests(probes, groups, db, journal, controller_url=kernel.base_url, verbose=False)
+    journal.close()
+    return probes, db, summary
+
+
+def test_every_endpoint_recorded_once_and_saved(controller_factory, tmp_path):
+    fake, kernel = controller_factory(time_scale=0.001, seed=1)
+    proxies = generate_proxies(300)
+
+    probes, db, summary = run_session(fake, kernel, proxies, tmp_path)
+
+    assert summary['completed'] == len(probes)
+    assert set(db) == set(probes.values())
+    assert all(record['pass'] + record['notpass'] == 1 for record in db.values())
+    dead = {key for name, key in probes.items() if fake.profile(name)[0]}
+    assert dead and all(db[key]['notpass'] == 1 and db[key]['streak'] == -1 for key in dead)
+    alive = set(db) - dead
+    assert any(db[key]['pass'] == 1 and db[key]['last_delay'] > 0 for key in alive)
+    assert fake.stats['not_found'] == 0
+
+    # 预写日志与 CSV 都包含全部结果，重新加载后计数一致
+    _, entries = read_journal(tmp_path / 'session.journal')
+    assert len(entries) == len(probes)
+    csv_path = tmp_path / 'history.csv'
+    save_history(csv_path, db)
+    saved = load_history(csv_path)
+    assert {key: (r['pass'], r['notpass']) for key, r in saved.items()} == \
+           {key: (r['pass'], r['notpass']) for key, r in db.items()}
+
+
+def test_results_accumulate_across_runs(controller_factory, tmp_path):
+    fake, kernel = controller_factory(time_scale=0.001, failure_rate=0.0, seed=2)
+    proxies = generate_proxies(50, alias_ratio=0)
+    probes, db, _ = run_session(fake, kernel, proxies, tmp_path)
+
+    csv_path = tmp_path / 'history.csv'
+    save_history(csv_path, db)
+    db = load_history(csv_path)
+    journal = ResultJournal(tmp_path / 'second.journal')
+    journal.start()
+    tester.run_tests(probes, tester.build_probe_set(proxies)[2], db, journal, controller_url=kernel.base_url,
+                     verbose=False)
+    journal.close()
+
+    passed = [record for record in db.values() if record['pass'] == 2]
+    assert passed and all(record['streak'] == 2 for record in passed)
+
+
+def test_probe_timeout_is_recorded_as_failure(controller_factory, tmp_path):
+    # 所有节点的延迟都远超超时时间，内核返回 504
+    fake, kernel = controller_factory(time_scale=0.001, failure_rate=0.0, latency_median_ms=60000,
+                                      latency_sigma=0.01)
+    proxies = generate_proxies(20, alias_ratio=0)
+    probes, db, _ = run_session(fake, kernel, proxies, tmp_path)
+
+    name = next(iter(probes))
+    assert tester.test_single_node(name, 500, kernel.base_url) == (False, -1, 'HTTP 504')
+    assert all(record['notpass'] == 1 and record['pass'] == 0 for record in db.values())
+    assert fake.stats['timeouts'] >= len(probes)
+
+
+def test_stalled_controller_reduces_concurrency(controller_factory, tmp_path, monkeypatch):
+    # 控制器在客户端超时 (探测超时 + 余量) 内没有响应，视为测试机过载
+    fake, kernel = controller_factory(time_scale=3.0, failure_rate=1.0)
+    proxies = generate_proxies(1, alias_ratio=0)
+    probes, representatives, _ = tester.build_probe_set(proxies)
+    assert kernel.reload(dump_yaml_fast(tester.build_minimal_config(representatives)))
+    monkeypatch.setattr(tester, 'CLIENT_TIMEOUT_MARGIN', 0.05)
+
+    controller = AIMDController(initial_limit=8, min_limit=1, window=1, initial_timeout_ms=100)
+    result = tester.probe_node(controller, next(iter(probes)), kernel.base_url)
+
+    assert result == (False, -1, tester.STALLED_ERROR)
+    assert controller.decreases == 1 and controller.concurrency == 4
+
+
+def write_journal(path, results):
+    journal = ResultJournal(path)
+    journal.start()
+    for key, ok, now in results:
+        journal.record(key, ok, now)
+    journal.close()
+
+
+def test_no_commit_keeps_leftover_journal(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'history.csv'
+    monkeypatch.setattr(tester, 'CSV_DB_PATH', csv_path)
+    key = ('1.1.1.1', '443', 'vmess')
+    path = tmp_path / 'shard.journal'
+    write_journal(path, [(key, True, 100)])
+
+    db = {}
+    journal, done_keys = tester.open_journal(db, path, commit=False)
+    journal.record(key, False, 200)
+    journal.close()
+
+    assert not csv_path.exists() and done_keys == set()
+    assert db[key]['pass'] == 1
+    _, entries = read_journal(path)
+    assert [entry['ok'] for entry in entries] == [True, False]
+
+
+def test_apply_journals_orders_entries_across_shards(tmp_path, monkeypatch):
+    csv_path = tmp_path / 'history.csv'
+    monkeypatch.setattr(tester, 'CSV_DB_PATH', csv_path)
+    key = ('1.1.1.1', '443', 'vmess')
+    # 分片 1 的成功发生在分片 2 的两次失败之后
+    first, second = tmp_path / 'a.journal', tmp_path / 'b.journal'
+    write_journal(first, [(key, True, 300)])
+    write_journal(second, [(key, False, 100), (key, False, 200)])
+
+    tester.apply_journals([first, second])
+
+    record = load_history(csv_path)[key]
+    assert (record['pass'], record['notpass'], record['streak']) == (1, 2, 1)
+    assert record['last_tested'] == 300
+    assert not first.exists() and not second.exists()
+
+
+def test_full_config_groups_reference_probe_names(tmp_path, monkeypatch):
+    monkeypatch.setattr(tester, 'TEMP_CONFIG', str(tmp_path / 'temp.yaml'))
+    proxies = generate_proxies(4, alias_ratio=0)
+    alias = {**proxies[0], 'name': 'alias-0'}
+    config = {
+        'proxies': proxies + [alias],
+        'proxy-groups': [
+            {'name': 'PICK', 'type': 'select', 'proxies': ['AUTO', 'node-0', 'alias-0', 'node-1', 'node-3', 'DIRECT']},
+            {'name': 'AUTO', 'type': 'url-test', 'proxies': ['node-1', 'node-2']},
+            {'name': 'ONLY-3', 'type': 'select', 'proxies': ['node-3']},
+        ],
+    }
+    # node-3 本次不测试
+    probes, representatives, groups = tester.build_probe_set(proxies[:3] + [alias])
+    tester.generate_test_config(config, representatives, full=True, aliases=groups)
+
+    written = yaml.safe_load((tmp_path / 'temp.yaml').read_text(encoding='utf-8'))
+    names = {p['name'] for p in written['proxies']}
+    assert names == set(probes)
+    members = {g['name']: g['proxies'] for g in written['proxy-groups']}
+    assert set(members) == {'PICK', 'AUTO'}
+    assert members['PICK'][0] == 'AUTO' and members['PICK'][-1] == 'DIRECT'
+    assert set(members['PICK'][1:-1]) <= names and len(members['PICK']) == 4
+    assert set(members['AUTO']) <= names and len(members['AUTO']) == 2
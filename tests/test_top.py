@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""top.py --country：国家列为空时按 merge.yml 中的节点名称补全"""
+from core.history import new_record
+from top import build_rows, filter_rows, fill_countries, load_name_countries
+
+MERGE_YML = """proxies:
+  - {name: '58#🇺🇸 US|美国 01', server: 1.1.1.1, port: 443, type: vless}
+  - {name: '3#🇯🇵 JP|日本 01', server: 2.2.2.2, port: 443, type: trojan}
+  - {name: manual, server: 3.3.3.3, port: 443, type: vless}
+"""
+
+
+def test_country_falls_back_to_merged_node_name(tmp_path):
+    path = tmp_path / 'merge.yml'
+    path.write_text(MERGE_YML, encoding='utf-8')
+    db = {key: new_record() for key in [('1.1.1.1', '443', 'vless'), ('2.2.2.2', '443', 'trojan'),
+                                         ('3.3.3.3', '443', 'vless')]}
+    db[('2.2.2.2', '443', 'trojan')]['country'] = 'SG'
+
+    rows = fill_countries(build_rows({}, db), load_name_countries(path))
+
+    countries = {row['ip']: row['country'] for row in rows}
+    # 历史记录中已有的国家代码优先
+    assert countries == {'1.1.1.1': 'US', '2.2.2.2': 'SG', '3.3.3.3': ''}
+    assert [row['ip'] for row in filter_rows(rows, countries={'US'})] == ['1.1.1.1']
+
+
+def test_missing_merge_file_yields_no_countries(tmp_path):
+    assert load_name_countries(tmp_path / 'missing.yml') == {}